@@ -7,15 +7,50 @@ Author: Betapandas
 Contact: Betapandas@gmail.com
 """
 
-import json
-import os
-from datetime import datetime, date
-from typing import List, Dict, Optional
+import functools
+import itertools
+import operator
+import sys
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, date, timedelta
+from heapq import heapify, heappop, heappush, nlargest, nsmallest
+from typing import Callable, Iterable, Iterator, List, Dict, Optional, Set, Tuple
+
+import search_index
+from file_watcher import FileWatcher
+from instrumentation import timed
+from search_index import SearchIndex
+from storage import JsonStorage, RecordWriter, replay_entry
+
+
+# fields that can change after an assignment is added; the server and the
+# SQLite manager use the same list
+UPDATABLE = ('title', 'course', 'due_date', 'description', 'completed', 'grade')
+
+# attributes set by AssignmentManager._rebuild_indexes()
+INDEXES = ('_by_id', '_by_course', '_due_index', '_completed_ids', '_pending_ids',
+           '_stats', '_overdue_ids', '_due_heap', '_stats_day', '_search')
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_due_date(due_date: str) -> Optional[date]:
+    """Parse a YYYY-MM-DD string, returning None if it is malformed."""
+    try:
+        return datetime.strptime(due_date, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        return None
 
 
 class Assignment:
     """Represents a single college assignment."""
     
+    # slots keep large imports compact; due is the parsed form of due_date
+    __slots__ = ('id', 'title', '_course', '_due_date', 'due', 'description',
+                 'completed', 'grade', 'created_at')
+    
     def __init__(self, title: str, course: str, due_date: str, 
                  description: str = "", completed: bool = False, 
                  grade: str = "", assignment_id: Optional[int] = None):
@@ -40,20 +75,46 @@ class Assignment:
         self.grade = grade
         self.created_at = datetime.now().isoformat()
     
-    def days_until_due(self) -> int:
-        """Calculate days remaining until due date."""
-        try:
-            due = datetime.strptime(self.due_date, "%Y-%m-%d").date()
-            today = date.today()
-            delta = (due - today).days
-            return delta
-        except ValueError:
+    @property
+    def course(self) -> str:
+        """Course name."""
+        return self._course
+    
+    @course.setter
+    def course(self, value: str):
+        # many assignments share a course, so keep one copy of each name
+        self._course = sys.intern(value) if type(value) is str else value
+    
+    @property
+    def due_date(self) -> str:
+        """Due date in YYYY-MM-DD format."""
+        return self._due_date
+    
+    @due_date.setter
+    def due_date(self, value: str):
+        self._due_date = value
+        self.due = parse_due_date(value)
+    
+    def days_until_due(self, today: Optional[date] = None) -> int:
+        """
+        Calculate days remaining until due date.
+        
+        Args:
+            today: Reference date; pass one snapshot when checking many
+                   assignments so date.today() is not called for each
+        """
+        if self.due is None:
             # if date format is bad just return 0
             return 0
+        return (self.due - (today or date.today())).days
     
-    def is_overdue(self) -> bool:
+    def is_overdue(self, today: Optional[date] = None) -> bool:
         """Check if assignment is overdue."""
-        return self.days_until_due() < 0 and not self.completed
+        return not self.completed and self.days_until_due(today) < 0
+    
+    def search_texts(self) -> Tuple[str, str, str]:
+        """The fields the search box looks in."""
+        return self.title, self.course, self.description
     
     def to_dict(self) -> Dict:
         """Convert assignment to dictionary."""
@@ -82,70 +143,844 @@ class Assignment:
         )
 
 
+def synchronized(method):
+    """Run a manager method while holding the manager's lock."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class ChangeEvent:
+    """Describes a change made through an AssignmentManager."""
+    
+    ADDED = "added"
+    UPDATED = "updated"
+    DELETED = "deleted"
+    IMPORTED = "imported"
+    
+    def __init__(self, kind: str, ids: Iterable[int], fields: Iterable[str] = ()):
+        """
+        Initialize a change event.
+        
+        Args:
+            kind: One of ADDED, UPDATED, DELETED or IMPORTED
+            ids: Ids of the affected assignments
+            fields: Names of the fields that changed (UPDATED only)
+        """
+        self.kind = kind
+        self.ids = list(ids)
+        self.fields = set(fields)
+    
+    def __repr__(self) -> str:
+        return f"ChangeEvent({self.kind!r}, ids={self.ids!r}, fields={sorted(self.fields)!r})"
+
+
+def coalesce_events(events: List[ChangeEvent]) -> List[ChangeEvent]:
+    """
+    Merge a burst of events into at most one event per kind.
+    
+    An assignment added and then updated is reported as added, one added
+    and then deleted is not reported at all, and any import collapses the
+    whole burst into a single IMPORTED event.
+    """
+    if any(e.kind == ChangeEvent.IMPORTED for e in events):
+        ids = {i for e in events for i in e.ids}
+        return [ChangeEvent(ChangeEvent.IMPORTED, sorted(ids))]
+    
+    # id -> kind, in first-seen order
+    state: Dict[int, str] = {}
+    fields: Set[str] = set()
+    for event in events:
+        for i in event.ids:
+            previous = state.get(i)
+            if event.kind == ChangeEvent.DELETED and previous == ChangeEvent.ADDED:
+                del state[i]
+            elif event.kind == ChangeEvent.UPDATED and previous == ChangeEvent.ADDED:
+                continue
+            else:
+                state[i] = event.kind
+        if event.kind == ChangeEvent.UPDATED:
+            fields |= event.fields
+    
+    merged = []
+    for kind in (ChangeEvent.ADDED, ChangeEvent.UPDATED, ChangeEvent.DELETED):
+        ids = [i for i, k in state.items() if k == kind]
+        if ids:
+            merged.append(ChangeEvent(kind, ids, fields if kind == ChangeEvent.UPDATED else ()))
+    return merged
+
+
+class Query:
+    """
+    Describes which assignments to fetch and in what order.
+    
+    Run one with AssignmentManager.query(). Criteria left as None match
+    everything; the rest must all hold. Due-date bounds are inclusive and
+    never match assignments whose due date is malformed.
+    """
+    
+    # sort name -> keys, most significant first; ties fall back to the id.
+    # They are applied as stable sorts over candidates in id order, since
+    # sorting on one plain key is much faster than on a tuple of them
+    SORT_KEYS = {
+        'due_date': (operator.attrgetter('due_date'),),
+        'id': (),
+        'course': (operator.attrgetter('course'), operator.attrgetter('due_date')),
+        'title': (lambda a: a.title.lower(),),
+    }
+    
+    def __init__(self, ids: Optional[Iterable[int]] = None,
+                 courses: Optional[Iterable[str]] = None,
+                 completed: Optional[bool] = None, overdue: Optional[bool] = None,
+                 due_after: Optional[date] = None, due_before: Optional[date] = None,
+                 graded: Optional[bool] = None, text: Optional[str] = None,
+                 search: Optional[str] = None, sort: Optional[str] = 'due_date', reverse: bool = False,
+                 limit: Optional[int] = None, offset: int = 0,
+                 today: Optional[date] = None):
+        """
+        Build a query.
+        
+        Args:
+            ids: Only these assignment ids
+            courses: Only these courses
+            completed: Only completed (True) or pending (False) assignments
+            overdue: Only overdue (True) or not overdue (False) assignments
+            due_after: Due on or after this date
+            due_before: Due on or before this date
+            graded: Only assignments with (True) or without (False) a grade
+            text: Title contains this text (case-insensitive)
+            search: Words, each matching the start of a word in the title,
+                    course or description (see search_index)
+            sort: One of SORT_KEYS, or None for whatever order is cheapest
+            reverse: Sort in descending order
+            limit: Return at most this many assignments
+            offset: Skip this many assignments first
+            today: Date that decides what is overdue (default: today)
+        """
+        if sort is not None and sort not in self.SORT_KEYS:
+            raise ValueError(f"Unknown sort key {sort!r}")
+        self.ids = frozenset(ids) if ids is not None else None
+        self.courses = frozenset(courses) if courses is not None else None
+        self.completed = completed
+        self.overdue = overdue
+        self.due_after = due_after
+        self.due_before = due_before
+        self.graded = graded
+        self.text = text.lower() if text else None
+        self.search = tuple(search_index.tokenize(search or "")) or None
+        self.sort = sort
+        self.reverse = reverse
+        self.limit = limit
+        self.offset = offset
+        self.today = today or date.today()
+    
+    @property
+    def criteria(self) -> Set[str]:
+        """Names of the criteria that are set."""
+        return {name for name in ('ids', 'courses', 'completed', 'overdue', 'due_after',
+                                  'due_before', 'graded', 'text', 'search')
+                if getattr(self, name) is not None}
+    
+    def matches(self, assignment: Assignment) -> bool:
+        """Check one assignment against every criterion."""
+        if self.ids is not None and assignment.id not in self.ids:
+            return False
+        if self.courses is not None and assignment.course not in self.courses:
+            return False
+        if self.completed is not None and bool(assignment.completed) != self.completed:
+            return False
+        if self.overdue is not None and assignment.is_overdue(self.today) != self.overdue:
+            return False
+        if self.due_after is not None or self.due_before is not None:
+            due = assignment.due
+            if due is None:
+                return False
+            if self.due_after is not None and due < self.due_after:
+                return False
+            if self.due_before is not None and due > self.due_before:
+                return False
+        if self.graded is not None and \
+                bool(assignment.grade and assignment.grade.strip()) != self.graded:
+            return False
+        if self.text is not None and self.text not in assignment.title.lower():
+            return False
+        if self.search is not None and \
+                not search_index.matches(self.search, assignment.search_texts()):
+            return False
+        return True
+
+
+class ImportSession:
+    """
+    An import that is fed in chunks and applied all at once.
+    
+    add() only converts records into Assignments, so it can run on a worker
+    thread while the manager stays usable. commit() swaps the result into
+    the manager and sends a single IMPORTED event.
+    """
+    
+    def __init__(self, manager: 'AssignmentManager', merge: bool = False):
+        """
+        Start an import.
+        
+        Args:
+            manager: Manager the import is applied to
+            merge: If True, merge with existing data. If False, replace all data.
+        """
+        self.manager = manager
+        self.merge = merge
+        self.assignments: List[Assignment] = []
+        # set from any thread to make read() stop after the current chunk
+        self.cancelled = False
+    
+    def __len__(self) -> int:
+        return len(self.assignments)
+    
+    def add(self, records: Iterable[Dict]) -> int:
+        """Convert a chunk of records; returns the number read so far."""
+        self.assignments.extend(Assignment.from_dict(r) for r in records)
+        return len(self.assignments)
+    
+    @timed
+    def read(self, records: Iterable[Dict], chunk_size: int = 1000,
+             progress: Optional[Callable[[int], None]] = None):
+        """
+        Add every record from an iterable, a chunk at a time.
+        
+        Args:
+            records: Assignment dictionaries, e.g. a storage.RecordReader
+            chunk_size: Records converted between progress calls
+            progress: Called with the number of records read so far
+        """
+        iterator = iter(records)
+        while not self.cancelled:
+            chunk = list(itertools.islice(iterator, chunk_size))
+            if not chunk:
+                break
+            count = self.add(chunk)
+            if progress is not None:
+                progress(count)
+    
+    def commit(self, next_id: Optional[int] = None):
+        """
+        Apply the import to the manager.
+        
+        Args:
+            next_id: next_id stored with the imported data, if any
+        """
+        self.manager._commit_import(self, next_id)
+
+
 class AssignmentManager:
-    """Manages all assignments with JSON persistence."""
+    """Manages all assignments with pluggable persistence."""
     
-    def __init__(self, data_file: str = "assignments.json"):
-        """Initialize the assignment manager."""
+    def __init__(self, data_file: str = "assignments.json", storage=None):
+        """
+        Initialize the assignment manager.
+        
+        Args:
+            data_file: Path of the JSON data file
+            storage: Optional storage backend (defaults to JsonStorage(data_file))
+        """
         self.data_file = data_file
-        self.assignments: List[Assignment] = []
+        self.storage = storage if storage is not None else JsonStorage(data_file)
+        # guards the data when the storage backend reads it from another thread
+        self.lock = threading.RLock()
         self.next_id = 1
+        # changes handed to the storage backend so far (see apply_changes())
+        self._writes = 0
+        # course -> its assignments (None until read) while a sharded backend
+        # is loaded a course at a time; None once everything is loaded
+        self._shards: Optional[Dict[str, Optional[List[Assignment]]]] = None
+        self._init_events()
+        self._init_batch()
+        self._rebuild_indexes([])
         self.load_assignments()
     
-    def load_assignments(self):
-        """Load assignments from JSON file."""
-        if os.path.exists(self.data_file):
+    def __getattr__(self, name: str):
+        # only called for missing attributes: the indexes are left unset while
+        # shards are loaded lazily, and built the first time anything needs them
+        if name in INDEXES and self.__dict__.get('_shards') is not None:
+            self.ensure_loaded()
+            return self.__dict__[name]
+        raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+    
+    def _init_events(self):
+        """Set up the subscriber list and the event hold buffer."""
+        self._subscribers: List[Tuple[Callable, Optional[Set[str]]]] = []
+        self._hold_depth = 0
+        self._held_events: List[ChangeEvent] = []
+    
+    def subscribe(self, callback: Callable[[ChangeEvent], None],
+                  kinds: Optional[Iterable[str]] = None) -> Callable[[], None]:
+        """
+        Call callback with a ChangeEvent whenever assignments change.
+        
+        Args:
+            callback: Function taking a ChangeEvent
+            kinds: Only report these event kinds (default: all)
+        
+        Returns:
+            A function that cancels the subscription
+        """
+        entry = (callback, set(kinds) if kinds is not None else None)
+        self._subscribers.append(entry)
+        
+        def unsubscribe():
+            if entry in self._subscribers:
+                self._subscribers.remove(entry)
+        return unsubscribe
+    
+    @contextmanager
+    def hold_events(self):
+        """Collect events inside the block and deliver them coalesced at the end."""
+        self._hold_depth += 1
+        try:
+            yield
+        finally:
+            self._hold_depth -= 1
+            if self._hold_depth == 0:
+                self._release_events()
+    
+    def _release_events(self):
+        """Deliver the held events, coalesced."""
+        events, self._held_events = self._held_events, []
+        for event in coalesce_events(events):
+            self._notify(event)
+    
+    def _init_batch(self):
+        """Set up the state used while a batch is open."""
+        # change entries waiting for the batch to commit; None outside a batch
+        self._batch_entries: Optional[List[Dict]] = None
+        # whether the batch needs a full rewrite instead of its entries
+        self._batch_full = False
+        # how to undo each change made in the batch, oldest first
+        self._undo: List[Tuple] = []
+        # id order before the batch's first delete, so rollback can restore it
+        self._batch_order: Optional[List[int]] = None
+    
+    @contextmanager
+    def batch(self):
+        """
+        Make every change inside the block one transaction.
+        
+        Changes show up in memory right away, but nothing is written and no
+        events are sent until the block ends. Then all of its changes go to
+        the storage backend in a single call and subscribers get the
+        coalesced events. If the block raises, every change is undone and
+        nothing is written or reported. Nested batches join the outer one.
+        The lock is held for the whole block.
+        """
+        with self.lock:
+            if self._batch_entries is not None:
+                yield self
+                return
+            
+            self._batch_entries = []
+            self._hold_depth += 1
+            held = len(self._held_events)
             try:
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.assignments = [Assignment.from_dict(a) for a in data['assignments']]
-                    self.next_id = data.get('next_id', 1)
-            except (json.JSONDecodeError, KeyError):
-                self.assignments = []
-                self.next_id = 1
+                yield self
+            except BaseException:
+                self._rollback()
+                del self._held_events[held:]
+                raise
+            finally:
+                entries, full = self._batch_entries, self._batch_full
+                self._hold_depth -= 1
+                self._init_batch()
+            
+            if full:
+                self.save_assignments()
+            elif entries:
+                self._writes += 1
+                self.storage.append_many(entries, self._snapshot)
+            if self._hold_depth == 0:
+                self._release_events()
+    
+    def _log_undo(self, *entry):
+        """Record how to undo a change, if a batch is open."""
+        if self._batch_entries is not None:
+            self._undo.append(entry)
+    
+    def _rollback(self):
+        """Undo every change made in the current batch."""
+        for entry in reversed(self._undo):
+            kind = entry[0]
+            if kind == 'add':
+                _, assignment, next_id = entry
+                del self._by_id[assignment.id]
+                self._unindex(assignment)
+                self.next_id = next_id
+            elif kind == 'update':
+                _, assignment, old_values = entry
+                self._unindex(assignment)
+                for key, value in old_values.items():
+                    setattr(assignment, key, value)
+                self._index(assignment)
+            elif kind == 'delete':
+                self._index(entry[1])
+            elif kind == 'reset':
+                _, assignments, next_id = entry
+                self._rebuild_indexes(assignments)
+                self.next_id = next_id
+        
+        if self._batch_order is not None:
+            # deleted assignments came back at the end; put them back in place
+            order = [i for i in self._batch_order if i in self._by_id]
+            seen = set(order)
+            order += [i for i in self._by_id if i not in seen]
+            self._by_id = {i: self._by_id[i] for i in order}
+    
+    def _emit(self, kind: str, ids: Iterable[int], fields: Iterable[str] = ()):
+        """Report a change to subscribers, or hold it while events are held."""
+        event = ChangeEvent(kind, ids, fields)
+        if self._hold_depth:
+            self._held_events.append(event)
+        else:
+            self._notify(event)
+    
+    def _notify(self, event: ChangeEvent):
+        """Deliver an event to every interested subscriber."""
+        for callback, kinds in list(self._subscribers):
+            if kinds is None or event.kind in kinds:
+                callback(event)
+    
+    @property
+    def assignments(self) -> List[Assignment]:
+        """All assignments, in the order they were added."""
+        return list(self._by_id.values())
+    
+    @assignments.setter
+    def assignments(self, assignments: List[Assignment]):
+        self._rebuild_indexes(assignments)
+    
+    def _rebuild_indexes(self, assignments: List[Assignment]):
+        """Rebuild every lookup index from scratch."""
+        # id -> assignment; dicts keep insertion order, so this is also the list
+        self._by_id: Dict[int, Assignment] = {}
+        # course -> ids of its assignments
+        self._by_course: Dict[str, Set[int]] = {}
+        # (due_date, id) pairs kept sorted for range queries
+        self._due_index: List[Tuple[str, int]] = []
+        self._completed_ids: Set[int] = set()
+        self._pending_ids: Set[int] = set()
+        # live counters; the None key holds the totals, the rest are per course
+        self._stats: Dict[Optional[str], Counter] = {None: Counter()}
+        # pending assignments that were past due as of self._stats_day
+        self._overdue_ids: Set[int] = set()
+        # (due, id) of pending assignments not yet overdue, popped as days pass
+        self._due_heap: List[Tuple[date, int]] = []
+        self._stats_day = date.today()
+        # word index for searches, built the first time one runs
+        self._search: Optional[SearchIndex] = None
+        
+        for assignment in assignments:
+            self._by_id[assignment.id] = assignment
+            self._by_course.setdefault(assignment.course, set()).add(assignment.id)
+            if assignment.completed:
+                self._completed_ids.add(assignment.id)
+            else:
+                self._pending_ids.add(assignment.id)
+            self._track(assignment)
+        self._due_index = sorted((a.due_date, a.id) for a in self._by_id.values())
+    
+    def _index(self, assignment: Assignment):
+        """Add an assignment to every index."""
+        self._by_id[assignment.id] = assignment
+        self._by_course.setdefault(assignment.course, set()).add(assignment.id)
+        insort(self._due_index, (assignment.due_date, assignment.id))
+        if assignment.completed:
+            self._completed_ids.add(assignment.id)
+        else:
+            self._pending_ids.add(assignment.id)
+        self._track(assignment)
+        if self._search is not None:
+            self._search.add(assignment.id, assignment.search_texts())
+        
+        # drop stale heap entries once they outnumber the live ones
+        if len(self._due_heap) > 2 * len(self._pending_ids) + 64:
+            self._due_heap = [(a.due, a.id) for a in map(self._by_id.get, self._pending_ids)
+                              if a.due is not None and a.id not in self._overdue_ids]
+            heapify(self._due_heap)
+    
+    def _unindex(self, assignment: Assignment):
+        """Remove an assignment from every index except _by_id."""
+        course_ids = self._by_course.get(assignment.course)
+        if course_ids is not None:
+            course_ids.discard(assignment.id)
+            if not course_ids:
+                del self._by_course[assignment.course]
+        
+        key = (assignment.due_date, assignment.id)
+        pos = bisect_left(self._due_index, key)
+        if pos < len(self._due_index) and self._due_index[pos] == key:
+            del self._due_index[pos]
+        
+        self._completed_ids.discard(assignment.id)
+        self._pending_ids.discard(assignment.id)
+        if self._search is not None:
+            self._search.remove(assignment.id, assignment.search_texts())
+        
+        if assignment.id in self._overdue_ids:
+            self._count_overdue(assignment, -1)
+        self._count(assignment, -1)
+    
+    def _track(self, assignment: Assignment):
+        """Add an assignment to the statistics counters."""
+        self._count(assignment, 1)
+        if assignment.completed or assignment.due is None:
+            return
+        if assignment.due < self._stats_day:
+            self._count_overdue(assignment, 1)
+        else:
+            heappush(self._due_heap, (assignment.due, assignment.id))
+    
+    def _count(self, assignment: Assignment, sign: int):
+        """Adjust the total/completed/graded counters by sign."""
+        for key in (None, assignment.course):
+            counter = self._stats.get(key)
+            if counter is None:
+                counter = self._stats[key] = Counter()
+            counter['total'] += sign
+            if assignment.completed:
+                counter['completed'] += sign
+            if assignment.grade and assignment.grade.strip():
+                counter['graded'] += sign
+            if key is not None and not counter['total']:
+                del self._stats[key]
+    
+    def _count_overdue(self, assignment: Assignment, sign: int):
+        """Mark an assignment overdue (sign=1) or not (sign=-1)."""
+        if sign > 0:
+            self._overdue_ids.add(assignment.id)
         else:
-            self.assignments = []
-            self.next_id = 1
+            self._overdue_ids.discard(assignment.id)
+        self._stats[None]['overdue'] += sign
+        self._stats[assignment.course]['overdue'] += sign
+    
+    def _roll_overdue(self, today: date):
+        """Move assignments that became overdue since the last call."""
+        self._stats_day = max(today, self._stats_day)
+        while self._due_heap and self._due_heap[0][0] < self._stats_day:
+            due, assignment_id = heappop(self._due_heap)
+            assignment = self._by_id.get(assignment_id)
+            # skip entries left behind by updates and deletes
+            if (assignment is None or assignment.completed or assignment.due != due
+                    or assignment_id in self._overdue_ids):
+                continue
+            self._count_overdue(assignment, 1)
+    
+    def _search_index(self) -> SearchIndex:
+        """The word index, built on first use and kept up to date after that."""
+        if self._search is None:
+            self._search = SearchIndex((a.id, a.search_texts()) for a in self._by_id.values())
+        return self._search
+    
+    def _ids_to_assignments(self, ids) -> List[Assignment]:
+        """Look up a collection of ids, returned in id order."""
+        return [self._by_id[i] for i in sorted(ids)]
+    
+    @timed
+    @synchronized
+    def load_assignments(self):
+        """
+        Load assignments from the storage backend.
+        
+        A sharded backend only has its manifest read here. Each course is
+        read when get_assignments_by_course() first asks for it, and the
+        rest as soon as anything needs every assignment (see ensure_loaded()).
+        """
+        load_index = getattr(self.storage, 'load_index', None)
+        index = load_index() if load_index is not None else None
+        if index is not None:
+            courses, self.next_id = index
+            for name in INDEXES:
+                self.__dict__.pop(name, None)
+            self._shards = dict.fromkeys(courses)
+            return
+        
+        self._shards = None
+        records, next_id = self.storage.load()
+        # binary snapshots hand back ready-made Assignments
+        self._rebuild_indexes([a if isinstance(a, Assignment) else Assignment.from_dict(a)
+                               for a in records])
+        self.next_id = next_id
+    
+    @timed
+    @synchronized
+    def ensure_loaded(self):
+        """Read every course not loaded yet and build the indexes."""
+        if self._shards is None:
+            return
+        assignments = []
+        for course, shard in self._shards.items():
+            if shard is None:
+                shard = [Assignment.from_dict(r) for r in self.storage.load_course(course)]
+            assignments += shard
+        self._shards = None
+        self._rebuild_indexes(assignments)
     
+    @timed
     def save_assignments(self):
-        """Save assignments to JSON file."""
-        data = {
-            'assignments': [a.to_dict() for a in self.assignments],
-            'next_id': self.next_id
-        }
-        with open(self.data_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2)
+        """Write every assignment to the storage backend."""
+        if self._batch_entries is not None:
+            # written once the batch commits
+            self._batch_full = True
+            return
+        records, next_id = self._snapshot()
+        self._writes += 1
+        self.storage.save(records, next_id)
+    
+    @synchronized
+    def _reserve_ids(self, count: int) -> int:
+        """
+        Take count new ids, returning the first.
+        
+        Backends shared between processes hand them out, so two processes
+        never give the same id to different assignments.
+        """
+        reserve = getattr(self.storage, 'reserve_ids', None)
+        first = reserve(self.next_id, count) if reserve is not None else self.next_id
+        self.next_id = first + count
+        return first
+    
+    @timed
+    def sync(self) -> bool:
+        """
+        Catch up with changes another process saved to the data file.
+        
+        Cheap when nothing changed (the backend checks a write counter in
+        its lock file), so it can be called often. Does nothing inside a
+        batch or while changes of ours are still waiting to be written.
+        A journal backend hands over just the entries appended elsewhere;
+        otherwise the file is loaded again and compared record by record.
+        Only assignments that really changed are touched, and subscribers
+        get the matching ADDED, UPDATED and DELETED events.
+        
+        This is fetch_changes() followed by apply_changes(). The file is
+        read without holding the lock, because the backend's locks must
+        never be waited for while holding it; if a change of ours was
+        written meanwhile, nothing is applied and the next call catches up.
+        
+        Returns:
+            True if changes from the data file were applied
+        """
+        fetched = self.fetch_changes()
+        return fetched is not None and self.apply_changes(fetched)
+    
+    @timed
+    def fetch_changes(self) -> Optional[Tuple]:
+        """
+        The reading half of sync(): read and parse what another process
+        saved, without applying it.
+        
+        Safe on a worker thread, so a GUI need not freeze while a large
+        file is read; hand the result to apply_changes() on the thread
+        that owns the subscribers. The lock is only taken briefly.
+        
+        Returns:
+            What to pass to apply_changes(), or None if nothing changed
+        
+        Raises:
+            OSError: The data file could not be read
+            ValueError: The data file could not be parsed
+        """
+        outdated = getattr(self.storage, 'outdated', None)
+        with self.lock:
+            if outdated is None or self._batch_entries is not None:
+                return None
+            writes = self._writes
+        if not outdated():
+            return None
+        
+        self.storage.begin_catch_up()
+        try:
+            entries = self.storage.read_new_entries()
+            if entries is not None:
+                # replay onto copies of just the records the entries touch
+                records, touched = {}, set()
+                with self.lock:
+                    next_id = self.next_id
+                    for entry in entries:
+                        assignment_id = (entry['record'].get('id') if 'record' in entry
+                                         else entry.get('id'))
+                        if assignment_id not in touched:
+                            touched.add(assignment_id)
+                            current = self._by_id.get(assignment_id)
+                            if current is not None:
+                                records[assignment_id] = current.to_dict()
+                        next_id = replay_entry(entry, records, next_id)
+                loaded = [records[i] for i in touched if i in records]
+                gone = touched.difference(records)
+            else:
+                loaded, next_id = self.storage.load()
+                gone = None
+            changes = {r['id']: Assignment.from_dict(r) for r in loaded}
+        except BaseException:
+            self.storage.end_catch_up(False)
+            raise
+        return changes, gone, next_id, writes
+    
+    @timed
+    @synchronized
+    def apply_changes(self, fetched: Tuple) -> bool:
+        """
+        The applying half of sync(): bring assignments in line with what
+        fetch_changes() read and send subscribers the matching events.
+        
+        If changes of ours went to the backend after the read started,
+        nothing is applied: they were replayed onto the file, which stays
+        outdated, so the next fetch_changes() reads it all again.
+        
+        Returns:
+            True if the changes were applied
+        """
+        changes, gone, next_id, writes = fetched
+        applied = writes == self._writes
+        self.storage.end_catch_up(applied)
+        if not applied:
+            return False
+        if gone is None:
+            # a full load: whatever it lacks was deleted
+            gone = [i for i in self._by_id if i not in changes]
+        self._apply_changes(changes, gone, next_id)
+        return True
+    
+    def _apply_changes(self, changes: Dict[int, Assignment], gone: Iterable[int],
+                       next_id: int):
+        """
+        Bring assignments in line with records saved elsewhere.
+        
+        Args:
+            changes: id -> the assignment as it is now
+            gone: Ids of assignments that were deleted
+            next_id: The file's next free id
+        """
+        added, deleted = [], []
+        updated: Dict[Tuple[str, ...], List[int]] = {}
+        for assignment_id in gone:
+            current = self._by_id.pop(assignment_id, None)
+            if current is not None:
+                self._unindex(current)
+                deleted.append(assignment_id)
+        for assignment_id, incoming in changes.items():
+            current = self._by_id.get(assignment_id)
+            if current is None:
+                self._index(incoming)
+                added.append(assignment_id)
+                continue
+            fields = tuple(f for f in UPDATABLE if getattr(current, f) != getattr(incoming, f))
+            if fields:
+                self._unindex(current)
+                for field in fields:
+                    setattr(current, field, getattr(incoming, field))
+                self._index(current)
+                updated.setdefault(fields, []).append(assignment_id)
+        self.next_id = max(self.next_id, next_id)
+        
+        with self.hold_events():
+            if deleted:
+                self._emit(ChangeEvent.DELETED, deleted)
+            if added:
+                self._emit(ChangeEvent.ADDED, added)
+            for fields, ids in updated.items():
+                self._emit(ChangeEvent.UPDATED, ids, fields)
+    
+    def file_watcher(self) -> Optional[FileWatcher]:
+        """
+        A watcher for the data files, or None if the backend has none.
+        
+        Its wait() returns when a file may have changed, which is the time
+        to call sync(). Our own writes wake it too; sync() sees through
+        those cheaply.
+        """
+        paths = getattr(self.storage, 'watch_paths', None)
+        return FileWatcher(paths()) if paths is not None else None
+    
+    @synchronized
+    def _snapshot(self) -> Tuple[List[Dict], int]:
+        """Return the full state as (records, next_id)."""
+        return [a.to_dict() for a in self._by_id.values()], self.next_id
+    
+    def _persist(self, entry: Dict):
+        """Hand a single change entry to the storage backend."""
+        if self._batch_entries is not None:
+            self._batch_entries.append(entry)
+            return
+        self._writes += 1
+        self.storage.append(entry, self._snapshot)
+    
+    @timed
+    def flush(self):
+        """Wait until every change has been written to disk."""
+        self.storage.flush()
+    
+    def close(self):
+        """Write any pending changes and release the storage backend."""
+        self.storage.close()
     
+    def get_assignment(self, assignment_id: int) -> Optional[Assignment]:
+        """Get a single assignment by id."""
+        return self._by_id.get(assignment_id)
+    
+    @timed
+    @synchronized
     def add_assignment(self, title: str, course: str, due_date: str, 
                        description: str = "") -> Assignment:
         """Add a new assignment."""
+        previous_next_id = self.next_id
         assignment = Assignment(
             title=title,
             course=course,
             due_date=due_date,
             description=description,
-            assignment_id=self.next_id
+            assignment_id=self._reserve_ids(1)
         )
-        self.assignments.append(assignment)
-        self.next_id += 1
-        self.save_assignments()
+        self._index(assignment)
+        self._log_undo('add', assignment, previous_next_id)
+        self._persist({'op': 'add', 'record': assignment.to_dict(),
+                       'next_id': self.next_id})
+        self._emit(ChangeEvent.ADDED, [assignment.id])
         return assignment
     
+    @timed
+    @synchronized
     def update_assignment(self, assignment_id: int, **kwargs):
         """Update an existing assignment."""
-        for assignment in self.assignments:
-            if assignment.id == assignment_id:
-                for key, value in kwargs.items():
-                    if hasattr(assignment, key):
-                        setattr(assignment, key, value)
-                self.save_assignments()
-                return assignment
-        return None
+        assignment = self._by_id.get(assignment_id)
+        if assignment is None:
+            return None
+        
+        changed = [key for key, value in kwargs.items()
+                   if hasattr(assignment, key) and getattr(assignment, key) != value]
+        if not changed:
+            return assignment
+        
+        self._log_undo('update', assignment, {key: getattr(assignment, key) for key in changed})
+        self._unindex(assignment)
+        for key in changed:
+            setattr(assignment, key, kwargs[key])
+        self._index(assignment)
+        self._persist({'op': 'update', 'record': assignment.to_dict(), 'fields': changed})
+        self._emit(ChangeEvent.UPDATED, [assignment.id], changed)
+        return assignment
     
+    @timed
+    @synchronized
     def delete_assignment(self, assignment_id: int):
         """Delete an assignment."""
-        self.assignments = [a for a in self.assignments if a.id != assignment_id]
-        self.save_assignments()
+        if assignment_id not in self._by_id:
+            return
+        if self._batch_entries is not None and self._batch_order is None:
+            self._batch_order = list(self._by_id)
+        assignment = self._by_id.pop(assignment_id)
+        self._log_undo('delete', assignment)
+        self._unindex(assignment)
+        self._persist({'op': 'delete', 'id': assignment_id})
+        self._emit(ChangeEvent.DELETED, [assignment_id])
     
     def mark_complete(self, assignment_id: int, completed: bool = True):
         """Mark an assignment as complete or incomplete."""
@@ -155,46 +990,290 @@ class AssignmentManager:
         """Add a grade to an assignment."""
         return self.update_assignment(assignment_id, grade=grade)
     
+    @timed
+    def update_many(self, assignment_ids: Iterable[int], **kwargs) -> List[Assignment]:
+        """Apply the same changes to several assignments in one batch."""
+        with self.batch():
+            updated = [self.update_assignment(i, **kwargs) for i in assignment_ids]
+        return [a for a in updated if a is not None]
+    
+    @timed
+    def delete_many(self, assignment_ids: Iterable[int]):
+        """Delete several assignments in one batch."""
+        with self.batch():
+            for assignment_id in assignment_ids:
+                self.delete_assignment(assignment_id)
+    
+    def mark_complete_many(self, assignment_ids: Iterable[int],
+                           completed: bool = True) -> List[Assignment]:
+        """Mark several assignments complete or incomplete in one batch."""
+        return self.update_many(assignment_ids, completed=completed)
+    
+    @timed
     def get_all_assignments(self) -> List[Assignment]:
         """Get all assignments."""
         return self.assignments
     
+    @timed
     def get_pending_assignments(self) -> List[Assignment]:
         """Get all incomplete assignments."""
-        return [a for a in self.assignments if not a.completed]
+        return self._ids_to_assignments(self._pending_ids)
     
+    @timed
     def get_completed_assignments(self) -> List[Assignment]:
         """Get all completed assignments."""
-        return [a for a in self.assignments if a.completed]
+        return self._ids_to_assignments(self._completed_ids)
     
-    def get_overdue_assignments(self) -> List[Assignment]:
+    @timed
+    def get_overdue_assignments(self, today: Optional[date] = None) -> List[Assignment]:
         """Get all overdue assignments."""
-        return [a for a in self.assignments if a.is_overdue()]
+        if today is None or today == date.today():
+            self._roll_overdue(date.today())
+            return self._ids_to_assignments(self._overdue_ids)
+        
+        # only entries due before today can be overdue
+        end = bisect_left(self._due_index, (today.isoformat(),))
+        candidates = (self._by_id[i] for _, i in self._due_index[:end]
+                      if i in self._pending_ids)
+        return [a for a in candidates if a.is_overdue(today)]
+    
+    @timed
+    def get_assignments_due_between(self, start: date, end: date) -> List[Assignment]:
+        """Get assignments due from start to end (inclusive), sorted by due date."""
+        lo = bisect_left(self._due_index, (start.isoformat(),))
+        hi = bisect_right(self._due_index, (end.isoformat(), float('inf')))
+        candidates = (self._by_id[i] for _, i in self._due_index[lo:hi])
+        # skip malformed dates that happen to sort into the range
+        return [a for a in candidates if a.due is not None and start <= a.due <= end]
     
+    @timed
     def sort_by_due_date(self, assignments: List[Assignment] = None) -> List[Assignment]:
         """Sort assignments by due date."""
         if assignments is None:
-            assignments = self.assignments
+            return [self._by_id[i] for _, i in self._due_index]
         return sorted(assignments, key=lambda a: a.due_date)
     
+    def _plan(self, query: Query) -> Tuple[str, List[int], bool]:
+        """
+        Pick the index that leaves the fewest candidates for a query.
+        
+        Returns:
+            (index name, candidate ids, whether the index alone answers the
+            query); the ids are in due-date order for the due_date index
+            and in id order otherwise
+        """
+        # (candidates, name, ids builder, criteria the index answers exactly)
+        plans = [(len(self._by_id), 'all', lambda: sorted(self._by_id), set())]
+        
+        if query.ids is not None:
+            plans.append((len(query.ids), 'ids',
+                          lambda: sorted(i for i in query.ids if i in self._by_id), {'ids'}))
+        if query.courses is not None:
+            course_ids = [self._by_course.get(c, ()) for c in query.courses]
+            plans.append((sum(map(len, course_ids)), 'course',
+                          lambda: sorted(itertools.chain.from_iterable(course_ids)),
+                          {'courses'}))
+        if query.search is not None:
+            found = self._search_index().search(query.search)
+            plans.append((len(found), 'search', lambda: sorted(found), {'search'}))
+        if query.completed is not None:
+            status_ids = self._completed_ids if query.completed else self._pending_ids
+            plans.append((len(status_ids), 'status', lambda: sorted(status_ids),
+                          {'completed'}))
+        
+        due_before = query.due_before
+        if query.overdue:
+            # overdue means due before today
+            yesterday = query.today - timedelta(days=1)
+            due_before = min(due_before, yesterday) if due_before else yesterday
+            if query.today == date.today():
+                self._roll_overdue(query.today)
+                plans.append((len(self._overdue_ids), 'overdue',
+                              lambda: sorted(self._overdue_ids), {'overdue'}))
+        if query.due_after or due_before:
+            lo = bisect_left(self._due_index, (query.due_after.isoformat(),)) \
+                if query.due_after else 0
+            hi = bisect_right(self._due_index, (due_before.isoformat(), float('inf'))) \
+                if due_before else len(self._due_index)
+            # malformed dates can sort into the range, so this is never exact
+            plans.append((max(hi - lo, 0), 'due_date',
+                          lambda: [i for _, i in self._due_index[lo:hi]], set()))
+        
+        # on a tie, prefer the index that leaves fewer criteria to check
+        _, name, build, answered = min(plans, key=lambda plan: (plan[0], -len(plan[3])))
+        return name, build(), query.criteria <= answered
+    
+    @timed
+    def query(self, query: Query) -> Iterator[Assignment]:
+        """
+        Find the assignments matching a query, in the order it asks for.
+        
+        The most selective index supplies the candidates and the rest of the
+        criteria are checked one assignment at a time. Results are produced
+        lazily when no sorting is needed (sort=None, or by due date when the
+        due-date index was used); otherwise limit keeps only the top entries
+        instead of sorting everything.
+        """
+        with self.lock:
+            name, ids, exact = self._plan(query)
+        in_order = name == 'due_date' and query.sort == 'due_date'
+        if name == 'due_date' and query.sort is not None and not in_order:
+            # the stable sorts below need the candidates in id order
+            ids.sort()
+        if query.reverse:
+            ids.reverse()
+        found = map(self._by_id.get, ids)
+        found = (a for a in found if a is not None and (exact or query.matches(a)))
+        
+        if query.sort is not None and not in_order:
+            keys = Query.SORT_KEYS[query.sort]
+            if query.limit is not None and len(keys) == 1:
+                # like a stable sort, these keep input (id) order for ties
+                top = nlargest if query.reverse else nsmallest
+                found = iter(top(query.offset + query.limit, found, key=keys[0]))
+            else:
+                found = list(found)
+                for key in reversed(keys):
+                    found.sort(key=key, reverse=query.reverse)
+                found = iter(found)
+        
+        stop = None if query.limit is None else query.offset + query.limit
+        return itertools.islice(found, query.offset, stop)
+    
+    def explain(self, query: Query) -> Dict:
+        """Describe how query() would run: the index used and its candidates."""
+        with self.lock:
+            name, ids, exact = self._plan(query)
+        return {
+            'index': name,
+            'candidates': len(ids),
+            'filtered': not exact,
+            'sorted': query.sort is not None and not (name == 'due_date'
+                                                     and query.sort == 'due_date'),
+        }
+    
+    def search(self, text: str, limit: Optional[int] = None) -> List[Assignment]:
+        """
+        Find assignments by words in their title, course or description.
+        
+        Every word typed must start a word of the assignment, so partial
+        words work as the user types. Results are sorted by due date.
+        """
+        return list(self.query(Query(search=text, limit=limit)))
+    
+    @timed
+    def get_statistics(self, course: Optional[str] = None) -> Dict[str, int]:
+        """
+        Get assignment counts, kept up to date on every change.
+        
+        Args:
+            course: Count only this course (default: all assignments)
+        
+        Returns:
+            Dictionary with total, pending, completed, overdue and graded counts
+        """
+        self._roll_overdue(date.today())
+        counter = self._stats.get(course, Counter())
+        return {
+            'total': counter['total'],
+            'pending': counter['total'] - counter['completed'],
+            'completed': counter['completed'],
+            'overdue': counter['overdue'],
+            'graded': counter['graded']
+        }
+    
     def get_all_courses(self) -> List[str]:
         """Get list of all unique course names."""
-        courses = set(a.course for a in self.assignments)
-        return sorted(list(courses))
+        with self.lock:
+            if self._shards is not None:
+                return sorted(self._shards)
+        return sorted(self._by_course)
     
+    @timed
     def get_assignments_by_course(self, course: str) -> List[Assignment]:
         """Get all assignments for a specific course."""
-        return [a for a in self.assignments if a.course == course]
+        with self.lock:
+            if self._shards is not None:
+                if course not in self._shards:
+                    return []
+                if self._shards[course] is None:
+                    self._shards[course] = [Assignment.from_dict(r)
+                                            for r in self.storage.load_course(course)]
+                return sorted(self._shards[course], key=lambda a: a.id)
+        return self._ids_to_assignments(self._by_course.get(course, ()))
     
     def export_data(self) -> Dict:
         """Export all data as a dictionary for backup/transfer."""
+        data = {'assignments': [a.to_dict() for a in self._by_id.values()]}
+        data.update(self.export_meta())
+        return data
+    
+    def export_meta(self) -> Dict:
+        """Top-level values stored next to the exported assignments."""
         return {
-            'assignments': [a.to_dict() for a in self.assignments],
             'next_id': self.next_id,
             'export_date': datetime.now().isoformat(),
             'version': '1.0'
         }
     
+    def iter_records(self, chunk_size: int = 1000,
+                     query: Optional[Query] = None) -> Iterator[Dict]:
+        """
+        Yield every assignment as a dictionary, in the order they were added.
+        
+        With a query, only its matches are yielded, in its order. The lock
+        is only held while one chunk is converted, so edits made during a
+        long export wait for at most one chunk. Assignments deleted in the
+        meantime are skipped.
+        """
+        with self.lock:
+            if query is None:
+                ids = list(self._by_id)
+            else:
+                ids = [a.id for a in self.query(query)]
+        for start in range(0, len(ids), chunk_size):
+            with self.lock:
+                chunk = [a.to_dict() for a in map(self._by_id.get, ids[start:start + chunk_size])
+                         if a is not None]
+            yield from chunk
+    
+    @timed
+    def export_to_file(self, path: str, chunk_size: int = 1000,
+                       progress: Optional[Callable[[int], None]] = None,
+                       cancel: Optional[threading.Event] = None,
+                       query: Optional[Query] = None) -> bool:
+        """
+        Stream every assignment (or a query's matches) to an export file.
+        
+        The format and compression follow the file name; see
+        storage.RecordWriter. Safe to call from a worker thread.
+        
+        Args:
+            path: File to write
+            chunk_size: Records written between progress calls
+            progress: Called with the number of records written so far
+            cancel: Event that stops the export when set
+            query: Export only the assignments matching this query
+            
+        Returns:
+            False if the export was cancelled, True otherwise
+        """
+        with RecordWriter(path) as writer:
+            for record in self.iter_records(chunk_size, query):
+                writer.write(record)
+                if writer.count % chunk_size == 0:
+                    if cancel is not None and cancel.is_set():
+                        writer.abort()
+                        return False
+                    if progress is not None:
+                        progress(writer.count)
+            writer.close(self.export_meta())
+        if progress is not None:
+            progress(writer.count)
+        return True
+    
+    @timed
+    @synchronized
     def import_data(self, data: Dict, merge: bool = False):
         """
         Import data from a dictionary.
@@ -203,20 +1282,63 @@ class AssignmentManager:
             data: Dictionary containing assignment data
             merge: If True, merge with existing data. If False, replace all data.
         """
-        if not merge:
-            self.assignments = []
-            self.next_id = 1
+        session = self.begin_import(merge)
+        session.add(data.get('assignments', []))
+        session.commit(data.get('next_id'))
+    
+    @timed
+    def import_records(self, records: Iterable[Dict], merge: bool = False,
+                       chunk_size: int = 1000,
+                       progress: Optional[Callable[[int], None]] = None):
+        """
+        Import records from any iterable, such as a storage.RecordReader.
         
-        imported_assignments = [Assignment.from_dict(a) for a in data.get('assignments', [])]
+        Records are converted chunk by chunk, so the raw data never has to
+        be in memory all at once. If the iterable has a next_id attribute
+        once exhausted, it is used like the next_id of import_data().
         
-        if merge:
+        Args:
+            records: Assignment dictionaries
+            merge: If True, merge with existing data. If False, replace all data.
+            chunk_size: Records converted between progress calls
+            progress: Called with the number of records read so far
+        """
+        session = self.begin_import(merge)
+        session.read(records, chunk_size, progress)
+        session.commit(getattr(records, 'next_id', None))
+    
+    def begin_import(self, merge: bool = False) -> ImportSession:
+        """Start a chunked import; see ImportSession."""
+        return ImportSession(self, merge)
+    
+    @timed
+    @synchronized
+    def _commit_import(self, session: ImportSession, next_id: Optional[int]):
+        """Apply a finished ImportSession."""
+        imported_assignments = session.assignments
+        self._log_undo('reset', self.assignments, self.next_id)
+        
+        if session.merge:
             # Reassign IDs to avoid conflicts
-            for assignment in imported_assignments:
-                assignment.id = self.next_id
-                self.next_id += 1
-            self.assignments.extend(imported_assignments)
+            first_id = self._reserve_ids(len(imported_assignments))
+            for offset, assignment in enumerate(imported_assignments):
+                assignment.id = first_id + offset
+            self._rebuild_indexes(self.assignments + imported_assignments)
         else:
-            self.assignments = imported_assignments
-            self.next_id = data.get('next_id', len(self.assignments) + 1)
+            # keep the file's ids, but give missing and repeated ones fresh ids
+            # so no record overwrites another in the indexes
+            kept, fresh = set(), []
+            for assignment in imported_assignments:
+                if isinstance(assignment.id, int) and assignment.id not in kept:
+                    kept.add(assignment.id)
+                else:
+                    fresh.append(assignment)
+            self.next_id = max(next_id or len(kept) + 1, max(kept, default=0) + 1)
+            if fresh:
+                first_id = self._reserve_ids(len(fresh))
+                for offset, assignment in enumerate(fresh):
+                    assignment.id = first_id + offset
+            self._rebuild_indexes(imported_assignments)
         
         self.save_assignments()
+        self._emit(ChangeEvent.IMPORTED, [a.id for a in imported_assignments])
@@ -0,0 +1,535 @@
+"""
+Asyncio Assignment Service
+
+An asyncio front end for AssignmentManager, for serving many clients at
+once without every request waiting on the disk:
+
+- Reads run straight against the in-memory indexes on the event loop.
+  They never wait for a write, so any number of them proceed while a
+  commit is in flight. Reads that touch every assignment (a full
+  export, a listing) run on a worker thread instead, so they do not
+  hold up the loop; the writer and other reads wait for them to finish
+  reading, but not for their JSON encoding.
+- Writes are queued and applied by a single writer task, in the order
+  they arrived. Whatever piled up while the previous commit was being
+  written is applied next and then written in one storage call on a
+  worker thread (group commit). A write's result is only returned once
+  it is on disk.
+- The queue is bounded. Callers of the Python API wait for room; the
+  HTTP front end answers 503 instead, so clients can back off.
+
+Reads see changes as soon as the writer applies them, a moment before
+they are on disk. If a commit fails, its writes fail with the error and
+are written again with the next commit.
+
+    python main.py serve --async --port 8765
+
+serves the same HTTP API as server.py. benchmarks/loadgen.py measures
+either server.
+
+Author: Betapandas
+Contact: Betapandas@gmail.com
+"""
+
+import asyncio
+import json
+import signal
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from http import HTTPStatus
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from assignment_model import Assignment, AssignmentManager, ChangeEvent, Query
+from instrumentation import span, timed
+from server import KEEPALIVE_TIMEOUT, EventLog, error_response, event_window, handle_request
+from storage import JournalStorage, JsonStorage, Snapshot, open_storage
+
+
+# writes that may wait for the writer before callers are held back
+MAX_PENDING = 1000
+
+# most writes applied and committed together
+MAX_GROUP = 500
+
+# longest request head (request line plus headers) accepted, in bytes
+MAX_HEAD = 64 * 1024
+
+# GET routes that may touch every assignment, run on a worker thread
+THREAD_READS = (['export'], ['assignments'])
+
+
+class Overloaded(Exception):
+    """Too many writes are already waiting; try again later."""
+
+
+class _CommitBuffer:
+    """Storage backend that keeps the manager's writes for the writer task."""
+
+    def __init__(self, inner):
+        """Wrap the backend that does the actual writing."""
+        self.inner = inner
+        self.entries: List[Dict] = []
+        self.full: Optional[Tuple[List[Dict], int]] = None
+
+    @property
+    def path(self) -> str:
+        """Data file of the wrapped backend."""
+        return self.inner.path
+
+    def load(self) -> Tuple[List[Dict], int]:
+        """Load through the wrapped backend."""
+        return self.inner.load()
+
+    def reserve_ids(self, next_id: int, count: int = 1) -> int:
+        """Claim new ids through the wrapped backend, right away."""
+        return self.inner.reserve_ids(next_id, count)
+
+    def save(self, records: List[Dict], next_id: int):
+        """Keep a full rewrite, replacing any kept changes."""
+        self.full = (records, next_id)
+        self.entries = []
+
+    def append(self, entry: Dict, snapshot: Snapshot):
+        """Keep a single change entry."""
+        self.entries.append(entry)
+
+    def append_many(self, entries, snapshot: Snapshot):
+        """Keep several change entries."""
+        self.entries.extend(entries)
+
+    def take(self) -> Tuple[List[Dict], Optional[Tuple[List[Dict], int]]]:
+        """Hand over everything kept so far as (entries, full rewrite or None)."""
+        taken = self.entries, self.full
+        self.entries, self.full = [], None
+        return taken
+
+    def put_back(self, entries: List[Dict], full: Optional[Tuple[List[Dict], int]]):
+        """Return writes that failed, so the next commit retries them."""
+        if full is not None and self.full is None:
+            self.full = full
+        self.entries[:0] = entries
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class AsyncAssignmentManager:
+    """
+    Serves an AssignmentManager to coroutines; see the module docstring.
+
+    The manager must only be changed through this object from now on.
+    Use it as "async with", or call start() and close() yourself.
+    """
+
+    def __init__(self, manager: AssignmentManager, max_pending: int = MAX_PENDING,
+                 max_group: int = MAX_GROUP):
+        """
+        Take over a loaded manager.
+
+        Args:
+            manager: Manager to serve; its storage backend is wrapped
+            max_pending: Writes that may wait for the writer at once
+            max_group: Most writes committed together
+        """
+        # reads are served from memory, so any lazily loaded shards are read now
+        manager.ensure_loaded()
+        self.manager = manager
+        self.storage = manager.storage
+        self._buffer = manager.storage = _CommitBuffer(manager.storage)
+        self.max_group = max_group
+        self._queue: asyncio.Queue = asyncio.Queue(max_pending)
+        # one thread, so commits reach the disk in order
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="AsyncCommit")
+        # long reads; held by one while it runs, since the manager must not
+        # change under it (see read())
+        self._reader = ThreadPoolExecutor(1, thread_name_prefix="AsyncRead")
+        self._reading = asyncio.Lock()
+        self._writer: Optional[asyncio.Task] = None
+        self._closed = False
+        # totals for reporting how well writes are grouped
+        self.commits = 0
+        self.committed_writes = 0
+
+    @classmethod
+    async def open(cls, path: str = "assignments.json", journal: bool = True,
+                   **options) -> 'AsyncAssignmentManager':
+        """
+        Load a data file on a worker thread and start serving it.
+
+        With journal, a JSON data file is kept as a JournalStorage: each
+        commit is one append to its journal rather than a full rewrite,
+        and close() folds the journal back into the file.
+        """
+        storage = open_storage(path)
+        if journal and type(storage) is JsonStorage:
+            storage = JournalStorage(path)
+        loop = asyncio.get_running_loop()
+
+        def load():
+            manager = AssignmentManager(path, storage=storage)
+            manager.ensure_loaded()
+            return manager
+
+        manager = await loop.run_in_executor(None, load)
+        service = cls(manager, **options)
+        service.start()
+        return service
+
+    def start(self):
+        """Start the writer task on the running event loop."""
+        if self._writer is None:
+            self._writer = asyncio.get_running_loop().create_task(self._write_loop())
+
+    async def close(self):
+        """Finish the queued writes, then release the storage backend."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._writer is not None:
+            await self._queue.join()
+            self._writer.cancel()
+        error = await self._commit()
+        if error is None and isinstance(self.storage, JournalStorage) \
+                and self.storage.journal_length:
+            # leave a plain data file for the GUI and the CLI
+            await asyncio.get_running_loop().run_in_executor(
+                self._executor, self.storage.compact, self._snapshot)
+        self._executor.shutdown()
+        self._reader.shutdown()
+        self.storage.close()
+        if error is not None:
+            raise error
+
+    async def __aenter__(self) -> 'AsyncAssignmentManager':
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    @property
+    def pending(self) -> int:
+        """Writes waiting for the writer task."""
+        return self._queue.qsize()
+
+    async def submit(self, change: Callable, *args, wait: bool = True):
+        """
+        Run a function that changes the manager, once it is durable.
+
+        Args:
+            change: Called as change(*args) by the writer task
+            wait: Wait for room in the queue instead of raising Overloaded
+
+        Returns:
+            What change returned, after the write is on disk
+        """
+        if self._closed:
+            raise RuntimeError("The service is closed")
+        future = asyncio.get_running_loop().create_future()
+        item = (future, change, args)
+        if wait:
+            await self._queue.put(item)
+        else:
+            try:
+                self._queue.put_nowait(item)
+            except asyncio.QueueFull:
+                raise Overloaded(f"{self._queue.maxsize} writes are already waiting") from None
+        return await future
+
+    async def _write_loop(self):
+        """Writer task: apply queued writes in order, committing them in groups."""
+        while True:
+            group = [await self._queue.get()]
+            while len(group) < self.max_group and not self._queue.empty():
+                group.append(self._queue.get_nowait())
+
+            outcomes = []
+            async with self._reading:
+                for future, change, args in group:
+                    if future.cancelled():
+                        # the caller gave up before it ran
+                        continue
+                    try:
+                        outcomes.append((future, change(*args), None))
+                    except Exception as e:
+                        outcomes.append((future, None, e))
+
+            error = await self._commit()
+            if error is None:
+                self.committed_writes += len(outcomes)
+            for future, result, failure in outcomes:
+                if future.cancelled():
+                    continue
+                failure = failure or error
+                if failure is not None:
+                    future.set_exception(failure)
+                else:
+                    future.set_result(result)
+            for _ in group:
+                self._queue.task_done()
+
+    async def _commit(self) -> Optional[Exception]:
+        """Write what the applied changes left in the buffer; returns any error."""
+        entries, full = self._buffer.take()
+        if not entries and full is None:
+            return None
+        with span("AsyncAssignmentManager.commit"):
+            try:
+                await asyncio.get_running_loop().run_in_executor(
+                    self._executor, self._write, entries, full)
+            except Exception as e:
+                self._buffer.put_back(entries, full)
+                return e
+        self.commits += 1
+        return None
+
+    @timed
+    def _write(self, entries: List[Dict], full: Optional[Tuple[List[Dict], int]]):
+        """Hand one commit to the storage backend (on the commit thread)."""
+        if full is not None:
+            self.storage.save(*full)
+        if entries:
+            self.storage.append_many(entries, self._snapshot)
+
+    def _snapshot(self) -> Tuple[List[Dict], int]:
+        """Full state for backends that rewrite the whole file."""
+        # the writer task waits for this commit before changing anything,
+        # so reading without the lock cannot see a half-made change
+        return [a.to_dict() for a in self.manager._by_id.values()], self.manager.next_id
+
+    async def read(self, func: Callable, *args, thread: bool = False):
+        """
+        Run func(*args), a call that only reads the manager.
+
+        Quick reads run right here on the event loop. Pass thread=True for
+        long ones, such as a full export: they run on a worker thread so
+        the loop stays free for other clients. The writer task and other
+        reads wait until such a read is done.
+        """
+        async with self._reading:
+            if not thread:
+                return func(*args)
+            return await asyncio.get_running_loop().run_in_executor(self._reader, func, *args)
+
+    async def encode(self, result) -> bytes:
+        """JSON-encode a large result on the reader thread."""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._reader, lambda: json.dumps(result).encode('utf-8'))
+
+    def subscribe(self, callback: Callable[[ChangeEvent], None], kinds=None):
+        """Get change events, on the event loop; see AssignmentManager.subscribe()."""
+        return self.manager.subscribe(callback, kinds)
+
+    async def get_assignment(self, assignment_id: int) -> Optional[Assignment]:
+        """Get a single assignment by id."""
+        return await self.read(self.manager.get_assignment, assignment_id)
+
+    async def query(self, query: Query) -> List[Assignment]:
+        """Run a query; see AssignmentManager.query()."""
+        return await self.read(lambda: list(self.manager.query(query)), thread=True)
+
+    async def search(self, text: str, limit: Optional[int] = None) -> List[Assignment]:
+        """Find assignments by words; see AssignmentManager.search()."""
+        return await self.read(self.manager.search, text, limit)
+
+    async def get_statistics(self, course: Optional[str] = None) -> Dict[str, int]:
+        """Get assignment counts."""
+        return await self.read(self.manager.get_statistics, course)
+
+    async def get_all_courses(self) -> List[str]:
+        """Get list of all unique course names."""
+        return await self.read(self.manager.get_all_courses)
+
+    async def get_overdue_assignments(self, today: Optional[date] = None) -> List[Assignment]:
+        """Get all overdue assignments."""
+        return await self.read(self.manager.get_overdue_assignments, today)
+
+    async def export_data(self) -> Dict:
+        """Export all data as a dictionary for backup/transfer."""
+        return await self.read(self.manager.export_data, thread=True)
+
+    async def add_assignment(self, title: str, course: str, due_date: str,
+                             description: str = "") -> Assignment:
+        """Add a new assignment."""
+        return await self.submit(self.manager.add_assignment, title, course, due_date,
+                                 description)
+
+    async def update_assignment(self, assignment_id: int, **kwargs):
+        """Update an existing assignment."""
+        return await self.submit(lambda: self.manager.update_assignment(assignment_id, **kwargs))
+
+    async def delete_assignment(self, assignment_id: int):
+        """Delete an assignment."""
+        return await self.submit(self.manager.delete_assignment, assignment_id)
+
+    async def mark_complete(self, assignment_id: int, completed: bool = True):
+        """Mark an assignment as complete or incomplete."""
+        return await self.update_assignment(assignment_id, completed=completed)
+
+    async def add_grade(self, assignment_id: int, grade: str):
+        """Add a grade to an assignment."""
+        return await self.update_assignment(assignment_id, grade=grade)
+
+    async def update_many(self, assignment_ids, **kwargs) -> List[Assignment]:
+        """Apply the same changes to several assignments, all or nothing."""
+        ids = list(assignment_ids)
+        return await self.submit(lambda: self.manager.update_many(ids, **kwargs))
+
+    async def delete_many(self, assignment_ids):
+        """Delete several assignments, all or nothing."""
+        return await self.submit(self.manager.delete_many, list(assignment_ids))
+
+    async def import_data(self, data: Dict, merge: bool = False):
+        """Import data from a dictionary; see AssignmentManager.import_data()."""
+        return await self.submit(self.manager.import_data, data, merge)
+
+
+class AsyncApiServer:
+    """The HTTP API of server.py, served by an AsyncAssignmentManager."""
+
+    def __init__(self, service: AsyncAssignmentManager, verbose: bool = False):
+        """
+        Prepare to serve.
+
+        Args:
+            service: Service whose manager is shared
+            verbose: Log every request to stderr
+        """
+        self.service = service
+        self.verbose = verbose
+        self.events = EventLog(service.manager)
+        # set and replaced on every change, to wake up /events long polls
+        self._changed = asyncio.Event()
+        service.subscribe(self._wake)
+
+    def _wake(self, event: ChangeEvent):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def start(self, host: str, port: int) -> asyncio.AbstractServer:
+        """Listen on host:port (0 picks a free port)."""
+        return await asyncio.start_server(self.handle_connection, host, port, limit=MAX_HEAD)
+
+    async def handle_connection(self, reader: asyncio.StreamReader,
+                                writer: asyncio.StreamWriter):
+        """Answer requests on one keep-alive connection until it closes."""
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"),
+                                                  KEEPALIVE_TIMEOUT)
+                    request_line, *header_lines = head.decode('latin-1').split("\r\n")
+                    method, target, version = request_line.split(" ")
+                    headers = {}
+                    for line in header_lines:
+                        if line:
+                            name, value = line.split(":", 1)
+                            headers[name.strip().lower()] = value.strip()
+                    length = int(headers.get('content-length') or 0)
+                    raw = await reader.readexactly(length) if length else b""
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                        asyncio.TimeoutError, ConnectionError):
+                    return
+                except ValueError:
+                    await self.send(writer, 400, {'error': "Malformed request"}, False)
+                    return
+
+                status, result = await self.respond(method, target, headers, raw)
+                keep_alive = version == "HTTP/1.1" and \
+                    headers.get('connection', "").lower() != "close"
+                await self.send(writer, status, result, keep_alive)
+                if self.verbose:
+                    print(f'"{method} {target} {version}" {status}', file=sys.stderr)
+                if not keep_alive:
+                    return
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def send(self, writer: asyncio.StreamWriter, status: int, result, keep_alive: bool):
+        """Write one JSON response; result may already be encoded."""
+        if isinstance(result, bytes):
+            data = result
+        else:
+            data = json.dumps(result).encode('utf-8') if result is not None else b""
+        head = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}",
+                f"Content-Length: {len(data)}"]
+        if data:
+            head.append("Content-Type: application/json")
+        if not keep_alive:
+            head.append("Connection: close")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode('latin-1') + data)
+        await writer.drain()
+
+    async def respond(self, method: str, target: str, headers: Dict, raw: bytes):
+        """Run one request; returns (status, JSON result)."""
+        url = urlsplit(target)
+        parts = [part for part in url.path.split('/') if part]
+        params = parse_qs(url.query)
+        try:
+            body = json.loads(raw) if raw else {}
+            if parts == ['events'] and method == 'GET':
+                return 200, await self.events_since(*event_window(params))
+            if method == 'GET':
+                # reads never wait for the writer; long ones run on a thread
+                thread = parts in THREAD_READS
+                status, result = await self.service.read(
+                    handle_request, self.service.manager, method, parts, params, body,
+                    thread=thread)
+                if thread:
+                    result = await self.service.encode(result)
+                return status, result
+            return await self.service.submit(self.apply, headers.get('x-client-id'),
+                                             method, parts, params, body, wait=False)
+        except Overloaded as e:
+            return 503, {'error': str(e)}
+        except Exception as e:
+            status, result = error_response(e)
+            if status == 500:
+                print(f"{method} {target} failed: {e!r}", file=sys.stderr)
+            return status, result
+
+    def apply(self, client: Optional[str], method: str, parts: List[str],
+              params: Dict, body: Dict):
+        """Run a write request; called by the writer task."""
+        self.events.origin.client = client
+        return handle_request(self.service.manager, method, parts, params, body)
+
+    async def events_since(self, since: int, wait: float) -> Dict:
+        """GET /events, waiting on the event loop instead of a thread."""
+        if wait > 0 and self.events.seq <= since:
+            try:
+                await asyncio.wait_for(self._changed.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+        latest, events = self.events.since(since)
+        return {'seq': latest, 'events': events}
+
+
+async def serve(path: str, host: str, port: int, verbose: bool = False,
+                max_pending: int = MAX_PENDING):
+    """Serve a data file until cancelled."""
+    service = await AsyncAssignmentManager.open(path, max_pending=max_pending)
+    api = AsyncApiServer(service, verbose)
+    server = await api.start(host, port)
+    # stop on SIGTERM too, so queued writes still reach the disk
+    task = asyncio.current_task()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, task.cancel)
+    print(f"Serving {path} on http://{host}:{server.sockets[0].getsockname()[1]}/ "
+          f"with asyncio (Ctrl+C to stop)", flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    except asyncio.CancelledError:
+        pass
+    finally:
+        await service.close()
+        if service.commits:
+            print(f"{service.committed_writes} writes in {service.commits} commits",
+                  file=sys.stderr)
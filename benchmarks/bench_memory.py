@@ -0,0 +1,71 @@
+"""
+Per-record memory benchmark for Assignment.
+
+Compares the current slotted Assignment against the original
+dict-based layout by building N records of each and measuring the
+allocated memory with tracemalloc.
+
+Usage (from the project root):
+    python -m benchmarks.bench_memory [count]
+"""
+
+import json
+import sys
+import tracemalloc
+from datetime import datetime
+
+from assignment_model import Assignment
+from benchmarks.dataset import make_records
+
+
+class DictAssignment:
+    """The original Assignment layout: a plain __dict__ object."""
+
+    def __init__(self, title, course, due_date, description="",
+                 completed=False, grade="", assignment_id=None):
+        self.id = assignment_id
+        self.title = title
+        self.course = course
+        self.due_date = due_date
+        self.description = description
+        self.completed = completed
+        self.grade = grade
+        self.created_at = datetime.now().isoformat()
+
+
+def make_fields(count):
+    """Build raw field tuples the way json.load would hand them over."""
+    # a JSON round trip gives every record fresh strings, like a parse does
+    records = json.loads(json.dumps(make_records(count)))
+    return [(r['title'], r['course'], r['due_date'], r['description'], r['id'])
+            for r in records]
+
+
+def measure(cls, count):
+    """Return bytes retained per record after building count cls objects."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    records = make_fields(count)
+    objects = [cls(title, course, due_date, description, assignment_id=i)
+               for title, course, due_date, description, i in records]
+    # drop the parsed input so only what the objects keep alive is counted
+    del records
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / len(objects)
+
+
+def main():
+    """Run the benchmark and print the results."""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    print(f"Building {count} records of each layout...")
+    before = measure(DictAssignment, count)
+    after = measure(Assignment, count)
+    print(f"dict layout:    {before:8.1f} bytes/record")
+    print(f"slotted layout: {after:8.1f} bytes/record")
+    print(f"saved:          {before - after:8.1f} bytes/record "
+          f"({(before - after) / before:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Startup-time benchmark for the data file formats.
+
+Writes N synthetic assignments as a JSON data file and as a binary
+snapshot, then times how long AssignmentManager takes to load each one.
+Also times opening the snapshot and reading a handful of records lazily.
+
+Usage (from the project root):
+    python -m benchmarks.bench_startup [count]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from assignment_model import AssignmentManager
+from benchmarks.dataset import make_records
+from binary_snapshot import BinarySnapshot, BinaryStorage, write_snapshot
+from storage import JsonStorage, write_json_file
+
+
+def best_of(runs, func):
+    """Fastest wall-clock time of several calls, in seconds."""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    """Run the benchmark and print the results."""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    records = make_records(count)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, "assignments.json")
+        binary_path = os.path.join(tmp, "assignments.swb")
+        write_json_file(json_path, records, count + 1)
+        write_snapshot(binary_path, records, count + 1)
+        del records
+
+        def open_lazily():
+            with BinarySnapshot(binary_path) as snapshot:
+                for index in range(0, len(snapshot), max(1, len(snapshot) // 100)):
+                    snapshot[index]
+
+        print(f"Loading {count} assignments (best of 3)...")
+        print(f"JSON file:        {os.path.getsize(json_path) / 1e6:8.1f} MB")
+        print(f"binary snapshot:  {os.path.getsize(binary_path) / 1e6:8.1f} MB")
+        json_time = best_of(3, lambda: AssignmentManager(storage=JsonStorage(json_path)))
+        binary_time = best_of(3, lambda: AssignmentManager(storage=BinaryStorage(binary_path)))
+        lazy_time = best_of(3, open_lazily)
+        print(f"JSON load:        {json_time * 1000:8.1f} ms")
+        print(f"binary load:      {binary_time * 1000:8.1f} ms "
+              f"({json_time / binary_time:.1f}x faster)")
+        print(f"lazy open + 100:  {lazy_time * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+"""
+Synthetic assignment records shared by the benchmarks.
+
+Every benchmark builds its data here, so their numbers describe the same
+kind of data set and can be compared with each other.
+"""
+
+import random
+from datetime import date, timedelta
+
+
+def make_records(count, seed=1):
+    """Build count assignment dictionaries over roughly count/250 courses."""
+    rng = random.Random(seed)
+    courses = [f"Course {i}" for i in range(max(10, count // 250))]
+    start = date.today() - timedelta(days=180)
+    return [{
+        'id': i,
+        'title': f"Assignment {i}",
+        'course': rng.choice(courses),
+        'due_date': (start + timedelta(days=rng.randrange(365))).isoformat(),
+        'description': f"Description for assignment {i}",
+        'completed': rng.random() < 0.3,
+        'grade': rng.choice(("", "", "A", "B")),
+        'created_at': "2026-01-01T00:00:00"
+    } for i in range(1, count + 1)]
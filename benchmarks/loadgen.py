@@ -0,0 +1,246 @@
+"""
+Load generator for the HTTP API (server.py and async_service.py).
+
+Runs a number of client threads, each on its own keep-alive connection,
+sending a mix of reads and writes for a fixed time, then reports the
+requests per second and the latency percentiles per request kind.
+
+Usage (from the project root):
+    python -m benchmarks.loadgen --spawn async --size 10000
+    python -m benchmarks.loadgen --spawn threaded --clients 32 --writes 0.5
+    python -m benchmarks.loadgen --url http://127.0.0.1:8765 --duration 30
+
+--spawn starts a server of that kind on a temporary copy of synthetic
+data and stops it afterwards; --url measures a running one (its data is
+changed). The clients are Python threads, so on a fast server the client
+side can become the limit; run several loadgen processes to check.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+from benchmarks.dataset import make_records
+from storage import write_json_file
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of a sorted list."""
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Client(threading.Thread):
+    """One simulated user sending requests until told to stop."""
+
+    def __init__(self, host, port, seed, writes, ids, courses, stop):
+        super().__init__(daemon=True)
+        self.host = host
+        self.port = port
+        self.rng = random.Random(seed)
+        self.writes = writes
+        self.ids = ids
+        self.courses = courses
+        self.stop = stop
+        # request kind -> latencies in seconds
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(int)
+        self.failures = 0
+
+    def next_request(self):
+        """Pick (kind, method, path, body) for the next request."""
+        rng = self.rng
+        if rng.random() < self.writes:
+            if rng.random() < 0.8:
+                return ('update', 'PATCH', f"/assignments/{rng.choice(self.ids)}",
+                        {'grade': rng.choice(("A", "B", "C", ""))})
+            return ('add', 'POST', "/assignments",
+                    {'title': "Load test", 'course': rng.choice(self.courses),
+                     'due_date': "2026-06-01"})
+        roll = rng.random()
+        if roll < 0.5:
+            return ('get', 'GET', f"/assignments/{rng.choice(self.ids)}", None)
+        if roll < 0.8:
+            course = rng.choice(self.courses).replace(" ", "+")
+            return ('query', 'GET', f"/assignments?course={course}&completed=false&limit=50",
+                    None)
+        return ('stats', 'GET', "/stats", None)
+
+    def run(self):
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        headers = {'Content-Type': 'application/json', 'X-Client-Id': f"loadgen-{self.name}"}
+        while not self.stop.is_set():
+            kind, method, path, body = self.next_request()
+            data = json.dumps(body).encode('utf-8') if body is not None else None
+            start = time.perf_counter()
+            try:
+                connection.request(method, path, body=data, headers=headers)
+                response = connection.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException):
+                self.failures += 1
+                connection.close()
+                continue
+            self.latencies[kind].append(time.perf_counter() - start)
+            self.statuses[response.status] += 1
+        connection.close()
+
+
+def free_port():
+    """A TCP port that was free a moment ago."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def spawn_server(kind, size, directory):
+    """Start a server on synthetic data; returns (process, host, port)."""
+    path = os.path.join(directory, "assignments.json")
+    records = make_records(size)
+    write_json_file(path, records, size + 1)
+    port = free_port()
+    command = [sys.executable, os.path.join(ROOT, "main.py"), "serve",
+               "--port", str(port), "--data", path]
+    if kind == 'async':
+        command.append("--async")
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               text=True)
+    line = process.stdout.readline()
+    if not line.startswith("Serving"):
+        process.kill()
+        raise RuntimeError(f"server failed to start: {line}{process.stderr.read()}")
+    return process, "127.0.0.1", port
+
+
+def fetch_json(host, port, path):
+    """GET a JSON resource."""
+    connection = http.client.HTTPConnection(host, port, timeout=60)
+    try:
+        connection.request('GET', path)
+        return json.loads(connection.getresponse().read())
+    finally:
+        connection.close()
+
+
+def run(host, port, clients, duration, writes, seed=1):
+    """Drive the server; returns the report dictionary."""
+    records = fetch_json(host, port, "/assignments?sort=none")
+    ids = [r['id'] for r in records] or [1]
+    courses = sorted({r['course'] for r in records}) or ["Course 0"]
+
+    stop = threading.Event()
+    threads = [Client(host, port, seed + i, writes, ids, courses, stop)
+               for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    by_kind = defaultdict(list)
+    statuses = defaultdict(int)
+    for thread in threads:
+        for kind, latencies in thread.latencies.items():
+            by_kind[kind].extend(latencies)
+        for status, count in thread.statuses.items():
+            statuses[status] += count
+    everything = sorted(latency for latencies in by_kind.values() for latency in latencies)
+
+    def summary(latencies):
+        ordered = sorted(latencies)
+        return {
+            'count': len(ordered),
+            'p50': percentile(ordered, 0.5),
+            'p95': percentile(ordered, 0.95),
+            'p99': percentile(ordered, 0.99),
+            'max': ordered[-1],
+        }
+
+    return {
+        'clients': clients,
+        'duration': elapsed,
+        'writes': writes,
+        'requests': len(everything),
+        'requests_per_second': len(everything) / elapsed,
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'failures': sum(thread.failures for thread in threads),
+        'all': summary(everything) if everything else None,
+        'kinds': {kind: summary(latencies) for kind, latencies in sorted(by_kind.items())},
+    }
+
+
+def print_report(report):
+    """Print a report as a table, in milliseconds."""
+    print(f"{report['requests']} requests in {report['duration']:.1f} s from "
+          f"{report['clients']} clients: {report['requests_per_second']:.0f} requests/s")
+    print(f"statuses: {report['statuses']}, connection failures: {report['failures']}")
+    print(f"{'kind':<8} {'count':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    rows = list(report['kinds'].items())
+    if report['all']:
+        rows.append(('all', report['all']))
+    for kind, s in rows:
+        print(f"{kind:<8} {s['count']:>8} {s['p50'] * 1000:>9.2f} {s['p95'] * 1000:>9.2f} "
+              f"{s['p99'] * 1000:>9.2f} {s['max'] * 1000:>9.2f}")
+
+
+def main(argv=None):
+    """Run the load test; returns the process exit code."""
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.loadgen",
+                                     description="Measure the HTTP API under load.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--url', help="server to measure, e.g. http://127.0.0.1:8765")
+    target.add_argument('--spawn', choices=('threaded', 'async'),
+                        help="start a server of this kind on synthetic data")
+    parser.add_argument('--size', type=int, default=10000,
+                        help="assignments for --spawn (default: %(default)s)")
+    parser.add_argument('--clients', type=int, default=16,
+                        help="concurrent connections (default: %(default)s)")
+    parser.add_argument('--duration', type=float, default=10,
+                        help="seconds to run (default: %(default)s)")
+    parser.add_argument('--writes', type=float, default=0.2,
+                        help="fraction of requests that write (default: %(default)s)")
+    parser.add_argument('--output', metavar='FILE', help="write the report as JSON")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        process = None
+        if args.spawn:
+            process, host, port = spawn_server(args.spawn, args.size, tmp)
+        else:
+            url = urlsplit(args.url)
+            host, port = url.hostname, url.port or 80
+        try:
+            report = run(host, port, args.clients, args.duration, args.writes)
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+                summary = process.stderr.read().strip()
+                if summary:
+                    print(summary)
+    report['server'] = args.spawn or args.url
+
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
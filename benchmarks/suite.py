@@ -0,0 +1,343 @@
+"""
+Benchmark suite for the model and the GUI refresh paths.
+
+Generates synthetic data sets, times the main AssignmentManager operations
+and the All Assignments / By Course refreshes, and writes the results as
+JSON. The GUI runs headless: its Treeviews are replaced by a stand-in that
+keeps rows in plain Python structures, so no display is needed.
+
+Results can be compared with a stored baseline; any case that got slower
+than the allowed ratio is flagged and the exit code is 1.
+
+Usage (from the project root):
+    python -m benchmarks.suite                        # 1k, 10k, 100k
+    python -m benchmarks.suite --sizes 1000,1000000 --output results.json
+    python -m benchmarks.suite --baseline benchmarks/baseline.json
+    python -m benchmarks.suite --save-baseline benchmarks/baseline.json
+
+Mutations are timed against an in-memory backend so they measure the
+manager itself; load_assignments and save_assignments measure JSON I/O.
+Baselines are machine specific, so regenerate one on your own machine
+before comparing.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from assignment_model import AssignmentManager, Query
+from benchmarks.dataset import make_records
+from storage import JsonStorage, write_json_file
+from virtual_tree import VirtualTreeview
+
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+
+# operations per timed run for the single-record cases
+MUTATIONS = 200
+
+# slower than baseline * this is a regression
+DEFAULT_TOLERANCE = 1.25
+
+
+class MemoryStorage:
+    """Backend that keeps nothing, so mutations time only the manager."""
+
+    def __init__(self, records=(), next_id=1):
+        self.path = ":memory:"
+        self.records = list(records)
+        self.next_id = next_id
+
+    def load(self):
+        return self.records, self.next_id
+
+    def save(self, records, next_id):
+        pass
+
+    def append(self, entry, snapshot):
+        pass
+
+    def append_many(self, entries, snapshot):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class StandInTreeview:
+    """Just enough of ttk.Treeview for VirtualTreeview, without Tk."""
+
+    def __init__(self):
+        self.rows = {}
+        self.order = []
+        self._selection = ()
+        self._next = 0
+
+    def configure(self, **kwargs):
+        pass
+
+    def bind(self, *args, **kwargs):
+        pass
+
+    def insert(self, parent, index, **kwargs):
+        self._next += 1
+        iid = f"I{self._next}"
+        self.rows[iid] = kwargs
+        if index == 'end':
+            self.order.append(iid)
+        else:
+            self.order.insert(index, iid)
+        return iid
+
+    def item(self, iid, option=None, **kwargs):
+        if option is not None:
+            return self.rows[iid].get(option)
+        self.rows[iid].update(kwargs)
+
+    def delete(self, *iids):
+        for iid in iids:
+            del self.rows[iid]
+            self.order.remove(iid)
+
+    def get_children(self, item=''):
+        return tuple(self.order)
+
+    def move(self, iid, parent, index):
+        self.order.remove(iid)
+        self.order.insert(index, iid)
+
+    def index(self, iid):
+        return self.order.index(iid)
+
+    def selection(self):
+        return self._selection
+
+    def selection_set(self, selection):
+        self._selection = tuple(selection)
+
+    def yview(self, *args):
+        pass
+
+    def yview_moveto(self, fraction):
+        pass
+
+    def winfo_height(self):
+        return 600
+
+
+class StandInScrollbar:
+    """Scrollbar stand-in that ignores everything."""
+
+    def config(self, **kwargs):
+        pass
+
+    def set(self, first, last):
+        pass
+
+
+class HeadlessTreeview(VirtualTreeview):
+    """VirtualTreeview with a fixed window height instead of a ttk.Style lookup."""
+
+    def visible_rows(self):
+        return 30
+
+
+class Value:
+    """Stand-in for tk.StringVar and ttk.Label."""
+
+    def __init__(self, value=""):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+    def set(self, value):
+        self.value = value
+
+    def config(self, **kwargs):
+        self.value = kwargs.get('text', self.value)
+
+    def __setitem__(self, key, value):
+        pass
+
+    def __getitem__(self, key):
+        return ()
+
+
+def make_gui(manager, course):
+    """Build a SchoolWorkBuddyGUI around stand-in widgets."""
+    from gui_app import SchoolWorkBuddyGUI
+
+    gui = object.__new__(SchoolWorkBuddyGUI)
+    gui.manager = manager
+    gui.today = date.today()
+    gui.filter_var = Value("all")
+    gui.course_filter = Value("All Courses")
+    gui.date_filter = Value("All Dates")
+    gui.course_view_var = Value(course)
+    gui.search_var = Value("")
+    gui.course_combo = Value()
+    gui.course_view_combo = Value()
+    gui.stats_label = Value()
+    gui.course_stats_label = Value()
+    gui.tree = StandInTreeview()
+    gui.course_tree = StandInTreeview()
+    gui.tree_view = HeadlessTreeview(gui.tree, StandInScrollbar(), gui.assignment_row,
+                                     key=lambda a: a.id,
+                                     sort_key=lambda a: (a.due_date, a.id))
+    gui.course_tree_view = HeadlessTreeview(gui.course_tree, StandInScrollbar(),
+                                            gui.course_assignment_row, key=lambda a: a.id,
+                                            sort_key=lambda a: (a.due_date, a.id))
+    return gui
+
+
+def timed(func, repeat):
+    """Run func repeat times; returns (min, median) seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times), statistics.median(times)
+
+
+def run_size(count, repeat, gui=True):
+    """Time every case for one data set size; returns {case: result}."""
+    records = make_records(count)
+    results = {}
+
+    def record(name, func, ops=1, runs=repeat):
+        best, median = timed(func, runs)
+        results[f"{name}/{count}"] = {
+            'seconds': best / ops,
+            'median_seconds': median / ops,
+            'ops': ops,
+        }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "assignments.json")
+        write_json_file(path, records, count + 1)
+        manager = AssignmentManager(storage=JsonStorage(path))
+        record('load_assignments', manager.load_assignments)
+        record('save_assignments', manager.save_assignments)
+
+    manager = AssignmentManager(storage=MemoryStorage(records, count + 1))
+    rng = random.Random(2)
+    ids = list(manager._by_id)
+
+    def add():
+        for i in range(MUTATIONS):
+            manager.add_assignment(f"New {i}", "Course 0", "2026-06-01")
+
+    def update():
+        for assignment_id in rng.sample(ids, min(MUTATIONS, len(ids))):
+            manager.update_assignment(assignment_id, due_date="2026-%02d-15" % rng.randint(1, 12))
+
+    record('add_assignment', add, MUTATIONS)
+    record('update_assignment', update, MUTATIONS)
+    record('get_overdue_assignments', manager.get_overdue_assignments)
+    past = date.today() - timedelta(days=30)
+    record('get_overdue_assignments_past', lambda: manager.get_overdue_assignments(past))
+    everything = manager.get_all_assignments()
+    record('sort_by_due_date', lambda: manager.sort_by_due_date(everything))
+    manager.search("warm up")
+    record('search', lambda: manager.search("assignment 12"))
+    pending = Query(completed=False, courses=manager.get_all_courses()[:3])
+    record('query_pending_courses', lambda: list(manager.query(pending)))
+    data = {'assignments': records, 'next_id': count + 1}
+    record('import_data', lambda: manager.import_data(data))
+
+    if gui:
+        course = manager.get_all_courses()[0]
+        view = make_gui(manager, course)
+        # the first call fills the trees, later ones only diff
+        record('refresh_assignment_list_first', view.refresh_assignment_list, runs=1)
+        record('refresh_assignment_list', view.refresh_assignment_list)
+        view.filter_var.set("pending")
+        record('refresh_assignment_list_pending', view.refresh_assignment_list)
+        view.filter_var.set("all")
+        view.search_var.set("assignment 1")
+        record('refresh_assignment_list_search', view.refresh_assignment_list)
+        view.search_var.set("")
+        record('refresh_course_view', view.refresh_course_view)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Return the cases that got slower than baseline * tolerance."""
+    regressions = []
+    for name, result in sorted(results.items()):
+        before = baseline.get('results', {}).get(name)
+        if before and result['seconds'] > before['seconds'] * tolerance:
+            regressions.append((name, before['seconds'], result['seconds']))
+    return regressions
+
+
+def main(argv=None):
+    """Run the suite; returns the process exit code."""
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.suite",
+                                     description="Benchmark the model and GUI refresh paths.")
+    parser.add_argument('--sizes', default=",".join(map(str, DEFAULT_SIZES)),
+                        help="comma separated data set sizes (default: %(default)s)")
+    parser.add_argument('--repeat', type=int, default=5,
+                        help="runs per case; the fastest counts (default: %(default)s)")
+    parser.add_argument('--output', metavar='FILE', help="write results as JSON")
+    parser.add_argument('--baseline', metavar='FILE', help="compare with a saved run")
+    parser.add_argument('--save-baseline', metavar='FILE', help="save this run as a baseline")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed slowdown ratio (default: %(default)s)")
+    parser.add_argument('--no-gui', action='store_true', help="skip the GUI refresh cases")
+    args = parser.parse_args(argv)
+
+    try:
+        import gui_app  # noqa: F401 - only checks that tkinter is available
+        gui = not args.no_gui
+    except ImportError:
+        print("tkinter is not available; skipping the GUI cases", file=sys.stderr)
+        gui = False
+
+    run = {
+        'meta': {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeat': args.repeat,
+        },
+        'results': {},
+    }
+    for count in (int(size) for size in args.sizes.split(",")):
+        print(f"Running {count} assignments...", file=sys.stderr)
+        run['results'].update(run_size(count, args.repeat, gui))
+
+    for name, result in run['results'].items():
+        print(f"{name:<45} {result['seconds'] * 1000:12.4f} ms")
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(run, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(run['results'], json.load(f), args.tolerance)
+        for name, before, after in regressions:
+            print(f"REGRESSION {name}: {before * 1000:.4f} ms -> {after * 1000:.4f} ms "
+                  f"({after / before:.2f}x)")
+        if regressions:
+            return 1
+        print("No regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
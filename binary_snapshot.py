@@ -0,0 +1,316 @@
+"""
+Binary Snapshot Format
+
+A compact, memory-mappable alternative to the JSON data file. Records are
+stored as columns of fixed-size integers (ids, completed flags and, for
+every text field, an index into a shared string table), so opening a
+snapshot only maps the file: nothing is parsed until a record is read.
+
+Layout (all integers little-endian, each section padded to 8 bytes):
+    header      magic "SWB1", version, record count, string count, next_id
+    ids         int64 per record
+    completed   uint8 per record
+    text fields one uint32 string index per record for each of TEXT_FIELDS
+    offsets     uint32 per string, plus one end offset
+    strings     UTF-8 bytes of every distinct string
+
+Convert from and to JSON with:
+    python binary_snapshot.py assignments.json assignments.swb
+    python binary_snapshot.py assignments.swb assignments.json
+
+Author: Betapandas
+Contact: Betapandas@gmail.com
+"""
+
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from assignment_model import Assignment
+from instrumentation import timed
+from storage import JsonStorage, RecordReader, RecordWriter, Snapshot
+
+
+MAGIC = b"SWB1"
+VERSION = 1
+
+# magic, version, reserved, record count, string count, next_id
+HEADER = struct.Struct("<4sHHIIq")
+
+TEXT_FIELDS = ('title', 'course', 'due_date', 'description', 'grade', 'created_at')
+
+# fields whose values repeat a lot, so decoded strings are shared
+SHARED_FIELDS = ('course', 'due_date', 'grade')
+
+
+def _align(offset: int) -> int:
+    """Round an offset up to the next multiple of 8."""
+    return (offset + 7) & ~7
+
+
+def _layout(count: int, string_count: int) -> Dict[str, int]:
+    """Byte offset of every section for the given sizes."""
+    sections = [('ids', 8 * count), ('completed', count)]
+    sections += [(field, 4 * count) for field in TEXT_FIELDS]
+    sections.append(('offsets', 4 * (string_count + 1)))
+
+    layout = {}
+    offset = _align(HEADER.size)
+    for name, size in sections:
+        layout[name] = offset
+        offset = _align(offset + size)
+    layout['strings'] = offset
+    return layout
+
+
+def _column(typecode: str, values: Iterable[int]) -> bytes:
+    """Pack integers as a little-endian column."""
+    column = array(typecode, values)
+    if sys.byteorder != 'little':
+        column.byteswap()
+    return column.tobytes()
+
+
+def write_snapshot(path: str, records: Iterable[Dict], next_id: int):
+    """
+    Atomically write records to a binary snapshot file.
+
+    Args:
+        path: File to write
+        records: Assignment dictionaries, as produced by to_dict()
+        next_id: Next free assignment id
+    """
+    # string -> index in the string table
+    strings: Dict[str, int] = {}
+    ids = array('q')
+    completed = array('B')
+    text = {field: array('I') for field in TEXT_FIELDS}
+
+    for record in records:
+        ids.append(record['id'])
+        completed.append(1 if record.get('completed') else 0)
+        for field in TEXT_FIELDS:
+            value = record.get(field) or ""
+            index = strings.get(value)
+            if index is None:
+                index = strings[value] = len(strings)
+            text[field].append(index)
+
+    offsets = array('I', [0])
+    blob = bytearray()
+    for value in strings:
+        blob += value.encode('utf-8')
+        if len(blob) > 0xFFFFFFFF:
+            raise ValueError("String table is larger than 4 GB")
+        offsets.append(len(blob))
+
+    count = len(ids)
+    layout = _layout(count, len(strings))
+    sections = [('ids', ids), ('completed', completed)]
+    sections += [(field, text[field]) for field in TEXT_FIELDS]
+    sections.append(('offsets', offsets))
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, count, len(strings), next_id))
+        for name, column in sections:
+            f.write(b"\0" * (layout[name] - f.tell()))
+            f.write(_column(column.typecode, column))
+        f.write(b"\0" * (layout['strings'] - f.tell()))
+        f.write(blob)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class BinarySnapshot:
+    """
+    Read-only, memory-mapped view of a binary snapshot.
+
+    Indexing returns a freshly built Assignment; only the records that are
+    actually read are ever decoded. Use it as a context manager, or call
+    close(), to unmap the file.
+    """
+
+    def __init__(self, path: str):
+        """Map a snapshot file."""
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, _, self.count, string_count, self.next_id = \
+            HEADER.unpack_from(self._mm)
+        if magic != MAGIC or version != VERSION:
+            self._mm.close()
+            raise ValueError(f"{path} is not a version {VERSION} snapshot")
+
+        layout = _layout(self.count, string_count)
+        self._strings_at = layout['strings']
+        self._view = memoryview(self._mm)
+        self.ids = self._cast(layout['ids'], 'q', self.count)
+        self.completed = self._cast(layout['completed'], 'B', self.count)
+        self._text = {field: self._cast(layout[field], 'I', self.count)
+                      for field in TEXT_FIELDS}
+        self._offsets = self._cast(layout['offsets'], 'I', string_count + 1)
+        # string index -> decoded value, for SHARED_FIELDS only
+        self._shared: Dict[int, str] = {}
+
+    def _cast(self, offset: int, typecode: str, length: int):
+        """View a column in place (or a byte-swapped copy on big-endian)."""
+        size = array(typecode).itemsize
+        view = self._view[offset:offset + size * length]
+        if sys.byteorder == 'little':
+            return view.cast(typecode)
+        column = array(typecode, view.tobytes())
+        column.byteswap()
+        return column
+
+    def __enter__(self) -> 'BinarySnapshot':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, index: int) -> Assignment:
+        """Build the Assignment stored at a position."""
+        fields = self._fields(index)
+        assignment = Assignment(
+            title=fields['title'],
+            course=fields['course'],
+            due_date=fields['due_date'],
+            description=fields['description'],
+            completed=fields['completed'],
+            grade=fields['grade'],
+            assignment_id=fields['id']
+        )
+        assignment.created_at = fields['created_at']
+        return assignment
+
+    def __iter__(self) -> Iterator[Assignment]:
+        """Build every Assignment, decoding the string table in one pass."""
+        strings = self._all_strings()
+        columns = [map(strings.__getitem__, self._text[field]) for field in TEXT_FIELDS]
+        for assignment_id, completed, title, course, due_date, description, grade, \
+                created_at in zip(self.ids, self.completed, *columns):
+            assignment = Assignment(title, course, due_date, description,
+                                    bool(completed), grade, assignment_id)
+            assignment.created_at = created_at
+            yield assignment
+
+    def record(self, index: int) -> Dict:
+        """The record at a position as a dictionary, like to_dict()."""
+        return self._fields(index)
+
+    def records(self) -> Iterator[Dict]:
+        """Every record as a dictionary."""
+        for index in range(self.count):
+            yield self._fields(index)
+
+    def _fields(self, index: int) -> Dict:
+        """Decode one record."""
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("snapshot index out of range")
+
+        fields = {'id': self.ids[index], 'completed': bool(self.completed[index])}
+        for field in TEXT_FIELDS:
+            string_index = self._text[field][index]
+            if field in SHARED_FIELDS:
+                value = self._shared.get(string_index)
+                if value is None:
+                    value = self._shared[string_index] = self._string(string_index)
+            else:
+                value = self._string(string_index)
+            fields[field] = value
+        return fields
+
+    def _all_strings(self) -> List[str]:
+        """Decode the whole string table."""
+        blob = self._mm[self._strings_at:]
+        offsets = self._offsets
+        return [blob[offsets[i]:offsets[i + 1]].decode('utf-8')
+                for i in range(len(offsets) - 1)]
+
+    def _string(self, string_index: int) -> str:
+        """Decode one entry of the string table."""
+        start = self._strings_at + self._offsets[string_index]
+        end = self._strings_at + self._offsets[string_index + 1]
+        return self._mm[start:end].decode('utf-8')
+
+    def close(self):
+        """Unmap the file."""
+        # the mmap can only close once no views into it remain
+        for column in [self.ids, self.completed, self._offsets, *self._text.values()]:
+            if isinstance(column, memoryview):
+                column.release()
+        self._view.release()
+        self._mm.close()
+
+
+class BinaryStorage(JsonStorage):
+    """
+    Storage backend that keeps the data in a binary snapshot.
+
+    Loading maps the file and builds the assignments straight from its
+    columns, skipping JSON parsing. Every save rewrites the snapshot, like
+    JsonStorage; wrap it in WriteBehindStorage to batch edits. Unlike a
+    JSON file, a snapshot is not merged with other processes' changes.
+    """
+
+    def __init__(self, path: str = "assignments.swb"):
+        """Initialize the storage with the path of the snapshot file."""
+        super().__init__(path)
+
+    @timed
+    def load(self) -> Tuple[List[Assignment], int]:
+        """Load every assignment and the next free id."""
+        if not os.path.exists(self.path):
+            return [], 1
+        with BinarySnapshot(self.path) as snapshot:
+            return list(snapshot), snapshot.next_id
+
+    @timed
+    def save(self, records: List[Dict], next_id: int):
+        """Write the full state as a new snapshot."""
+        write_snapshot(self.path, records, next_id)
+
+    def append_many(self, entries: Iterable[Dict], snapshot: Snapshot):
+        """Write the full state; snapshots are not merged with other writers."""
+        records, next_id = snapshot()
+        self.save(records, next_id)
+
+    def outdated(self) -> bool:
+        """Binary snapshots are not shared between processes."""
+        return False
+
+
+def convert(source: str, target: str):
+    """
+    Convert between JSON (or JSON lines) and a binary snapshot.
+
+    The direction is picked from the extensions: a .swb source is written
+    out as JSON, anything else is read as JSON and written as a snapshot.
+    """
+    if source.endswith('.swb'):
+        with BinarySnapshot(source) as snapshot, RecordWriter(target) as writer:
+            for record in snapshot.records():
+                writer.write(record)
+            writer.close({'next_id': snapshot.next_id})
+    else:
+        reader = RecordReader(source)
+        records = list(reader)
+        write_snapshot(target, records, reader.next_id or
+                       max((r.get('id') or 0 for r in records), default=0) + 1)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit("usage: python binary_snapshot.py SOURCE TARGET")
+    convert(sys.argv[1], sys.argv[2])
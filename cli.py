@@ -0,0 +1,320 @@
+"""
+SchoolWorkBuddy - Command Line Interface
+
+Headless access to the assignment data for scripts and cron jobs:
+
+    python main.py cli list --status pending --course "CS 101"
+    python main.py cli add --title "Essay" --course "ENG 102" --due 2026-03-01
+    python main.py cli complete --course "CS 101" --due-before 2026-02-01
+    python main.py cli grade --course "MATH 201" --ungraded --status completed A
+    python main.py cli delete --status completed --due-before 2025-12-31
+    python main.py cli import backup.jsonl.gz --merge
+    python main.py cli export backup.jsonl.gz
+    python main.py cli export cs101.json --course "CS 101"
+    python main.py cli list --status pending --sort course --limit 20
+    python main.py cli list --search "alg home"
+    python main.py cli stats --json
+
+Each run is one transaction: its changes are written to disk together in
+a single write once the command succeeds, and not at all if it fails.
+Commands that change more than one assignment pick them with the query
+options (--id, --course, --status, ...); --all selects everything.
+With SWB_PROFILE=1 the time spent in each operation is printed to stderr.
+
+Author: Betapandas
+Contact: Betapandas@gmail.com
+"""
+
+import argparse
+import json
+import sys
+from typing import List, Optional
+
+import instrumentation
+from assignment_model import Assignment, AssignmentManager, Query, parse_due_date
+from storage import RecordReader, open_storage
+
+
+class CliError(Exception):
+    """A problem with the command line that is reported without a traceback."""
+
+
+def date_arg(value: str) -> str:
+    """argparse type for YYYY-MM-DD dates."""
+    if parse_due_date(value) is None:
+        raise argparse.ArgumentTypeError(f"invalid date {value!r}, use YYYY-MM-DD")
+    return value
+
+
+def add_query_arguments(parser: argparse.ArgumentParser):
+    """Add the options that select which assignments a command acts on."""
+    group = parser.add_argument_group("query")
+    group.add_argument('--id', type=int, action='append', dest='ids', metavar='ID',
+                       help="assignment id (repeatable)")
+    group.add_argument('--course', help="course name")
+    group.add_argument('--status', choices=('pending', 'completed', 'overdue'))
+    group.add_argument('--due-after', type=date_arg, metavar='DATE',
+                       help="due on or after this date")
+    group.add_argument('--due-before', type=date_arg, metavar='DATE',
+                       help="due on or before this date")
+    group.add_argument('--match', metavar='TEXT',
+                       help="title contains this text (case-insensitive)")
+    group.add_argument('--search', metavar='WORDS',
+                       help="words (or their beginnings) in the title, course or description")
+    graded = group.add_mutually_exclusive_group()
+    graded.add_argument('--graded', action='store_true', default=None,
+                        help="only assignments with a grade")
+    graded.add_argument('--ungraded', action='store_false', dest='graded',
+                        help="only assignments without a grade")
+    group.add_argument('--all', action='store_true',
+                       help="select every assignment when no other option is given")
+
+
+def has_query(args) -> bool:
+    """Whether the query options narrow the selection at all."""
+    # e.g. --search "!!" has no words, so it would select everything
+    return bool(build_query(args).criteria)
+
+
+def build_query(args, **options) -> Query:
+    """Turn the query options into a Query; options are passed through."""
+    status = {'pending': {'completed': False}, 'completed': {'completed': True},
+              'overdue': {'overdue': True}}.get(args.status, {})
+    return Query(
+        ids=args.ids,
+        courses=[args.course] if args.course else None,
+        due_after=parse_due_date(args.due_after) if args.due_after else None,
+        due_before=parse_due_date(args.due_before) if args.due_before else None,
+        graded=args.graded,
+        text=args.match,
+        search=args.search,
+        **status, **options)
+
+
+def select(manager: AssignmentManager, args, required: bool = True,
+           **options) -> List[Assignment]:
+    """
+    Find the assignments matching the query options, sorted by due date.
+
+    Args:
+        manager: Manager to search
+        args: Parsed arguments with the query options
+        required: Refuse to select everything unless --all was given
+        options: Extra Query arguments, such as sort or limit
+    """
+    if required and not has_query(args) and not args.all:
+        raise CliError("no query given; use --all to act on every assignment")
+    return list(manager.query(build_query(args, **options)))
+
+
+def report(args, verb: str, assignments: List[Assignment]):
+    """Print what a changing command did (or would do with --dry-run)."""
+    if args.dry_run:
+        print(f"Would have {verb} {len(assignments)} assignment(s).")
+    else:
+        print(f"{verb.capitalize()} {len(assignments)} assignment(s).")
+    if args.verbose or args.dry_run:
+        print_table(assignments)
+
+
+def print_table(assignments: List[Assignment]):
+    """Print assignments as tab-separated columns."""
+    for a in assignments:
+        status = "completed" if a.completed else "pending"
+        print(f"{a.id}\t{a.due_date}\t{status}\t{a.course}\t{a.title}\t{a.grade or '-'}")
+
+
+def cmd_list(manager: AssignmentManager, args):
+    """List matching assignments."""
+    options = dict(sort=args.sort, reverse=args.reverse, limit=args.limit, offset=args.offset)
+    if args.explain:
+        plan = manager.explain(build_query(args, **options))
+        print("plan: " + ", ".join(f"{key}={value}" for key, value in plan.items()),
+              file=sys.stderr)
+    assignments = select(manager, args, required=False, **options)
+    if args.json:
+        for a in assignments:
+            print(json.dumps(a.to_dict()))
+    else:
+        print_table(assignments)
+
+
+def cmd_add(manager: AssignmentManager, args):
+    """Add one assignment."""
+    if args.dry_run:
+        print(f"Would have added {args.title!r} to {args.course}.")
+        return
+    assignment = manager.add_assignment(args.title, args.course, args.due,
+                                        args.description)
+    print(f"Added assignment {assignment.id}.")
+
+
+def cmd_update(manager: AssignmentManager, args):
+    """Change fields of every matching assignment."""
+    changes = {field: value for field, value in (
+        ('title', args.set_title), ('course', args.set_course),
+        ('due_date', args.set_due), ('description', args.set_description))
+        if value is not None}
+    if not changes:
+        raise CliError("nothing to change; give at least one --set-... option")
+    assignments = select(manager, args)
+    if not args.dry_run:
+        manager.update_many([a.id for a in assignments], **changes)
+    report(args, "updated", assignments)
+
+
+def cmd_complete(manager: AssignmentManager, args):
+    """Mark every matching assignment complete (or pending with --undo)."""
+    assignments = select(manager, args)
+    if not args.dry_run:
+        manager.mark_complete_many([a.id for a in assignments], not args.undo)
+    report(args, "reopened" if args.undo else "completed", assignments)
+
+
+def cmd_grade(manager: AssignmentManager, args):
+    """Give every matching assignment the same grade."""
+    if not args.grade.strip():
+        raise CliError("grade must not be empty")
+    assignments = select(manager, args)
+    if not args.dry_run:
+        manager.update_many([a.id for a in assignments], grade=args.grade.strip())
+    report(args, "graded", assignments)
+
+
+def cmd_delete(manager: AssignmentManager, args):
+    """Delete every matching assignment."""
+    assignments = select(manager, args)
+    if not args.dry_run:
+        manager.delete_many([a.id for a in assignments])
+    report(args, "deleted", assignments)
+
+
+def cmd_import(manager: AssignmentManager, args):
+    """Import a JSON or JSON-lines file (optionally compressed)."""
+    if args.dry_run:
+        count = sum(1 for _ in RecordReader(args.file))
+        print(f"Would have imported {count} assignment(s).")
+        return
+    before = len(manager.assignments)
+    manager.import_records(RecordReader(args.file), merge=args.merge)
+    added = len(manager.assignments) - (before if args.merge else 0)
+    print(f"Imported {added} assignment(s).")
+
+
+def cmd_export(manager: AssignmentManager, args):
+    """Export assignments; the file name picks format and compression."""
+    query = build_query(args, sort=None) if has_query(args) else None
+    count = {'written': 0}
+    manager.export_to_file(args.file, query=query,
+                           progress=lambda written: count.update(written=written))
+    print(f"Exported {count['written']} assignment(s) to {args.file}.")
+
+
+def cmd_stats(manager: AssignmentManager, args):
+    """Print assignment counts."""
+    stats = manager.get_statistics(args.course)
+    if args.json:
+        print(json.dumps(stats))
+        return
+    for key in ('total', 'pending', 'completed', 'overdue', 'graded'):
+        print(f"{key.capitalize() + ':':<11}{stats[key]}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Create the argument parser with every subcommand."""
+    parser = argparse.ArgumentParser(
+        prog="main.py cli",
+        description="Manage SchoolWorkBuddy assignments from the command line.")
+    parser.add_argument('--data', default="assignments.json", metavar='FILE',
+                        help="data file (default: assignments.json; .swb for a binary snapshot, "
+                             "a .shards directory for a file per course)")
+    commands = parser.add_subparsers(dest='command', required=True, metavar='COMMAND')
+
+    def command(name, func, help, query=False, changes=True):
+        sub = commands.add_parser(name, help=help, description=help)
+        sub.set_defaults(func=func)
+        if query:
+            add_query_arguments(sub)
+        if changes:
+            sub.add_argument('-n', '--dry-run', action='store_true',
+                             help="show what would change without saving")
+            sub.add_argument('-v', '--verbose', action='store_true',
+                             help="list the assignments that changed")
+        return sub
+
+    sub = command('list', cmd_list, "list assignments", query=True, changes=False)
+    sub.add_argument('--json', action='store_true', help="print JSON lines")
+    sub.add_argument('--sort', choices=sorted(Query.SORT_KEYS), default='due_date',
+                     help="sort order (default: %(default)s)")
+    sub.add_argument('--reverse', action='store_true', help="sort in descending order")
+    sub.add_argument('--limit', type=int, metavar='N', help="show at most N assignments")
+    sub.add_argument('--offset', type=int, default=0, metavar='N',
+                     help="skip the first N assignments")
+    sub.add_argument('--explain', action='store_true',
+                     help="print which index the query uses to stderr")
+
+    sub = command('add', cmd_add, "add an assignment")
+    sub.add_argument('--title', required=True)
+    sub.add_argument('--course', required=True)
+    sub.add_argument('--due', required=True, type=date_arg, metavar='DATE')
+    sub.add_argument('--description', default="")
+
+    sub = command('update', cmd_update, "change fields of matching assignments", query=True)
+    sub.add_argument('--set-title', metavar='TITLE')
+    sub.add_argument('--set-course', metavar='COURSE')
+    sub.add_argument('--set-due', type=date_arg, metavar='DATE')
+    sub.add_argument('--set-description', metavar='TEXT')
+
+    sub = command('complete', cmd_complete, "mark matching assignments complete", query=True)
+    sub.add_argument('--undo', action='store_true', help="mark them pending instead")
+
+    sub = command('grade', cmd_grade, "grade matching assignments", query=True)
+    sub.add_argument('grade')
+
+    command('delete', cmd_delete, "delete matching assignments", query=True)
+
+    sub = command('import', cmd_import, "import a JSON or JSON-lines file")
+    sub.add_argument('file')
+    sub.add_argument('--merge', action='store_true',
+                     help="keep existing assignments (default: replace them)")
+
+    sub = command('export', cmd_export, "export to a JSON or JSON-lines file",
+                  query=True, changes=False)
+    sub.add_argument('file')
+
+    sub = command('stats', cmd_stats, "show assignment counts", changes=False)
+    sub.add_argument('--course')
+    sub.add_argument('--json', action='store_true', help="print a JSON object")
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Run one command.
+
+    Args:
+        argv: Arguments after "cli" (defaults to sys.argv[1:])
+
+    Returns:
+        Process exit code
+    """
+    args = build_parser().parse_args(argv)
+    manager = AssignmentManager(args.data, storage=open_storage(args.data))
+    try:
+        # one transaction: the command's changes are written together, or
+        # rolled back if it fails
+        with manager.batch():
+            args.func(manager, args)
+    except (CliError, OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        manager.close()
+        if instrumentation.enabled():
+            print(instrumentation.format_stats(), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
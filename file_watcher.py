@@ -0,0 +1,149 @@
+"""
+File Watcher
+
+Waits for changes to a few files, so a running app can pick up what other
+processes save without re-reading the files on a timer. On Linux it asks
+the kernel through inotify (called with ctypes, no extra packages) and
+watches the directories holding the files, which also catches a file
+being replaced by an atomic rename. Elsewhere, or if inotify is
+unavailable, it compares os.stat() results every POLL_INTERVAL seconds.
+
+Either way a change is only a hint: the caller still checks what, if
+anything, is new (see AssignmentManager.sync()).
+
+Author: Betapandas
+Contact: Betapandas@gmail.com
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from typing import Dict, Iterable, Optional, Set
+
+from storage import file_stamp
+
+
+# seconds between checks when polling
+POLL_INTERVAL = 1.0
+
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+# struct inotify_event without its variable-length name
+EVENT = struct.Struct("iIII")
+
+
+def load_inotify():
+    """The C library if it offers inotify, else None."""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    libc.inotify_add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+    return libc
+
+
+class FileWatcher:
+    """Blocks until one of a set of files may have changed."""
+
+    def __init__(self, paths: Iterable[str], interval: float = POLL_INTERVAL):
+        """
+        Start watching.
+
+        Args:
+            paths: Files to watch; they need not exist yet
+            interval: Seconds between checks when polling
+        """
+        self.paths = [os.path.abspath(p) for p in paths]
+        self.interval = interval
+        self.fd = None
+        # watch descriptor -> names of watched files in that directory
+        self._names: Dict[int, Set[bytes]] = {}
+        self._stamps = [file_stamp(p) for p in self.paths]
+
+        libc = load_inotify()
+        if libc is not None:
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd >= 0:
+                self.fd = fd
+                for path in self.paths:
+                    directory, name = os.path.split(path)
+                    wd = libc.inotify_add_watch(fd, os.fsencode(directory), WATCH_MASK)
+                    if wd < 0:
+                        # e.g. out of watches; fall back to polling
+                        self.close()
+                        break
+                    self._names.setdefault(wd, set()).add(os.fsencode(name))
+
+    @property
+    def polling(self) -> bool:
+        """Whether changes are found by polling rather than inotify."""
+        return self.fd is None
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for a change to any of the files.
+
+        Args:
+            timeout: Seconds to wait at most; None waits for ever
+
+        Returns:
+            True if a file may have changed, False if the time ran out
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if self.fd is not None:
+                ready, _, _ = select.select([self.fd], [], [], remaining)
+                if ready and self._read_events():
+                    return True
+            else:
+                stamps = [file_stamp(p) for p in self.paths]
+                if stamps != self._stamps:
+                    self._stamps = stamps
+                    return True
+                time.sleep(self.interval if remaining is None else min(self.interval, remaining))
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+
+    def _read_events(self) -> bool:
+        """Drain pending inotify events; returns whether any concern our files."""
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return False
+        changed = False
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT.unpack_from(data, offset)
+            name = data[offset + EVENT.size:offset + EVENT.size + length].rstrip(b"\0")
+            offset += EVENT.size + length
+            if mask & IN_Q_OVERFLOW or name in self._names.get(wd, ()):
+                changed = True
+        return changed
+
+    def close(self):
+        """Stop watching."""
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+            self._names.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -4,16 +4,64 @@ SchoolWorkBuddy - GUI Application
 A graphical interface for managing college assignments with due dates,
 completion tracking, and grade management.
 
+The window is drawn before any data is read: assignments load on a
+background thread and the By Course tab is only built when first opened.
+Set SWB_STARTUP_TIMING=1 to print the time to first paint and to data.
+Set SWB_PROFILE=1 (or use Help > Record Performance) to time the manager
+and the refresh phases; Help > Performance shows the results.
+Set SWB_SERVER=http://host:port to work on assignments shared by a
+"python main.py serve" server instead of the local assignments.json, or
+SWB_DATA to use another data file or a sharded directory (*.shards).
+
 Author: Betapandas
 Email: Betapandas@gmail.com
 Version: 1.0
 """
 
+import time
+STARTED = time.perf_counter()
+
+import os
+import queue
+import threading
 import tkinter as tk
-from tkinter import ttk, messagebox, scrolledtext, filedialog
+from tkinter import ttk, messagebox, scrolledtext
 from datetime import datetime, date, timedelta
-import json
-from assignment_model import AssignmentManager, Assignment
+import instrumentation
+from assignment_model import AssignmentManager, Assignment, ChangeEvent, Query, parse_due_date
+from instrumentation import span, timed
+from storage import COMPRESSORS, RecordReader, WriteBehindStorage, open_storage
+from virtual_tree import VirtualTreeview
+
+
+# events touching more assignments than this redraw the lists wholesale
+BULK_REFRESH_SIZE = 50
+
+# how often a running import or export updates its progress bar
+PROGRESS_POLL_MS = 100
+
+# how often startup checks whether the assignments have finished loading
+LOAD_POLL_MS = 20
+
+# time from start to first paint we aim for, reported by SWB_STARTUP_TIMING
+FIRST_PAINT_TARGET_MS = 250
+
+# how often an open Performance dialog updates
+PERFORMANCE_POLL_MS = 1000
+
+# pause in typing before the search box refreshes the list
+SEARCH_DEBOUNCE_MS = 200
+
+# how often changes fetched from a shared server are shown
+REMOTE_POLL_MS = 200
+
+# seconds the server may hold a request for changes open, and the pause
+# before trying again when it cannot be reached
+REMOTE_WAIT = 20
+REMOTE_RETRY = 5
+
+# how often changes other programs saved to the data file are shown
+SYNC_POLL_MS = 200
 
 
 class SchoolWorkBuddyGUI:
@@ -25,12 +73,29 @@ class SchoolWorkBuddyGUI:
         self.root.title("SchoolWorkBuddy - College Assignment Organizer")
         self.root.geometry("1100x750")
         
-        # Initialize assignment manager
-        self.manager = AssignmentManager()
+        # The assignment manager is loaded on a background thread; until
+        # then it is None and the window shows a loading state
+        self.manager = None
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         
         # Initialize filter variables
         self.course_filter = tk.StringVar(value="All Courses")
         self.date_filter = tk.StringVar(value="All Dates")
+        self.course_view_var = tk.StringVar()
+        self.search_var = tk.StringVar()
+        # pending debounced search refresh, from root.after()
+        self.search_after_id = None
+        
+        # the By Course view is built the first time its tab is opened
+        self.course_tree_view = None
+        
+        # Help menu toggles for the instrumentation layer
+        self.record_performance = tk.BooleanVar(value=instrumentation.enabled())
+        self.profile_session = tk.BooleanVar(value=instrumentation.profiling())
+        self.performance_dialog = None
+        
+        # date used for "days left" while rendering rows; set on each refresh
+        self.today = date.today()
         
         # Configure style
         self.setup_styles()
@@ -41,9 +106,142 @@ class SchoolWorkBuddyGUI:
         # Create main layout with tabs
         self.create_widgets()
         
-        # Load assignments
-        self.refresh_assignment_list()
-        self.refresh_course_view()
+        self.timing = os.environ.get('SWB_STARTUP_TIMING') == '1'
+        if self.timing:
+            self.root.bind('<Expose>', self.on_first_paint, add='+')
+        
+        self.start_loading()
+    
+    def start_loading(self):
+        """Load the assignments on a worker thread."""
+        result = {}
+        
+        def work():
+            try:
+                server = os.environ.get('SWB_SERVER')
+                if server:
+                    # imported here since it is only needed for a shared server
+                    from remote_manager import RemoteAssignmentManager
+                    result['manager'] = RemoteAssignmentManager(server)
+                    return
+                # saving happens on a background thread too, so slow disks
+                # don't stall the window
+                path = os.environ.get('SWB_DATA', "assignments.json")
+                manager = AssignmentManager(path, storage=WriteBehindStorage(open_storage(path)))
+                # the All Assignments tab needs every course, so read any
+                # shards here rather than on the main thread
+                manager.ensure_loaded()
+                result['manager'] = manager
+            except Exception as e:
+                result['error'] = e
+        
+        def poll():
+            if thread.is_alive():
+                self.root.after(LOAD_POLL_MS, poll)
+            elif 'error' in result:
+                messagebox.showerror("Error", f"Failed to load assignments:\n{str(result['error'])}")
+                self.root.destroy()
+            else:
+                self.on_loaded(result['manager'])
+        
+        thread = threading.Thread(target=work, name="LoadAssignments", daemon=True)
+        thread.start()
+        self.root.after(LOAD_POLL_MS, poll)
+    
+    def on_loaded(self, manager):
+        """Show the loaded assignments and keep the views in sync with later changes."""
+        self.manager = manager
+        self.refresh_all()
+        self.manager.subscribe(self.on_manager_event)
+        self.schedule_midnight_refresh()
+        if hasattr(manager, 'fetch_events'):
+            self.watch_server()
+        else:
+            self.watch_file()
+        if self.timing:
+            print(f"Assignments shown after {(time.perf_counter() - STARTED) * 1000:.0f} ms "
+                  f"({len(manager.assignments)} assignments)")
+    
+    def watch_server(self):
+        """Show changes other users make on the shared server as they arrive."""
+        fetched = queue.SimpleQueue()
+        
+        def work():
+            while True:
+                try:
+                    fetched.put(self.manager.fetch_events(REMOTE_WAIT))
+                except OSError:
+                    time.sleep(REMOTE_RETRY)
+        
+        def deliver():
+            events = []
+            while not fetched.empty():
+                events += fetched.get()
+            try:
+                if events:
+                    self.manager.deliver_events(events)
+            finally:
+                self.root.after(REMOTE_POLL_MS, deliver)
+        
+        threading.Thread(target=work, name="WatchServer", daemon=True).start()
+        self.root.after(REMOTE_POLL_MS, deliver)
+    
+    def watch_file(self):
+        """
+        Show changes other programs (the CLI, another window) save to the data file.
+        
+        The file is read and parsed on a worker thread; only applying what
+        changed happens here.
+        """
+        watcher = self.manager.file_watcher()
+        if watcher is None:
+            return
+        fetched = queue.SimpleQueue()
+        applied = threading.Event()
+        
+        def work():
+            while True:
+                if not watcher.wait():
+                    continue
+                try:
+                    changes = self.manager.fetch_changes()
+                except (OSError, ValueError):
+                    # e.g. caught mid-save by an editor; its next write wakes us again
+                    continue
+                if changes is not None:
+                    applied.clear()
+                    fetched.put(changes)
+                    # one read in flight at a time (see AssignmentManager.apply_changes())
+                    applied.wait()
+        
+        def check():
+            try:
+                if not fetched.empty():
+                    try:
+                        self.manager.apply_changes(fetched.get())
+                    finally:
+                        applied.set()
+            finally:
+                self.root.after(SYNC_POLL_MS, check)
+        
+        threading.Thread(target=work, name="WatchFile", daemon=True).start()
+        self.root.after(SYNC_POLL_MS, check)
+    
+    def on_first_paint(self, event=None):
+        """Report how long the window took to appear (SWB_STARTUP_TIMING)."""
+        self.root.unbind('<Expose>')
+        elapsed = (time.perf_counter() - STARTED) * 1000
+        verdict = "within" if elapsed <= FIRST_PAINT_TARGET_MS else "over"
+        print(f"First paint after {elapsed:.0f} ms "
+              f"({verdict} the {FIRST_PAINT_TARGET_MS} ms target)")
+    
+    def loading(self) -> bool:
+        """Tell the user to wait if the assignments are still loading."""
+        if self.manager is None:
+            messagebox.showinfo("Loading", "Your assignments are still loading. "
+                                           "Please try again in a moment.")
+            return True
+        return False
     
     def setup_styles(self):
         """Configure ttk styles with modern design."""
@@ -132,6 +330,29 @@ class SchoolWorkBuddyGUI:
         help_menu.add_command(label="About", command=self.show_about)
         help_menu.add_separator()
         help_menu.add_command(label="How to Use", command=self.show_help)
+        help_menu.add_separator()
+        help_menu.add_checkbutton(label="Record Performance", variable=self.record_performance,
+                                  command=self.toggle_recording)
+        help_menu.add_command(label="Performance...", command=self.show_performance)
+        help_menu.add_checkbutton(label="Profile Session (cProfile)",
+                                  variable=self.profile_session, command=self.toggle_profile)
+    
+    def on_close(self):
+        """Write any unsaved changes, then close the window."""
+        if self.manager is None:
+            # still loading, so nothing can have changed
+            self.root.destroy()
+            return
+        try:
+            self.manager.flush()
+        except OSError as e:
+            if not messagebox.askyesno("Error",
+                                       f"Failed to save assignments:\n{str(e)}\n\n"
+                                       "Quit anyway?"):
+                return
+        else:
+            self.manager.close()
+        self.root.destroy()
     
     def show_about(self):
         """Show about dialog with creator info"""
@@ -162,6 +383,81 @@ class SchoolWorkBuddyGUI:
         )
         messagebox.showinfo("How to Use", help_text)
     
+    def toggle_recording(self):
+        """Turn timing of the manager and the refreshes on or off."""
+        instrumentation.enable(self.record_performance.get())
+    
+    def toggle_profile(self):
+        """Start a cProfile session, or stop it and save the stats."""
+        if self.profile_session.get():
+            instrumentation.start_profile()
+            return
+        from tkinter import filedialog
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".prof",
+            filetypes=[("Profile stats", "*.prof"), ("All files", "*.*")],
+            title="Save Profile"
+        )
+        instrumentation.stop_profile(file_path or None)
+        if file_path:
+            messagebox.showinfo("Profile Saved",
+                                f"Profile saved to:\n{file_path}\n\n"
+                                "Open it with: python -m pstats")
+    
+    def show_performance(self):
+        """Open a live table of the recorded timings."""
+        if self.performance_dialog is not None and self.performance_dialog.winfo_exists():
+            self.performance_dialog.lift()
+            return
+        
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Performance")
+        dialog.geometry("820x420")
+        dialog.transient(self.root)
+        self.performance_dialog = dialog
+        
+        frame = ttk.Frame(dialog, padding="10")
+        frame.pack(fill=tk.BOTH, expand=True)
+        
+        status = ttk.Label(frame)
+        status.pack(anchor=tk.W, pady=(0, 5))
+        
+        columns = ('calls', 'total', 'mean', 'p50', 'p95', 'max')
+        table = ttk.Treeview(frame, columns=columns, height=15)
+        table.heading('#0', text='Operation')
+        table.column('#0', width=340)
+        for column in columns:
+            label = column if column == 'calls' else f"{column} (ms)"
+            table.heading(column, text=label.capitalize())
+            table.column(column, width=75, anchor=tk.E)
+        scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=table.yview)
+        table.configure(yscrollcommand=scrollbar.set)
+        
+        buttons = ttk.Frame(frame)
+        buttons.pack(side=tk.BOTTOM, fill=tk.X, pady=(10, 0))
+        ttk.Button(buttons, text="Reset", command=instrumentation.reset).pack(side=tk.LEFT)
+        ttk.Button(buttons, text="Close", command=dialog.destroy).pack(side=tk.RIGHT)
+        
+        table.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        def update():
+            if not dialog.winfo_exists():
+                return
+            if instrumentation.enabled():
+                cache = parse_due_date.cache_info()
+                status.config(text=f"Recording. Date parsing cache: {cache.hits} hits, "
+                                   f"{cache.misses} misses")
+            else:
+                status.config(text="Recording is off; turn on Help > Record Performance.")
+            table.delete(*table.get_children())
+            for entry in instrumentation.stats():
+                table.insert('', 'end', text=entry['name'], values=(
+                    entry['calls'], *(f"{entry[key] * 1000:.2f}" for key in columns[1:])))
+            dialog.after(PERFORMANCE_POLL_MS, update)
+        
+        update()
+    
     def create_widgets(self):
         """Create all GUI widgets with modern design and tabs."""
         # Main container with padding
@@ -270,10 +566,21 @@ class SchoolWorkBuddyGUI:
         self.notebook.add(self.all_assignments_tab, text="  All Assignments  ")
         self.create_all_assignments_view(self.all_assignments_tab)
         
-        # Tab 2: By Course
+        # Tab 2: By Course, filled in when first selected
         self.by_course_tab = ttk.Frame(self.notebook)
         self.notebook.add(self.by_course_tab, text="  By Course  ")
+        self.notebook.bind('<<NotebookTabChanged>>', self.on_tab_changed)
+    
+    def on_tab_changed(self, event=None):
+        """Build the By Course view the first time its tab is opened."""
+        if self.course_tree_view is not None:
+            return
+        if self.notebook.select() != str(self.by_course_tab):
+            return
         self.create_by_course_view(self.by_course_tab)
+        if self.manager is not None:
+            self.update_course_filter_options()
+            self.refresh_course_view()
     
     def create_all_assignments_view(self, parent):
         """Create the all assignments list view with filters."""
@@ -328,6 +635,16 @@ class SchoolWorkBuddyGUI:
                                       'Due This Month', 'Past Due']
         self.date_combo.bind('<<ComboboxSelected>>', lambda e: self.refresh_assignment_list())
         
+        # Search box over titles, courses and descriptions
+        ttk.Label(filter_frame2, text="Search:", style='Header.TLabel').grid(
+            row=0, column=4, sticky=tk.W, padx=(20, 10))
+        
+        search_entry = ttk.Entry(filter_frame2, textvariable=self.search_var, width=25,
+                                 font=('Segoe UI', 9))
+        search_entry.grid(row=0, column=5, padx=5)
+        search_entry.bind('<Escape>', lambda e: self.search_var.set(""))
+        self.search_var.trace_add('write', lambda *args: self.schedule_search())
+        
         # Update course filter options
         self.update_course_filter_options()
         
@@ -363,6 +680,12 @@ class SchoolWorkBuddyGUI:
         self.tree.column('Status', width=100)
         self.tree.column('Grade', width=80)
         
+        self.configure_tags(self.tree)
+        # sorted like the manager's queries, so single rows can be inserted in place
+        self.tree_view = VirtualTreeview(self.tree, scrollbar, self.assignment_row,
+                                         key=lambda a: a.id,
+                                         sort_key=lambda a: (a.due_date, a.id))
+        
         # Action buttons
         action_frame = ttk.Frame(parent)
         action_frame.grid(row=3, column=0, sticky=(tk.W, tk.E), pady=(15, 0))
@@ -390,7 +713,6 @@ class SchoolWorkBuddyGUI:
         ttk.Label(course_select_frame, text="Select Course:", 
                  style='Header.TLabel').pack(side=tk.LEFT, padx=(5, 10))
         
-        self.course_view_var = tk.StringVar()
         self.course_view_combo = ttk.Combobox(course_select_frame, 
                                               textvariable=self.course_view_var,
                                               width=30, state='readonly',
@@ -437,6 +759,12 @@ class SchoolWorkBuddyGUI:
         self.course_tree.column('Status', width=100)
         self.course_tree.column('Grade', width=80)
         
+        self.configure_tags(self.course_tree)
+        self.course_tree_view = VirtualTreeview(self.course_tree, course_scrollbar,
+                                                self.course_assignment_row,
+                                                key=lambda a: a.id,
+                                                sort_key=lambda a: (a.due_date, a.id))
+        
         # Action buttons for course view
         course_action_frame = ttk.Frame(parent)
         course_action_frame.grid(row=2, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(15, 0))
@@ -452,11 +780,13 @@ class SchoolWorkBuddyGUI:
     
     def update_course_filter_options(self):
         """Update the course filter dropdown with current courses."""
+        if self.manager is None:
+            return
         courses = ['All Courses'] + self.manager.get_all_courses()
         self.course_combo['values'] = courses
         
-        # Update course view combo too
-        if hasattr(self, 'course_view_combo'):
+        # Update course view combo too, once the By Course tab exists
+        if self.course_tree_view is not None:
             course_list = self.manager.get_all_courses()
             if course_list:
                 self.course_view_combo['values'] = course_list
@@ -465,6 +795,9 @@ class SchoolWorkBuddyGUI:
     
     def add_assignment(self):
         """Add a new assignment from form data."""
+        if self.loading():
+            return
+        
         # grab the form inputs
         title = self.title_entry.get().strip()
         course = self.course_entry.get().strip()
@@ -491,7 +824,7 @@ class SchoolWorkBuddyGUI:
             messagebox.showerror("Error", "Invalid date format! Use YYYY-MM-DD")
             return
         
-        # Add assignment to our list
+        # Add assignment to our list; on_manager_event shows the new row
         self.manager.add_assignment(title, course, due_date, description)
         
         # clear out the form so user can add another one
@@ -500,123 +833,224 @@ class SchoolWorkBuddyGUI:
         self.date_entry.delete(0, tk.END)
         self.desc_text.delete("1.0", tk.END)
         
-        # refresh everything to show the new assignment
-        self.update_course_filter_options()
-        self.refresh_assignment_list()
-        self.refresh_course_view()
-        self.update_statistics()
-        
         messagebox.showinfo("Success", "Assignment added successfully!")
     
+    @timed
     def refresh_assignment_list(self):
         """Refresh the assignment list with all filters applied."""
-        # clear out the old stuff first
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        if self.manager is None:
+            return
+        
+        # one "today" for the whole refresh instead of one per row
+        self.today = date.today()
+        
+        # the manager picks the best index for the filters and sorts by due date
+        with span("SchoolWorkBuddyGUI.refresh_assignment_list.query"):
+            assignments = list(self.manager.query(self.filter_query()))
         
-        # figure out which assignments to show based on status filter
+        # Add to tree with color coding
+        with span("SchoolWorkBuddyGUI.refresh_assignment_list.tree"):
+            self.tree_view.set_items(assignments)
+    
+    def schedule_search(self):
+        """Refresh the list once typing in the search box pauses."""
+        if self.search_after_id is not None:
+            self.root.after_cancel(self.search_after_id)
+        self.search_after_id = self.root.after(SEARCH_DEBOUNCE_MS, self.run_search)
+    
+    def run_search(self):
+        """Apply the search box to the All Assignments list."""
+        self.search_after_id = None
+        self.refresh_assignment_list()
+    
+    def filter_query(self) -> Query:
+        """Build the query for the status, course and date filters and the search box."""
+        today = self.today
         filter_type = self.filter_var.get()
-        if filter_type == "all":
-            assignments = self.manager.get_all_assignments()
-        elif filter_type == "pending":
-            assignments = self.manager.get_pending_assignments()
+        criteria = {}
+        if filter_type == "pending":
+            criteria['completed'] = False
         elif filter_type == "completed":
-            assignments = self.manager.get_completed_assignments()
+            criteria['completed'] = True
         elif filter_type == "overdue":
-            assignments = self.manager.get_overdue_assignments()
+            criteria['overdue'] = True
         
-        # now apply course filter if one is selected
         course_filter = self.course_filter.get()
         if course_filter and course_filter != "All Courses":
-            assignments = [a for a in assignments if a.course == course_filter]
+            criteria['courses'] = [course_filter]
         
-        # and also check the date filter
         date_filter = self.date_filter.get()
-        if date_filter and date_filter != "All Dates":
-            today = date.today()
-            if date_filter == "Due Today":
-                assignments = [a for a in assignments if a.days_until_due() == 0]
-            elif date_filter == "Due This Week":
-                assignments = [a for a in assignments if 0 <= a.days_until_due() <= 7]
-            elif date_filter == "Due This Month":
-                assignments = [a for a in assignments if 0 <= a.days_until_due() <= 30]
-            elif date_filter == "Past Due":
-                assignments = [a for a in assignments if a.days_until_due() < 0 and not a.completed]
-        
-        # Sort by due date
-        assignments = self.manager.sort_by_due_date(assignments)
+        if date_filter == "Past Due":
+            criteria['overdue'] = True
+        elif date_filter in ("Due Today", "Due This Week", "Due This Month"):
+            days = {"Due Today": 0, "Due This Week": 7, "Due This Month": 30}[date_filter]
+            criteria['due_after'] = today
+            criteria['due_before'] = today + timedelta(days=days)
+        
+        return Query(today=today, search=self.search_var.get(), **criteria)
+    
+    def matches_filters(self, assignment) -> bool:
+        """Check whether an assignment belongs in the All Assignments list."""
+        return self.filter_query().matches(assignment)
+    
+    def sync_row(self, view, assignment, wanted: bool, moved: bool = False):
+        """
+        Insert, update or remove one assignment's row in a tree view.
+        
+        Args:
+            view: VirtualTreeview to update
+            assignment: The assignment that changed
+            wanted: Whether the assignment should be in the view now
+            moved: Whether its sort position may have changed
+        """
+        shown = view.contains(assignment.id)
+        if shown and (not wanted or moved):
+            view.remove_item(assignment.id)
+            shown = False
+        if wanted and shown:
+            view.update_item(assignment)
+        elif wanted:
+            view.insert_item(assignment)
+    
+    @timed
+    def on_manager_event(self, event):
+        """Update the views for a change reported by the assignment manager."""
+        if event.kind == ChangeEvent.IMPORTED or len(event.ids) > BULK_REFRESH_SIZE:
+            # big changes are cheaper to redraw through the diffing refresh
+            self.refresh_all()
+            return
         
-        # Add to tree with color coding
-        for assignment in assignments:
-            days_left = assignment.days_until_due()
-            status = "✓ Complete" if assignment.completed else "⏳ Pending"
-            
-            # Determine color tag based on days until due and completion status
-            if assignment.completed:
-                # Completed assignments are gray
-                tag = 'completed'
-                days_left_text = "Completed"
-            elif days_left < 0:
-                # Overdue assignments (red)
-                days_left_text = f"⚠ {abs(days_left)} days overdue"
-                tag = 'overdue'
-            elif days_left == 0:
-                # Due today (red)
-                days_left_text = "📌 DUE TODAY!"
-                tag = 'due_1day'
-            elif days_left == 1:
-                # Due in 1 day (red)
-                days_left_text = f"⚠ {days_left} day"
-                tag = 'due_1day'
-            elif 2 <= days_left <= 4:
-                # Due in 2-4 days (yellow)
-                days_left_text = f"⚡ {days_left} days"
-                tag = 'due_2to4days'
-            elif 5 <= days_left <= 7:
-                # Due in 5-7 days (green)
-                days_left_text = f"✓ {days_left} days"
-                tag = 'due_5to7days'
-            else:
-                # 8+ days (no special color)
-                days_left_text = f"{days_left} days"
-                tag = 'due_8plus'
-            
-            self.tree.insert('', tk.END, text=assignment.title, 
-                           values=(assignment.course, assignment.due_date, 
-                                 days_left_text, status, assignment.grade or '-'),
-                           tags=(tag, str(assignment.id)))
+        self.today = date.today()
+        if event.kind == ChangeEvent.DELETED:
+            for assignment_id in event.ids:
+                self.tree_view.remove_item(assignment_id)
+                if self.course_tree_view is not None:
+                    self.course_tree_view.remove_item(assignment_id)
+            # their courses may have no assignments left
+            self.update_course_filter_options()
+        else:
+            assignments = [self.manager.get_assignment(i) for i in event.ids]
+            assignments = [a for a in assignments if a is not None]
+            if event.kind == ChangeEvent.ADDED or 'course' in event.fields:
+                self.add_new_courses(assignments)
+            moved = 'due_date' in event.fields
+            for assignment in assignments:
+                self.sync_row(self.tree_view, assignment,
+                              self.matches_filters(assignment), moved)
+                if self.course_tree_view is not None:
+                    self.sync_row(self.course_tree_view, assignment,
+                                  assignment.course == self.course_view_var.get(), moved)
         
-        # Configure color tags
+        self.update_statistics()
+        self.update_course_statistics()
+    
+    def add_new_courses(self, assignments):
+        """Add any courses not yet in the dropdowns."""
+        known = set(self.course_combo['values'])
+        if all(a.course in known for a in assignments):
+            return
+        previous_course = self.course_view_var.get()
+        self.update_course_filter_options()
+        if self.course_view_var.get() != previous_course:
+            # the By Course tab picked its first course
+            self.refresh_course_view()
+    
+    def schedule_midnight_refresh(self):
+        """Redraw just after midnight so days left and overdue counts roll over."""
+        now = datetime.now()
+        midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+        delay_ms = int((midnight - now).total_seconds() * 1000) + 1000
+        self.root.after(delay_ms, self.on_new_day)
+    
+    def on_new_day(self):
+        """Refresh everything for the new date."""
+        self.refresh_all()
+        self.schedule_midnight_refresh()
+    
+    @timed
+    def refresh_all(self):
+        """Rebuild every view from the manager's data."""
+        self.update_course_filter_options()
+        self.refresh_assignment_list()
+        self.refresh_course_view()
+        self.update_statistics()
+    
+    def configure_tags(self, tree):
+        """Set up the color tags used for assignment rows."""
         # 1 day or less: RED
-        self.tree.tag_configure('due_1day', 
-                               foreground='#D32F2F',  # Red
-                               font=('Segoe UI', 9, 'bold'))
+        tree.tag_configure('due_1day', 
+                           foreground='#D32F2F',  # Red
+                           font=('Segoe UI', 9, 'bold'))
         
         # 2-4 days: YELLOW/ORANGE
-        self.tree.tag_configure('due_2to4days', 
-                               foreground='#F57C00',  # Orange/Yellow
-                               font=('Segoe UI', 9, 'bold'))
+        tree.tag_configure('due_2to4days', 
+                           foreground='#F57C00',  # Orange/Yellow
+                           font=('Segoe UI', 9, 'bold'))
         
         # 5-7 days: GREEN
-        self.tree.tag_configure('due_5to7days', 
-                               foreground='#388E3C',  # Green
-                               font=('Segoe UI', 9))
+        tree.tag_configure('due_5to7days', 
+                           foreground='#388E3C',  # Green
+                           font=('Segoe UI', 9))
         
         # 8+ days: Normal (black)
-        self.tree.tag_configure('due_8plus', 
-                               foreground='#333333',
-                               font=('Segoe UI', 9))
+        tree.tag_configure('due_8plus', 
+                           foreground='#333333',
+                           font=('Segoe UI', 9))
         
         # Overdue: Dark RED with bold
-        self.tree.tag_configure('overdue', 
-                               foreground='#B71C1C',  # Dark Red
-                               font=('Segoe UI', 9, 'bold'))
+        tree.tag_configure('overdue', 
+                           foreground='#B71C1C',  # Dark Red
+                           font=('Segoe UI', 9, 'bold'))
         
         # Completed: Gray
-        self.tree.tag_configure('completed', 
-                               foreground='#9E9E9E',  # Gray
-                               font=('Segoe UI', 9))
-
+        tree.tag_configure('completed', 
+                           foreground='#9E9E9E',  # Gray
+                           font=('Segoe UI', 9))
+    
+    def days_left_display(self, assignment):
+        """Return the (text, color tag) for an assignment's days-left column."""
+        days_left = assignment.days_until_due(self.today)
+        
+        # Determine color tag based on days until due and completion status
+        if assignment.completed:
+            # Completed assignments are gray
+            return "Completed", 'completed'
+        elif days_left < 0:
+            # Overdue assignments (red)
+            return f"⚠ {abs(days_left)} days overdue", 'overdue'
+        elif days_left == 0:
+            # Due today (red)
+            return "📌 DUE TODAY!", 'due_1day'
+        elif days_left == 1:
+            # Due in 1 day (red)
+            return f"⚠ {days_left} day", 'due_1day'
+        elif 2 <= days_left <= 4:
+            # Due in 2-4 days (yellow)
+            return f"⚡ {days_left} days", 'due_2to4days'
+        elif 5 <= days_left <= 7:
+            # Due in 5-7 days (green)
+            return f"✓ {days_left} days", 'due_5to7days'
+        else:
+            # 8+ days (no special color)
+            return f"{days_left} days", 'due_8plus'
+    
+    def assignment_row(self, assignment):
+        """Build the All Assignments tree row for an assignment."""
+        days_left_text, tag = self.days_left_display(assignment)
+        status = "✓ Complete" if assignment.completed else "⏳ Pending"
+        return (assignment.title,
+                (assignment.course, assignment.due_date,
+                 days_left_text, status, assignment.grade or '-'),
+                (tag, str(assignment.id)))
+    
+    def course_assignment_row(self, assignment):
+        """Build the By Course tree row for an assignment."""
+        days_left_text, tag = self.days_left_display(assignment)
+        status = "✓ Complete" if assignment.completed else "⏳ Pending"
+        return (assignment.title,
+                (assignment.due_date, days_left_text,
+                 status, assignment.grade or '-'),
+                (tag, str(assignment.id)))
     
     def get_selected_assignment_id(self):
         """Get the ID of the currently selected assignment."""
@@ -638,8 +1072,6 @@ class SchoolWorkBuddyGUI:
         assignment_id = self.get_selected_assignment_id()
         if assignment_id:
             self.manager.mark_complete(assignment_id, True)
-            self.refresh_assignment_list()
-            self.update_statistics()
             messagebox.showinfo("Success", "Assignment marked as complete!")
     
     def mark_incomplete(self):
@@ -647,8 +1079,6 @@ class SchoolWorkBuddyGUI:
         assignment_id = self.get_selected_assignment_id()
         if assignment_id:
             self.manager.mark_complete(assignment_id, False)
-            self.refresh_assignment_list()
-            self.update_statistics()
             messagebox.showinfo("Success", "Assignment marked as incomplete!")
     
     def add_grade_dialog(self):
@@ -683,7 +1113,6 @@ class SchoolWorkBuddyGUI:
             grade = grade_entry.get().strip()
             if grade:
                 self.manager.add_grade(assignment_id, grade)
-                self.refresh_assignment_list()
                 dialog.destroy()
                 messagebox.showinfo("Success", "Grade added successfully!")
             else:
@@ -709,101 +1138,68 @@ class SchoolWorkBuddyGUI:
         if messagebox.askyesno("Confirm Delete", 
                               "Are you sure you want to delete this assignment?"):
             self.manager.delete_assignment(assignment_id)
-            self.refresh_assignment_list()
-            self.update_statistics()
             messagebox.showinfo("Success", "Assignment deleted successfully!")
     
     def update_statistics(self):
         """Update the statistics display."""
-        all_assignments = self.manager.get_all_assignments()
-        pending = len(self.manager.get_pending_assignments())
-        completed = len(self.manager.get_completed_assignments())
-        overdue = len(self.manager.get_overdue_assignments())
+        if self.manager is None:
+            self.stats_label.config(text="Loading assignments...")
+            return
+        
+        stats = self.manager.get_statistics()
         
         # format the stats text nicely
-        stats_text = f"""Total Assignments: {len(all_assignments)}
-Pending: {pending}
-Completed: {completed}
-Overdue: {overdue}"""
+        stats_text = f"""Total Assignments: {stats['total']}
+Pending: {stats['pending']}
+Completed: {stats['completed']}
+Overdue: {stats['overdue']}"""
         
         self.stats_label.config(text=stats_text)
     
+    @timed
     def refresh_course_view(self):
         """Refresh the course-specific view."""
-        # Clear existing items
-        for item in self.course_tree.get_children():
-            self.course_tree.delete(item)
+        if self.course_tree_view is None or self.manager is None:
+            return
         
         selected_course = self.course_view_var.get()
         if not selected_course:
+            self.course_tree_view.set_items([])
             return
         
+        self.today = date.today()
+        self.update_course_statistics()
+        
         # Get assignments for selected course
-        assignments = self.manager.get_assignments_by_course(selected_course)
-        assignments = self.manager.sort_by_due_date(assignments)
+        assignments = list(self.manager.query(Query(courses=[selected_course])))
+        
+        # Populate tree
+        with span("SchoolWorkBuddyGUI.refresh_course_view.tree"):
+            self.course_tree_view.set_items(assignments)
+    
+    def update_course_statistics(self):
+        """Update the statistics for the selected course."""
+        selected_course = self.course_view_var.get()
+        if not selected_course or self.course_tree_view is None:
+            return
         
-        # Calculate course statistics
-        total = len(assignments)
-        pending = len([a for a in assignments if not a.completed])
-        completed = len([a for a in assignments if a.completed])
-        overdue = len([a for a in assignments if a.is_overdue()])
+        stats = self.manager.get_statistics(selected_course)
         
         # Calculate average grade if applicable
-        graded = [a for a in assignments if a.grade and a.grade.strip()]
-        avg_grade = f"{len(graded)} graded" if graded else "No grades yet"
+        graded = stats['graded']
+        avg_grade = f"{graded} graded" if graded else "No grades yet"
         
         # Update course stats
         course_stats = f"""Course: {selected_course}
 
-Total Assignments: {total}
-Pending: {pending}
-Completed: {completed}
-Overdue: {overdue}
+Total Assignments: {stats['total']}
+Pending: {stats['pending']}
+Completed: {stats['completed']}
+Overdue: {stats['overdue']}
 
 Graded: {avg_grade}"""
         
         self.course_stats_label.config(text=course_stats)
-        
-        # Populate tree
-        for assignment in assignments:
-            days_left = assignment.days_until_due()
-            status = "✓ Complete" if assignment.completed else "⏳ Pending"
-            
-            # Determine color tag
-            if assignment.completed:
-                tag = 'completed'
-                days_left_text = "Completed"
-            elif days_left < 0:
-                days_left_text = f"⚠ {abs(days_left)} days overdue"
-                tag = 'overdue'
-            elif days_left == 0:
-                days_left_text = "📌 DUE TODAY!"
-                tag = 'due_1day'
-            elif days_left == 1:
-                days_left_text = f"⚠ {days_left} day"
-                tag = 'due_1day'
-            elif 2 <= days_left <= 4:
-                days_left_text = f"⚡ {days_left} days"
-                tag = 'due_2to4days'
-            elif 5 <= days_left <= 7:
-                days_left_text = f"✓ {days_left} days"
-                tag = 'due_5to7days'
-            else:
-                days_left_text = f"{days_left} days"
-                tag = 'due_8plus'
-            
-            self.course_tree.insert('', tk.END, text=assignment.title,
-                                   values=(assignment.due_date, days_left_text,
-                                          status, assignment.grade or '-'),
-                                   tags=(tag, str(assignment.id)))
-        
-        # Apply color tags
-        self.course_tree.tag_configure('due_1day', foreground='#D32F2F', font=('Segoe UI', 9, 'bold'))
-        self.course_tree.tag_configure('due_2to4days', foreground='#F57C00', font=('Segoe UI', 9, 'bold'))
-        self.course_tree.tag_configure('due_5to7days', foreground='#388E3C', font=('Segoe UI', 9))
-        self.course_tree.tag_configure('due_8plus', foreground='#333333', font=('Segoe UI', 9))
-        self.course_tree.tag_configure('overdue', foreground='#B71C1C', font=('Segoe UI', 9, 'bold'))
-        self.course_tree.tag_configure('completed', foreground='#9E9E9E', font=('Segoe UI', 9))
     
     def get_selected_course_assignment_id(self):
         """Get the ID of the currently selected assignment in course view."""
@@ -824,9 +1220,6 @@ Graded: {avg_grade}"""
         assignment_id = self.get_selected_course_assignment_id()
         if assignment_id:
             self.manager.mark_complete(assignment_id, True)
-            self.refresh_course_view()
-            self.refresh_assignment_list()
-            self.update_statistics()
             messagebox.showinfo("Success", "Assignment marked as complete!")
     
     def mark_incomplete_course(self):
@@ -834,9 +1227,6 @@ Graded: {avg_grade}"""
         assignment_id = self.get_selected_course_assignment_id()
         if assignment_id:
             self.manager.mark_complete(assignment_id, False)
-            self.refresh_course_view()
-            self.refresh_assignment_list()
-            self.update_statistics()
             messagebox.showinfo("Success", "Assignment marked as incomplete!")
     
     def add_grade_dialog_course(self):
@@ -871,8 +1261,6 @@ Graded: {avg_grade}"""
             grade = grade_entry.get().strip()
             if grade:
                 self.manager.add_grade(assignment_id, grade)
-                self.refresh_course_view()
-                self.refresh_assignment_list()
                 dialog.destroy()
                 messagebox.showinfo("Success", "Grade added successfully!")
             else:
@@ -896,35 +1284,92 @@ Graded: {avg_grade}"""
         if messagebox.askyesno("Confirm Delete",
                               "Are you sure you want to delete this assignment?"):
             self.manager.delete_assignment(assignment_id)
-            self.refresh_course_view()
-            self.refresh_assignment_list()
-            self.update_course_filter_options()
-            self.update_statistics()
             messagebox.showinfo("Success", "Assignment deleted successfully!")
     
+    def data_file_types(self):
+        """File dialog filters for import/export files."""
+        compressed = " ".join(f"*.json{ext} *.jsonl{ext}" for ext in COMPRESSORS)
+        return [("JSON files", "*.json"), ("JSON lines", "*.jsonl"),
+                ("Compressed", compressed), ("All files", "*.*")]
+    
     def export_data(self):
-        """Export all assignment data to a JSON file."""
-        # open file dialog to let user pick where to save
+        """Export all assignment data to a JSON or JSON-lines file."""
+        if self.loading():
+            return
+        from tkinter import filedialog
+        
+        # open file dialog to let user pick where to save; the extension
+        # picks the format and compression
         file_path = filedialog.asksaveasfilename(
             defaultextension=".json",
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")],
+            filetypes=self.data_file_types(),
             title="Export Assignment Data"
         )
         
-        if file_path:
+        if not file_path:
+            return
+        
+        # write on a worker thread; the manager only locks one chunk at a time
+        total = len(self.manager.assignments)
+        cancel = threading.Event()
+        result = {'written': 0}
+        
+        def work():
             try:
-                data = self.manager.export_data()
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    json.dump(data, f, indent=2)
+                result['finished'] = self.manager.export_to_file(
+                    file_path, progress=lambda count: result.update(written=count),
+                    cancel=cancel)
+            except Exception as e:
+                result['error'] = e
+            finally:
+                result['done'] = True
+        
+        dialog, progress, label = self.show_progress_dialog("Exporting", total, cancel.set)
+        
+        def poll():
+            if not result.get('done'):
+                progress['value'] = result['written']
+                label.config(text=f"Wrote {result['written']} of {total} assignments...")
+                self.root.after(PROGRESS_POLL_MS, poll)
+                return
+            
+            dialog.destroy()
+            if 'error' in result:
+                messagebox.showerror("Error", f"Failed to export data:\n{str(result['error'])}")
+            elif result.get('finished'):
                 messagebox.showinfo("Success", 
                                    f"Data exported successfully to:\n{file_path}")
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to export data:\n{str(e)}")
+        
+        threading.Thread(target=work, name="Export", daemon=True).start()
+        self.root.after(PROGRESS_POLL_MS, poll)
+    
+    def show_progress_dialog(self, title: str, maximum: int, on_cancel):
+        """Open a modal progress dialog; returns (dialog, progress bar, label)."""
+        dialog = tk.Toplevel(self.root)
+        dialog.title(title)
+        dialog.geometry("360x130")
+        dialog.transient(self.root)
+        dialog.grab_set()
+        dialog.protocol("WM_DELETE_WINDOW", on_cancel)
+        
+        frame = ttk.Frame(dialog, padding="20")
+        frame.pack(fill=tk.BOTH, expand=True)
+        
+        label = ttk.Label(frame, text="Starting...")
+        label.pack(anchor=tk.W, pady=(0, 10))
+        progress = ttk.Progressbar(frame, mode='determinate', maximum=max(maximum, 1))
+        progress.pack(fill=tk.X, pady=(0, 10))
+        ttk.Button(frame, text="Cancel", command=on_cancel).pack()
+        return dialog, progress, label
     
     def import_data(self):
-        """Import assignment data from a JSON file."""
+        """Import assignment data from a JSON or JSON-lines file."""
+        if self.loading():
+            return
+        from tkinter import filedialog
+        
         file_path = filedialog.askopenfilename(
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")],
+            filetypes=self.data_file_types(),
             title="Import Assignment Data"
         )
         
@@ -942,20 +1387,52 @@ Graded: {avg_grade}"""
                 return
             
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
-                self.manager.import_data(data, merge=merge)
-                self.update_course_filter_options()
-                self.refresh_assignment_list()
-                self.refresh_course_view()
-                self.update_statistics()
-                
-                action = "merged" if merge else "replaced"
-                messagebox.showinfo("Success", 
-                                   f"Data {action} successfully from:\n{file_path}")
-            except Exception as e:
+                reader = RecordReader(file_path)
+            except OSError as e:
                 messagebox.showerror("Error", f"Failed to import data:\n{str(e)}")
+                return
+            
+            # parse on a worker thread; the result is applied here on the
+            # main thread so change events reach Tk from the right thread
+            session = self.manager.begin_import(merge)
+            result = {}
+            
+            def work():
+                try:
+                    session.read(reader)
+                except Exception as e:
+                    result['error'] = e
+                finally:
+                    result['done'] = True
+            
+            def cancel():
+                session.cancelled = True
+            
+            dialog, progress, label = self.show_progress_dialog(
+                "Importing", reader.total_bytes, cancel)
+            
+            def poll():
+                if not result.get('done'):
+                    progress['value'] = reader.bytes_read
+                    label.config(text=f"Read {len(session)} assignments...")
+                    self.root.after(PROGRESS_POLL_MS, poll)
+                    return
+                
+                dialog.destroy()
+                if session.cancelled:
+                    return
+                try:
+                    if 'error' in result:
+                        raise result['error']
+                    session.commit(reader.next_id)
+                    action = "merged" if merge else "replaced"
+                    messagebox.showinfo("Success", 
+                                       f"Data {action} successfully from:\n{file_path}")
+                except Exception as e:
+                    messagebox.showerror("Error", f"Failed to import data:\n{str(e)}")
+            
+            threading.Thread(target=work, name="Import", daemon=True).start()
+            self.root.after(PROGRESS_POLL_MS, poll)
 
 
 def main():
@@ -0,0 +1,179 @@
+"""
+Instrumentation
+
+Opt-in timing of the hot paths: AssignmentManager operations, storage I/O
+and the GUI refresh phases. Each timed call records its duration under a
+name; stats() reports call counts, totals and p50/p95 latencies over the
+most recent calls. Recording is off by default, and a timed call then
+costs one flag check.
+
+Turn it on with SWB_PROFILE=1 (or from the GUI's Help menu). Setting
+SWB_PROFILE_DUMP=session.prof also runs cProfile for the whole session
+and writes its stats to that file on exit; open it with
+"python -m pstats session.prof" or snakeviz.
+
+Author: Betapandas
+Contact: Betapandas@gmail.com
+"""
+
+import atexit
+import cProfile
+import functools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+
+# durations kept per name for the percentiles
+SAMPLES = 1000
+
+
+class _Timings:
+    """Call count, total time and recent durations for one name."""
+
+    __slots__ = ('calls', 'total', 'max', 'recent')
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=SAMPLES)
+
+
+_lock = threading.Lock()
+_timings: Dict[str, _Timings] = {}
+_enabled = False
+_profiler: Optional[cProfile.Profile] = None
+
+
+def enable(on: bool = True):
+    """Start (or stop) recording timings."""
+    global _enabled
+    _enabled = on
+
+
+def enabled() -> bool:
+    """Whether timings are being recorded."""
+    return _enabled
+
+
+def record(name: str, seconds: float):
+    """Add one duration under a name."""
+    with _lock:
+        timings = _timings.get(name)
+        if timings is None:
+            timings = _timings[name] = _Timings()
+        timings.calls += 1
+        timings.total += seconds
+        timings.max = max(timings.max, seconds)
+        timings.recent.append(seconds)
+
+
+@contextmanager
+def span(name: str):
+    """Time the body of a with block under a name."""
+    if not _enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def timed(method):
+    """Time every call of a function under its qualified name."""
+    name = method.__qualname__
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return method(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            record(name, time.perf_counter() - start)
+    return wrapper
+
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of a sorted list."""
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def stats() -> List[Dict]:
+    """
+    Summaries of everything recorded, slowest total first.
+
+    Every entry has name, calls, total, mean, p50, p95 and max, in
+    seconds; the percentiles cover the last SAMPLES calls only.
+    """
+    with _lock:
+        items = [(name, t.calls, t.total, t.max, sorted(t.recent))
+                 for name, t in _timings.items()]
+    summaries = [{
+        'name': name,
+        'calls': calls,
+        'total': total,
+        'mean': total / calls,
+        'p50': _percentile(recent, 0.5),
+        'p95': _percentile(recent, 0.95),
+        'max': worst,
+    } for name, calls, total, worst, recent in items]
+    summaries.sort(key=lambda s: s['total'], reverse=True)
+    return summaries
+
+
+def format_stats() -> str:
+    """The recorded timings as a plain-text table, in milliseconds."""
+    lines = [f"{'operation':<50} {'calls':>8} {'total':>10} {'p50':>9} {'p95':>9} {'max':>9}"]
+    for entry in stats():
+        lines.append(f"{entry['name']:<50} {entry['calls']:>8} {entry['total'] * 1000:>10.2f} "
+                     f"{entry['p50'] * 1000:>9.3f} {entry['p95'] * 1000:>9.3f} "
+                     f"{entry['max'] * 1000:>9.3f}")
+    return "\n".join(lines)
+
+
+def reset():
+    """Forget everything recorded so far."""
+    with _lock:
+        _timings.clear()
+
+
+def start_profile():
+    """Run cProfile on the calling thread until stop_profile()."""
+    global _profiler
+    if _profiler is None:
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+
+
+def profiling() -> bool:
+    """Whether a cProfile session is running."""
+    return _profiler is not None
+
+
+def stop_profile(path: Optional[str] = None):
+    """Stop cProfile and, given a path, write its stats there."""
+    global _profiler
+    if _profiler is None:
+        return
+    profiler, _profiler = _profiler, None
+    profiler.disable()
+    if path:
+        profiler.dump_stats(path)
+
+
+def setup_from_environment():
+    """Apply SWB_PROFILE and SWB_PROFILE_DUMP."""
+    if os.environ.get('SWB_PROFILE') == '1':
+        enable()
+    dump = os.environ.get('SWB_PROFILE_DUMP')
+    if dump:
+        start_profile()
+        atexit.register(stop_profile, dump)
@@ -2,18 +2,36 @@
 SchoolWorkBuddy - A Python application to help manage college work.
 
 This is the main entry point for the application.
-Launches the GUI interface for managing assignments, due dates, and grades.
+Launches the GUI interface for managing assignments, due dates, and grades,
+the command line tool with "python main.py cli ...", or the HTTP server
+with "python main.py serve ...".
+SWB_PROFILE=1 and SWB_PROFILE_DUMP=FILE turn on profiling for any of them;
+see instrumentation.py.
 
 Developed by: Betapandas
 Email: Betapandas@gmail.com
 Year: 2026
 """
 
-from gui_app import main as gui_main
+import sys
+
+import instrumentation
 
 
 def main():
-    """Main function to run the GUI application."""
+    """Main function to run the GUI application (or the CLI or server)."""
+    instrumentation.setup_from_environment()
+
+    if len(sys.argv) > 1 and sys.argv[1] == "cli":
+        # imported here so the CLI works without tkinter installed
+        from cli import main as cli_main
+        sys.exit(cli_main(sys.argv[2:]))
+
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        from server import main as serve_main
+        sys.exit(serve_main(sys.argv[2:]))
+
+    from gui_app import main as gui_main
     print("Launching SchoolWorkBuddy GUI...")
     gui_main()
 
@@ -0,0 +1,350 @@
+"""
+Remote Assignment Manager
+
+An AssignmentManager that forwards every call to a SchoolWorkBuddy server
+(see server.py), so several people can share one set of assignments. The
+GUI uses it when SWB_SERVER is set:
+
+    SWB_SERVER=http://192.168.1.20:8765 python main.py
+
+Each thread keeps its own keep-alive connection. Changes made through this
+client are reported to subscribers straight away; changes made by other
+clients arrive through fetch_events() and deliver_events().
+
+Author: Betapandas
+Contact: Betapandas@gmail.com
+"""
+
+import http.client
+import json
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import date
+from typing import Dict, Iterator, List, Optional
+from urllib.parse import urlencode, urlsplit
+
+from assignment_model import Assignment, AssignmentManager, ChangeEvent, ImportSession, Query
+from instrumentation import timed
+from server import DEFAULT_PORT, query_to_params
+
+
+class RemoteError(OSError):
+    """The server could not be reached or failed to handle a request."""
+
+
+class RemoteAssignmentManager(AssignmentManager):
+    """Manages assignments kept by a SchoolWorkBuddy server."""
+
+    def __init__(self, url: str = f"http://127.0.0.1:{DEFAULT_PORT}", timeout: float = 60):
+        """
+        Connect to a server.
+
+        Args:
+            url: Server address, e.g. http://localhost:8765
+            timeout: Seconds to wait for a response, including long polls
+        """
+        parts = urlsplit(url if "//" in url else f"http://{url}")
+        if parts.scheme != "http":
+            raise ValueError(f"Unsupported server URL {url!r}")
+        self.data_file = url
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or DEFAULT_PORT
+        self.timeout = timeout
+        self.lock = threading.RLock()
+        self._init_events()
+        # sent with every request, so our own changes can be told apart
+        self.client_id = uuid.uuid4().hex
+        self._local = threading.local()
+        # the last server event seen; only later ones are fetched
+        self.event_seq = self._request('GET', "/events")['seq']
+
+    def _request(self, method: str, path: str, body=None, params: Optional[Dict] = None):
+        """
+        Send one request and decode the JSON response.
+
+        Returns None for 404. A connection the server has closed while idle
+        is reopened and the request sent again.
+
+        Raises:
+            ValueError: The server rejected the request
+            RemoteError: Any other failure
+        """
+        if params:
+            path += "?" + urlencode(params, doseq=True)
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        headers = {'X-Client-Id': self.client_id}
+        if data is not None:
+            headers['Content-Type'] = 'application/json'
+
+        while True:
+            connection = getattr(self._local, 'connection', None)
+            reused = connection is not None
+            if not reused:
+                connection = http.client.HTTPConnection(self.host, self.port,
+                                                         timeout=self.timeout)
+                self._local.connection = connection
+            try:
+                connection.request(method, path, body=data, headers=headers)
+                response = connection.getresponse()
+                payload = response.read()
+                break
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+                self._local.connection = None
+                if reused and isinstance(e, ConnectionError):
+                    continue
+                raise RemoteError(f"{method} {path} failed: {e}") from e
+
+        result = json.loads(payload) if payload else None
+        if response.status == 404:
+            return None
+        if response.status == 400:
+            raise ValueError(result['error'])
+        if response.status >= 300:
+            error = result.get('error') if isinstance(result, dict) else None
+            raise RemoteError(f"{method} {path} failed: {response.status} {error or response.reason}")
+        return result
+
+    @contextmanager
+    def batch(self):
+        """
+        Group calls, holding their events until the block ends.
+
+        Unlike the local manager, each call is its own transaction on the
+        server and nothing is undone if the block raises. Use update_many()
+        and delete_many(), which the server applies all at once.
+        """
+        with self.lock, self.hold_events():
+            yield self
+
+    @property
+    def assignments(self) -> List[Assignment]:
+        """All assignments, fetched from the server."""
+        return self.get_all_assignments()
+
+    @property
+    def next_id(self) -> int:
+        """Next free assignment id on the server."""
+        return self.export_meta()['next_id']
+
+    def load_assignments(self):
+        """Nothing to load; assignments are fetched on demand."""
+        pass
+
+    def save_assignments(self):
+        """Nothing to save; the server writes every change."""
+        pass
+
+    def flush(self):
+        """Nothing to flush; every call has finished on the server when it returns."""
+        pass
+
+    def close(self):
+        """Close this thread's connection."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def fetch_events(self, wait: float = 0) -> List[ChangeEvent]:
+        """
+        Changes made by other clients since the last call.
+
+        Safe to call from a worker thread; hand the result to
+        deliver_events() on the thread that owns the subscribers.
+
+        Args:
+            wait: Seconds the server may wait for a change before answering
+
+        Returns:
+            The events, or a single IMPORTED event if too many were missed
+        """
+        with self.lock:
+            since = self.event_seq
+        result = self._request('GET', "/events", params={'since': since, 'wait': wait})
+        with self.lock:
+            if self.event_seq != since:
+                # another thread fetched these already
+                return []
+            self.event_seq = result['seq']
+        if result['events'] is None:
+            return [ChangeEvent(ChangeEvent.IMPORTED, [])]
+        return [ChangeEvent(e['kind'], e['ids'], e['fields'])
+                for e in result['events'] if e['origin'] != self.client_id]
+
+    def deliver_events(self, events: List[ChangeEvent]):
+        """Report fetched events to subscribers, coalesced."""
+        with self.hold_events():
+            for event in events:
+                self._emit(event.kind, event.ids, event.fields)
+
+    def ensure_loaded(self):
+        """Nothing to load; the server holds the data."""
+        pass
+
+    def sync(self) -> bool:
+        """Deliver other clients' changes; returns whether there were any."""
+        return self.poll_events() > 0
+
+    def fetch_changes(self) -> Optional[List[ChangeEvent]]:
+        """Other clients' changes, or None if there are none; see fetch_events()."""
+        return self.fetch_events() or None
+
+    def apply_changes(self, fetched: List[ChangeEvent]) -> bool:
+        """Deliver what fetch_changes() returned; see deliver_events()."""
+        self.deliver_events(fetched)
+        return True
+
+    def file_watcher(self):
+        """Nothing to watch; changes arrive through fetch_events()."""
+        return None
+
+    def poll_events(self, wait: float = 0) -> int:
+        """Fetch and deliver other clients' changes; returns how many events."""
+        events = self.fetch_events(wait)
+        self.deliver_events(events)
+        return len(events)
+
+    def get_assignment(self, assignment_id: int) -> Optional[Assignment]:
+        """Get a single assignment by id."""
+        record = self._request('GET', f"/assignments/{int(assignment_id)}")
+        return Assignment.from_dict(record) if record is not None else None
+
+    @timed
+    def add_assignment(self, title: str, course: str, due_date: str,
+                       description: str = "") -> Assignment:
+        """Add a new assignment."""
+        record = self._request('POST', "/assignments", {
+            'title': title, 'course': course, 'due_date': due_date,
+            'description': description})
+        assignment = Assignment.from_dict(record)
+        self._emit(ChangeEvent.ADDED, [assignment.id])
+        return assignment
+
+    @timed
+    def update_assignment(self, assignment_id: int, **kwargs):
+        """Update an existing assignment."""
+        path = f"/assignments/{int(assignment_id)}"
+        before = self._request('GET', path)
+        if before is None:
+            return None
+        record = self._request('PATCH', path, kwargs)
+        if record is None:
+            return None
+        # like the local manager, report only the fields that really changed
+        changed = [key for key in kwargs if before.get(key) != record.get(key)]
+        if changed:
+            self._emit(ChangeEvent.UPDATED, [assignment_id], changed)
+        return Assignment.from_dict(record)
+
+    @timed
+    def delete_assignment(self, assignment_id: int):
+        """Delete an assignment."""
+        if self._request('DELETE', f"/assignments/{int(assignment_id)}") is not None:
+            self._emit(ChangeEvent.DELETED, [assignment_id])
+
+    @timed
+    def update_many(self, assignment_ids, **kwargs) -> List[Assignment]:
+        """Apply the same changes to several assignments in one server transaction."""
+        ids = list(assignment_ids)
+        [records] = self._request('POST', "/batch", {'operations': [
+            {'op': 'update', 'ids': ids, 'changes': kwargs}]})
+        updated = [Assignment.from_dict(r) for r in records]
+        if updated and kwargs:
+            self._emit(ChangeEvent.UPDATED, [a.id for a in updated], kwargs)
+        return updated
+
+    @timed
+    def delete_many(self, assignment_ids):
+        """Delete several assignments in one server transaction."""
+        [deleted] = self._request('POST', "/batch", {'operations': [
+            {'op': 'delete', 'ids': list(assignment_ids)}]})
+        if deleted:
+            self._emit(ChangeEvent.DELETED, deleted)
+
+    @timed
+    def query(self, query: Query) -> Iterator[Assignment]:
+        """Run a query on the server; see AssignmentManager.query()."""
+        records = self._request('GET', "/assignments", params=query_to_params(query))
+        return iter([Assignment.from_dict(r) for r in records])
+
+    def explain(self, query: Query) -> Dict:
+        """Describe how the server would run a query."""
+        return self._request('GET', "/explain", params=query_to_params(query))
+
+    def get_all_assignments(self) -> List[Assignment]:
+        """Get all assignments."""
+        return list(self.query(Query(sort='id')))
+
+    def get_pending_assignments(self) -> List[Assignment]:
+        """Get all incomplete assignments."""
+        return list(self.query(Query(completed=False, sort='id')))
+
+    def get_completed_assignments(self) -> List[Assignment]:
+        """Get all completed assignments."""
+        return list(self.query(Query(completed=True, sort='id')))
+
+    def get_overdue_assignments(self, today: Optional[date] = None) -> List[Assignment]:
+        """Get all overdue assignments."""
+        return list(self.query(Query(overdue=True, today=today, sort='id')))
+
+    def get_assignments_due_between(self, start: date, end: date) -> List[Assignment]:
+        """Get assignments due from start to end (inclusive), sorted by due date."""
+        return list(self.query(Query(due_after=start, due_before=end)))
+
+    def sort_by_due_date(self, assignments: List[Assignment] = None) -> List[Assignment]:
+        """Sort assignments by due date."""
+        if assignments is None:
+            return list(self.query(Query()))
+        return sorted(assignments, key=lambda a: a.due_date)
+
+    def get_statistics(self, course: Optional[str] = None) -> Dict[str, int]:
+        """Get assignment counts from the server."""
+        return self._request('GET', "/stats", params={'course': course} if course else None)
+
+    def get_all_courses(self) -> List[str]:
+        """Get list of all unique course names."""
+        return self._request('GET', "/courses")
+
+    def get_assignments_by_course(self, course: str) -> List[Assignment]:
+        """Get all assignments for a specific course."""
+        return list(self.query(Query(courses=[course], sort='id')))
+
+    def export_data(self) -> Dict:
+        """Export all data as a dictionary for backup/transfer."""
+        return self._request('GET', "/export")
+
+    def export_meta(self) -> Dict:
+        """Top-level values stored next to the exported assignments."""
+        return self._request('GET', "/meta")
+
+    def iter_records(self, chunk_size: int = 1000,
+                     query: Optional[Query] = None) -> Iterator[Dict]:
+        """
+        Yield every assignment (or a query's matches) as a dictionary.
+
+        Records are fetched a page of chunk_size at a time, so a long export
+        never holds the whole data set in one response.
+        """
+        query = query if query is not None else Query(sort='id')
+        params = query_to_params(query)
+        offset = query.offset
+        stop = None if query.limit is None else query.offset + query.limit
+        while stop is None or offset < stop:
+            size = chunk_size if stop is None else min(chunk_size, stop - offset)
+            params.update(offset=[str(offset)], limit=[str(size)])
+            page = self._request('GET', "/assignments", params=params)
+            yield from page
+            if len(page) < size:
+                return
+            offset += size
+
+    @timed
+    def _commit_import(self, session: ImportSession, next_id: Optional[int]):
+        """Send a finished ImportSession to the server in one request."""
+        result = self._request('POST', "/import", {
+            'assignments': [a.to_dict() for a in session.assignments],
+            'next_id': next_id,
+            'merge': session.merge})
+        self._emit(ChangeEvent.IMPORTED, result['ids'])
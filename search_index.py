@@ -0,0 +1,99 @@
+"""
+Search Index
+
+An inverted index from words to assignment ids, used for the search box.
+Text is split into lowercase words; a search matches the assignments that
+have, for every word typed, a word starting with it, so "alg hom" finds
+"Homework 1: Algebra Basics". Prefixes are looked up in a sorted list of
+every known word with bisect, so a search never scans the assignments.
+
+Author: Betapandas
+Contact: Betapandas@gmail.com
+"""
+
+import re
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Set, Tuple
+
+
+WORD = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase words."""
+    return WORD.findall(text.casefold()) if text else []
+
+
+def words(texts: Iterable[str]) -> Set[str]:
+    """Distinct words of several texts."""
+    return set(WORD.findall(" ".join(filter(None, texts)).casefold()))
+
+
+def matches(terms: Iterable[str], texts: Iterable[str]) -> bool:
+    """Check whether every term is a prefix of some word in the texts."""
+    found = words(texts)
+    return all(any(word.startswith(term) for word in found) for term in terms)
+
+
+class SearchIndex:
+    """Word -> ids postings plus a sorted vocabulary for prefix lookups."""
+
+    def __init__(self, documents: Iterable[Tuple[int, Iterable[str]]] = ()):
+        """
+        Build the index.
+
+        Args:
+            documents: (id, texts) pairs to index
+        """
+        self.postings: Dict[str, Set[int]] = {}
+        for doc_id, texts in documents:
+            for word in words(texts):
+                ids = self.postings.get(word)
+                if ids is None:
+                    ids = self.postings[word] = set()
+                ids.add(doc_id)
+        # every word in postings, sorted so a prefix is a contiguous run
+        self.vocabulary: List[str] = sorted(self.postings)
+
+    def add(self, doc_id: int, texts: Iterable[str]):
+        """Index one document."""
+        for word in words(texts):
+            ids = self.postings.get(word)
+            if ids is None:
+                ids = self.postings[word] = set()
+                insort(self.vocabulary, word)
+            ids.add(doc_id)
+
+    def remove(self, doc_id: int, texts: Iterable[str]):
+        """Drop one document; texts must be the ones it was added with."""
+        for word in words(texts):
+            ids = self.postings.get(word)
+            if ids is None:
+                continue
+            ids.discard(doc_id)
+            if not ids:
+                del self.postings[word]
+                del self.vocabulary[bisect_left(self.vocabulary, word)]
+
+    def prefix(self, term: str) -> Set[int]:
+        """Ids of the documents with a word starting with term."""
+        ids = self.postings.get(term)
+        found = set(ids) if ids else set()
+        # the exact word (if any) sorts first, so start just after it
+        position = bisect_left(self.vocabulary, term) + (ids is not None)
+        vocabulary = self.vocabulary
+        while position < len(vocabulary) and vocabulary[position].startswith(term):
+            found |= self.postings[vocabulary[position]]
+            position += 1
+        return found
+
+    def search(self, terms: Iterable[str]) -> Set[int]:
+        """Ids of the documents matching every term as a prefix."""
+        found = None
+        # longer terms usually match fewer words, so narrow with them first
+        for term in sorted(set(terms), key=len, reverse=True):
+            ids = self.prefix(term)
+            found = ids if found is None else found & ids
+            if not found:
+                break
+        return found if found is not None else set()
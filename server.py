@@ -0,0 +1,484 @@
+"""
+SchoolWorkBuddy - HTTP API Server
+
+Shares one assignment store between several users on a local network.
+The server owns the only AssignmentManager; clients talk JSON over HTTP,
+either directly or through remote_manager.RemoteAssignmentManager, which
+the GUI uses when SWB_SERVER is set.
+
+    python main.py serve --port 8765 --data assignments.json
+
+Endpoints:
+    GET    /assignments          query (see query_to_params for options)
+    GET    /explain              how that query would run
+    GET    /assignments/ID       one assignment
+    POST   /assignments          add {title, course, due_date, description}
+    PATCH  /assignments/ID       update the given fields
+    DELETE /assignments/ID       delete
+    POST   /batch                several operations as one transaction
+    GET    /stats?course=NAME    statistics
+    GET    /courses              course names
+    GET    /export, GET /meta    full export / export metadata
+    POST   /import               {assignments, next_id, merge}; returns the new ids
+    GET    /events?since=N       changes after event N (wait=SECONDS to block)
+
+Connections are kept alive between requests. Every request runs while
+holding the manager's lock, so each one sees and leaves consistent data;
+JSON encoding happens after the lock is released.
+
+Author: Betapandas
+Contact: Betapandas@gmail.com
+"""
+
+import argparse
+import json
+import signal
+import sys
+import threading
+from collections import deque
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from assignment_model import UPDATABLE, AssignmentManager, ChangeEvent, Query, parse_due_date
+from storage import WriteBehindStorage, open_storage
+
+
+DEFAULT_PORT = 8765
+
+# change events kept for clients catching up through /events
+EVENT_LOG_SIZE = 1000
+
+# longest /events?wait=... a client may ask for, in seconds
+MAX_EVENT_WAIT = 30
+
+# idle keep-alive connections are closed after this many seconds
+KEEPALIVE_TIMEOUT = 60
+
+
+class NotFound(Exception):
+    """An unknown route or assignment id; answered with 404."""
+
+
+def query_to_params(query: Query) -> Dict[str, List[str]]:
+    """Encode a Query as URL parameters for GET /assignments."""
+    params = {}
+    if query.ids is not None:
+        params['ids'] = [",".join(map(str, sorted(query.ids)))]
+    if query.courses is not None:
+        params['course'] = sorted(query.courses)
+    for name in ('completed', 'overdue', 'graded', 'reverse'):
+        value = getattr(query, name)
+        if value is not None:
+            params[name] = ["true" if value else "false"]
+    for name in ('due_after', 'due_before'):
+        value = getattr(query, name)
+        if value is not None:
+            params[name] = [value.isoformat()]
+    if query.text is not None:
+        params['text'] = [query.text]
+    if query.search is not None:
+        params['search'] = [" ".join(query.search)]
+    params['sort'] = [query.sort or "none"]
+    if query.limit is not None:
+        params['limit'] = [str(query.limit)]
+    if query.offset:
+        params['offset'] = [str(query.offset)]
+    params['today'] = [query.today.isoformat()]
+    return params
+
+
+def query_from_params(params: Dict[str, List[str]]) -> Query:
+    """Decode the URL parameters made by query_to_params()."""
+    def one(name: str) -> Optional[str]:
+        values = params.get(name)
+        return values[-1] if values else None
+
+    def flag(name: str) -> Optional[bool]:
+        value = one(name)
+        if value is None:
+            return None
+        if value not in ("true", "false"):
+            raise ValueError(f"{name} must be true or false")
+        return value == "true"
+
+    def day(name: str) -> Optional[date]:
+        value = one(name)
+        if value is None:
+            return None
+        parsed = parse_due_date(value)
+        if parsed is None:
+            raise ValueError(f"{name} must be a YYYY-MM-DD date")
+        return parsed
+
+    ids = one('ids')
+    sort = one('sort') or 'due_date'
+    limit = one('limit')
+    return Query(
+        ids=[int(i) for i in ids.split(",") if i] if ids is not None else None,
+        courses=params.get('course'),
+        completed=flag('completed'),
+        overdue=flag('overdue'),
+        due_after=day('due_after'),
+        due_before=day('due_before'),
+        graded=flag('graded'),
+        text=one('text'),
+        search=one('search'),
+        sort=None if sort == "none" else sort,
+        reverse=bool(flag('reverse')),
+        limit=int(limit) if limit is not None else None,
+        offset=int(one('offset') or 0),
+        today=day('today'))
+
+
+def check_fields(fields: Dict) -> Dict:
+    """
+    Reject field values of the wrong type before they reach the manager.
+
+    Text fields must be strings, due_date a YYYY-MM-DD date and completed
+    a boolean; anything else would be stored and break later searches.
+    """
+    if not isinstance(fields, dict):
+        raise ValueError("Expected a JSON object of fields")
+    for name, value in fields.items():
+        if name == 'completed':
+            if not isinstance(value, bool):
+                raise ValueError("completed must be true or false")
+        elif name == 'due_date':
+            if not isinstance(value, str) or parse_due_date(value) is None:
+                raise ValueError(f"Invalid due_date {value!r}; use YYYY-MM-DD")
+        elif not isinstance(value, str):
+            raise ValueError(f"{name} must be a string")
+    return fields
+
+
+def check_changes(changes: Dict) -> Dict:
+    """Reject changes to fields that cannot be updated, or of the wrong type."""
+    if not isinstance(changes, dict):
+        raise ValueError("Expected a JSON object of changes")
+    unknown = set(changes) - set(UPDATABLE)
+    if unknown:
+        raise ValueError(f"Cannot update {', '.join(sorted(unknown))}")
+    return check_fields(changes)
+
+
+def check_new(fields: Dict) -> Dict:
+    """The fields of an assignment to add, checked; see check_fields()."""
+    if not isinstance(fields, dict):
+        raise ValueError("Expected a JSON object of fields")
+    missing = [name for name in ('title', 'course', 'due_date') if name not in fields]
+    if missing:
+        raise ValueError(f"Missing {', '.join(missing)}")
+    return check_fields({'title': fields['title'], 'course': fields['course'],
+                         'due_date': fields['due_date'],
+                         'description': fields.get('description', "")})
+
+
+def event_to_dict(seq: int, origin: Optional[str], event: ChangeEvent) -> Dict:
+    """JSON form of one logged change event."""
+    return {'seq': seq, 'origin': origin, 'kind': event.kind,
+            'ids': event.ids, 'fields': sorted(event.fields)}
+
+
+class EventLog:
+    """
+    The most recent change events, numbered, for clients to poll.
+
+    Each event remembers the client whose request caused it (its
+    X-Client-Id header), so clients can skip their own changes.
+    """
+
+    def __init__(self, manager: AssignmentManager, size: int = EVENT_LOG_SIZE):
+        """Start logging the manager's events."""
+        self.events = deque(maxlen=size)
+        self.seq = 0
+        self.changed = threading.Condition()
+        # client id of the request running on each handler thread
+        self.origin = threading.local()
+        manager.subscribe(self.append)
+
+    def append(self, event: ChangeEvent):
+        """Log one event; called by the manager."""
+        with self.changed:
+            self.seq += 1
+            self.events.append((self.seq, getattr(self.origin, 'client', None), event))
+            self.changed.notify_all()
+
+    def since(self, seq: int, wait: float = 0) -> Tuple[int, Optional[List[Dict]]]:
+        """
+        Events numbered after seq, waiting up to wait seconds for one.
+
+        Returns:
+            (latest event number, events), where events is None if some of
+            them have already been dropped and the client must reload
+        """
+        with self.changed:
+            if wait > 0 and self.seq <= seq:
+                self.changed.wait_for(lambda: self.seq > seq, timeout=wait)
+            if self.events and self.events[0][0] > seq + 1:
+                return self.seq, None
+            if seq > self.seq:
+                # the server restarted since the client last asked
+                return self.seq, None
+            return self.seq, [event_to_dict(*entry) for entry in self.events
+                              if entry[0] > seq]
+
+
+class ApiServer(ThreadingHTTPServer):
+    """HTTP server sharing one AssignmentManager between its clients."""
+
+    daemon_threads = True
+    # the default of 5 drops connection bursts, which then retry after 1 s
+    request_queue_size = 128
+
+    def __init__(self, address: Tuple[str, int], manager: AssignmentManager,
+                 verbose: bool = False):
+        """
+        Bind the server.
+
+        Args:
+            address: (host, port) to listen on; port 0 picks a free one
+            manager: Manager to serve
+            verbose: Log every request to stderr
+        """
+        super().__init__(address, ApiHandler)
+        self.manager = manager
+        self.events = EventLog(manager)
+        self.verbose = verbose
+
+
+def handle_request(manager: AssignmentManager, method: str, parts: List[str],
+                   params: Dict, body: Dict) -> Tuple[int, Any]:
+    """
+    Run the manager call for a request, other than /events.
+
+    The caller provides the locking: the threaded server holds the
+    manager's lock, the asyncio service runs every call on one thread.
+
+    Returns:
+        (HTTP status, JSON result)
+
+    Raises:
+        NotFound: Unknown route or assignment
+    """
+    resource = parts[0] if parts else ""
+
+    if resource == 'assignments' and len(parts) == 1:
+        if method == 'GET':
+            query = query_from_params(params)
+            return 200, [a.to_dict() for a in manager.query(query)]
+        if method == 'POST':
+            assignment = manager.add_assignment(**check_new(body))
+            return 201, assignment.to_dict()
+
+    if resource == 'assignments' and len(parts) == 2:
+        assignment_id = int(parts[1])
+        if method == 'GET':
+            assignment = manager.get_assignment(assignment_id)
+        elif method == 'PATCH':
+            assignment = manager.update_assignment(assignment_id, **check_changes(body))
+        elif method == 'DELETE':
+            if manager.get_assignment(assignment_id) is None:
+                raise NotFound(f"No assignment {assignment_id}")
+            manager.delete_assignment(assignment_id)
+            return 204, None
+        else:
+            raise NotFound(f"No route {method} /{'/'.join(parts)}")
+        if assignment is None:
+            raise NotFound(f"No assignment {assignment_id}")
+        return 200, assignment.to_dict()
+
+    if resource == 'batch' and method == 'POST':
+        return 200, run_batch(manager, body.get('operations', []))
+
+    if method == 'GET' and len(parts) == 1:
+        if resource == 'explain':
+            return 200, manager.explain(query_from_params(params))
+        if resource == 'stats':
+            return 200, manager.get_statistics(params.get('course', [None])[-1])
+        if resource == 'courses':
+            return 200, manager.get_all_courses()
+        if resource == 'export':
+            return 200, manager.export_data()
+        if resource == 'meta':
+            return 200, manager.export_meta()
+
+    if resource == 'import' and method == 'POST':
+        # like import_data(), but keeping the session to report the ids given
+        session = manager.begin_import(bool(body.get('merge')))
+        session.add(body.get('assignments', []))
+        session.commit(body.get('next_id'))
+        return 200, {'ids': [a.id for a in session.assignments], 'next_id': manager.next_id}
+
+    raise NotFound(f"No route {method} /{'/'.join(parts)}")
+
+
+def run_batch(manager: AssignmentManager, operations: List[Dict]) -> List:
+    """
+    Apply several operations in one manager batch; all or nothing.
+
+    Each operation is {"op": "add", ...fields}, {"op": "update", "ids":
+    [...], "changes": {...}} or {"op": "delete", "ids": [...]}. Their
+    results are the added assignment, the updated assignments and the
+    ids actually deleted.
+    """
+    # check every operation before the first one touches the manager
+    checked = []
+    for operation in operations:
+        op = operation['op']
+        if op == 'add':
+            checked.append((op, check_new(operation)))
+        elif op == 'update':
+            checked.append((op, (list(operation['ids']), check_changes(operation['changes']))))
+        elif op == 'delete':
+            checked.append((op, list(operation['ids'])))
+        else:
+            raise ValueError(f"Unknown batch operation {op!r}")
+
+    results = []
+    with manager.batch():
+        for op, arguments in checked:
+            if op == 'add':
+                assignment = manager.add_assignment(**arguments)
+                results.append(assignment.to_dict())
+            elif op == 'update':
+                ids, changes = arguments
+                updated = manager.update_many(ids, **changes)
+                results.append([a.to_dict() for a in updated])
+            else:
+                ids = [i for i in arguments if manager.get_assignment(i) is not None]
+                manager.delete_many(ids)
+                results.append(ids)
+    return results
+
+
+def event_window(params: Dict) -> Tuple[int, float]:
+    """The since and wait parameters of GET /events."""
+    since = int(params.get('since', ["0"])[-1])
+    wait = min(float(params.get('wait', ["0"])[-1]), MAX_EVENT_WAIT)
+    return since, wait
+
+
+def error_response(error: Exception) -> Tuple[int, Dict]:
+    """HTTP status and JSON body for an exception raised by a request."""
+    if isinstance(error, NotFound):
+        return 404, {'error': str(error)}
+    if isinstance(error, (ValueError, KeyError, TypeError, AttributeError)):
+        return 400, {'error': str(error) or type(error).__name__}
+    return 500, {'error': str(error)}
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    """Routes one HTTP request to the manager."""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "SchoolWorkBuddy/1.0"
+    timeout = KEEPALIVE_TIMEOUT
+    # headers and body go out in separate writes; without this, delayed
+    # ACKs stall every keep-alive response by about 40 ms
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    def do_PATCH(self):
+        self.dispatch('PATCH')
+
+    def do_DELETE(self):
+        self.dispatch('DELETE')
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def dispatch(self, method: str):
+        """Run a request and send back its JSON result."""
+        url = urlsplit(self.path)
+        parts = [part for part in url.path.split('/') if part]
+        try:
+            # always read the body, so the next request on the connection lines up
+            length = int(self.headers.get('Content-Length') or 0)
+            raw = self.rfile.read(length) if length else b""
+            body = json.loads(raw) if raw else {}
+            self.server.events.origin.client = self.headers.get('X-Client-Id')
+            status, result = self.route(method, parts, parse_qs(url.query), body)
+        except Exception as e:
+            status, result = error_response(e)
+            if status == 500:
+                self.log_error("%s %s failed: %r", method, self.path, e)
+        self.send_json(status, result)
+
+    def send_json(self, status: int, result):
+        """Send a JSON response with a Content-Length, keeping the connection open."""
+        data = json.dumps(result).encode('utf-8') if result is not None else b""
+        self.send_response(status)
+        if data:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def route(self, method: str, parts: List[str], params: Dict, body: Dict):
+        """Run the manager call for a request; returns (status, JSON result)."""
+        if parts == ['events'] and method == 'GET':
+            # waits without holding the manager's lock
+            latest, events = self.server.events.since(*event_window(params))
+            return 200, {'seq': latest, 'events': events}
+
+        manager = self.server.manager
+        with manager.lock:
+            return handle_request(manager, method, parts, params, body)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Serve a data file until interrupted."""
+    parser = argparse.ArgumentParser(prog="main.py serve",
+                                     description="Share assignments over HTTP.")
+    parser.add_argument('--host', default="127.0.0.1",
+                        help="address to listen on (default: %(default)s)")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                        help="port to listen on (default: %(default)s)")
+    parser.add_argument('--data', default="assignments.json", metavar='FILE',
+                        help="data file (default: assignments.json; .swb for a binary snapshot, "
+                             "a .shards directory for a file per course)")
+    parser.add_argument('-v', '--verbose', action='store_true', help="log every request")
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help="serve with asyncio: replies once writes are on disk, "
+                             "writes committed in groups (see async_service.py)")
+    parser.add_argument('--max-pending', type=int, metavar='N',
+                        help="with --async, writes that may queue before clients get "
+                             "503 (default: 1000)")
+    args = parser.parse_args(argv)
+
+    if args.use_async:
+        import asyncio
+        from async_service import MAX_PENDING, serve
+        try:
+            asyncio.run(serve(args.data, args.host, args.port, args.verbose,
+                              args.max_pending or MAX_PENDING))
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    manager = AssignmentManager(args.data, storage=WriteBehindStorage(open_storage(args.data)))
+    server = ApiServer((args.host, args.port), manager, args.verbose)
+    print(f"Serving {args.data} on http://{args.host}:{server.server_address[1]}/ "
+          f"(Ctrl+C to stop)")
+    # stop on SIGTERM too, so queued writes still reach the disk
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        manager.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,418 @@
+"""
+SQLite Assignment Manager
+
+An AssignmentManager that keeps assignments in a SQLite database instead of
+an in-memory list. Filtering and sorting are done by indexed SQL queries, so
+startup does not read the whole data set and lookups stay fast as it grows.
+
+Author: Betapandas
+Contact: Betapandas@gmail.com
+"""
+
+import sqlite3
+import threading
+from contextlib import contextmanager, nullcontext
+from datetime import date
+from typing import Dict, Iterator, List, Optional
+
+import search_index
+from assignment_model import (UPDATABLE, Assignment, AssignmentManager, ChangeEvent,
+                              ImportSession, Query)
+from instrumentation import timed
+
+
+COLUMNS = ('id', 'title', 'course', 'due_date', 'description',
+           'completed', 'grade', 'created_at')
+
+# Only well-formed YYYY-MM-DD dates can be overdue, matching days_until_due()
+VALID_DATE = "due_date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'"
+
+# Query sort key -> ORDER BY columns, matching Query.SORT_KEYS
+ORDER_BY = {
+    'due_date': ('due_date', 'id'),
+    'id': ('id',),
+    'course': ('course', 'due_date', 'id'),
+    'title': ('lower(title)', 'id'),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS assignments (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    course TEXT NOT NULL,
+    due_date TEXT NOT NULL,
+    description TEXT NOT NULL DEFAULT '',
+    completed INTEGER NOT NULL DEFAULT 0,
+    grade TEXT NOT NULL DEFAULT '',
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_assignments_course ON assignments(course, due_date);
+CREATE INDEX IF NOT EXISTS idx_assignments_due_date ON assignments(due_date);
+CREATE INDEX IF NOT EXISTS idx_assignments_completed ON assignments(completed, due_date);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def _search_matches(terms: str, title: str, course: str, description: str) -> bool:
+    """SQL function behind Query.search; terms are space separated."""
+    return search_index.matches(terms.split(), (title, course, description))
+
+
+class SqliteAssignmentManager(AssignmentManager):
+    """Manages assignments stored in a SQLite database."""
+
+    def __init__(self, db_file: str = "assignments.db"):
+        """Initialize the manager and open (or create) the database."""
+        self.data_file = db_file
+        self.lock = threading.RLock()
+        self._init_events()
+        self._in_batch = False
+        self.conn = sqlite3.connect(db_file)
+        self.conn.create_function("search_matches", 4, _search_matches, deterministic=True)
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    @property
+    def assignments(self) -> List[Assignment]:
+        """All assignments, read from the database."""
+        return self.get_all_assignments()
+
+    @property
+    def next_id(self) -> int:
+        """Next free assignment id."""
+        row = self.conn.execute(
+            "SELECT value FROM meta WHERE key = 'next_id'").fetchone()
+        return int(row[0]) if row else 1
+
+    @next_id.setter
+    def next_id(self, value: int):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('next_id', ?)",
+            (str(value),))
+
+    def _commit(self):
+        """Commit, unless a batch will commit later."""
+        if not self._in_batch:
+            self.conn.commit()
+
+    def _transaction(self):
+        """Context that commits on success, or nothing inside a batch."""
+        return nullcontext() if self._in_batch else self.conn
+
+    @contextmanager
+    def batch(self):
+        """
+        Make every change inside the block one SQLite transaction.
+
+        Events are held until the transaction commits. If the block raises,
+        the transaction is rolled back and nothing is reported.
+        """
+        with self.lock:
+            if self._in_batch:
+                yield self
+                return
+
+            self._in_batch = True
+            self._hold_depth += 1
+            held = len(self._held_events)
+            try:
+                yield self
+            except BaseException:
+                self.conn.rollback()
+                del self._held_events[held:]
+                raise
+            else:
+                self.conn.commit()
+            finally:
+                self._in_batch = False
+                self._hold_depth -= 1
+            if self._hold_depth == 0:
+                self._release_events()
+
+    @timed
+    def flush(self):
+        """Commit any pending changes."""
+        self._commit()
+
+    def close(self):
+        """Close the database connection."""
+        self.conn.close()
+
+    @timed
+    def load_assignments(self):
+        """Nothing to load; rows are read on demand."""
+        pass
+
+    def ensure_loaded(self):
+        """Nothing to load; rows are read on demand."""
+        pass
+
+    def sync(self) -> bool:
+        """Nothing to reload; every read sees what other connections committed."""
+        return False
+
+    def fetch_changes(self) -> None:
+        """Nothing to fetch; see sync()."""
+        return None
+
+    def apply_changes(self, fetched) -> bool:
+        """Refuse: fetch_changes() never returns anything to apply here."""
+        raise ValueError("SqliteAssignmentManager reads the database directly; "
+                         "there are no fetched changes to apply")
+
+    def file_watcher(self):
+        """Nothing to watch; see sync()."""
+        return None
+
+    @timed
+    def save_assignments(self):
+        """Commit any pending changes."""
+        self._commit()
+
+    def _select(self, where: str = "", params=(), order: str = "") -> List[Assignment]:
+        """Run a SELECT over the assignments table and build objects."""
+        sql = f"SELECT {', '.join(COLUMNS)} FROM assignments"
+        if where:
+            sql += f" WHERE {where}"
+        if order:
+            sql += f" ORDER BY {order}"
+        return [self._row_to_assignment(row) for row in self.conn.execute(sql, params)]
+
+    def _row_to_assignment(self, row) -> Assignment:
+        """Build an Assignment from a database row."""
+        data = dict(zip(COLUMNS, row))
+        data['completed'] = bool(data['completed'])
+        assignment = Assignment.from_dict(data)
+        assignment.created_at = data['created_at']
+        return assignment
+
+    def _insert(self, assignment: Assignment):
+        """Insert one assignment row."""
+        data = assignment.to_dict()
+        data['completed'] = int(data['completed'])
+        self.conn.execute(
+            f"INSERT OR REPLACE INTO assignments ({', '.join(COLUMNS)}) "
+            f"VALUES ({', '.join('?' for _ in COLUMNS)})",
+            [data[c] for c in COLUMNS])
+
+    def get_assignment(self, assignment_id: int) -> Optional[Assignment]:
+        """Get a single assignment by id."""
+        rows = self._select("id = ?", (assignment_id,))
+        return rows[0] if rows else None
+
+    @timed
+    def add_assignment(self, title: str, course: str, due_date: str,
+                       description: str = "") -> Assignment:
+        """Add a new assignment."""
+        assignment = Assignment(
+            title=title,
+            course=course,
+            due_date=due_date,
+            description=description,
+            assignment_id=self.next_id
+        )
+        self._insert(assignment)
+        self.next_id = assignment.id + 1
+        self._commit()
+        self._emit(ChangeEvent.ADDED, [assignment.id])
+        return assignment
+
+    @timed
+    def update_assignment(self, assignment_id: int, **kwargs):
+        """Update an existing assignment."""
+        assignment = self.get_assignment(assignment_id)
+        if assignment is None:
+            return None
+
+        # compare with the stored row: UPDATE counts matched rows, not changed ones
+        changed = {key: value for key, value in kwargs.items()
+                   if key in UPDATABLE and getattr(assignment, key) != value}
+        if not changed:
+            return assignment
+
+        for key, value in changed.items():
+            setattr(assignment, key, value)
+        if 'completed' in changed:
+            changed['completed'] = int(bool(changed['completed']))
+        assignments = ', '.join(f"{k} = ?" for k in changed)
+        self.conn.execute(f"UPDATE assignments SET {assignments} WHERE id = ?",
+                          list(changed.values()) + [assignment_id])
+        self._commit()
+        self._emit(ChangeEvent.UPDATED, [assignment_id], changed)
+        return assignment
+
+    @timed
+    def delete_assignment(self, assignment_id: int):
+        """Delete an assignment."""
+        cursor = self.conn.execute("DELETE FROM assignments WHERE id = ?", (assignment_id,))
+        self._commit()
+        if cursor.rowcount:
+            self._emit(ChangeEvent.DELETED, [assignment_id])
+
+    @timed
+    def get_all_assignments(self) -> List[Assignment]:
+        """Get all assignments."""
+        return self._select(order="id")
+
+    @timed
+    def get_pending_assignments(self) -> List[Assignment]:
+        """Get all incomplete assignments."""
+        return self._select("completed = 0", order="due_date, id")
+
+    @timed
+    def get_completed_assignments(self) -> List[Assignment]:
+        """Get all completed assignments."""
+        return self._select("completed = 1", order="due_date, id")
+
+    @timed
+    def get_overdue_assignments(self, today: Optional[date] = None) -> List[Assignment]:
+        """Get all overdue assignments."""
+        today = today or date.today()
+        return self._select(f"completed = 0 AND due_date < ? AND {VALID_DATE}",
+                            (today.isoformat(),), order="due_date, id")
+
+    @timed
+    def get_assignments_due_between(self, start: date, end: date) -> List[Assignment]:
+        """Get assignments due from start to end (inclusive), sorted by due date."""
+        return self._select(f"due_date BETWEEN ? AND ? AND {VALID_DATE}",
+                            (start.isoformat(), end.isoformat()), order="due_date, id")
+
+    @timed
+    def sort_by_due_date(self, assignments: List[Assignment] = None) -> List[Assignment]:
+        """Sort assignments by due date."""
+        if assignments is None:
+            return self._select(order="due_date, id")
+        return super().sort_by_due_date(assignments)
+
+    def _query_sql(self, query: Query):
+        """Translate a Query into (WHERE clause, parameters, ORDER BY ... LIMIT)."""
+        where, params = [], []
+        if query.ids is not None:
+            where.append(f"id IN ({', '.join('?' for _ in query.ids)})")
+            params += sorted(query.ids)
+        if query.courses is not None:
+            where.append(f"course IN ({', '.join('?' for _ in query.courses)})")
+            params += sorted(query.courses)
+        if query.completed is not None:
+            where.append("completed = ?")
+            params.append(int(query.completed))
+        if query.overdue is not None:
+            overdue = f"(completed = 0 AND due_date < ? AND {VALID_DATE})"
+            where.append(overdue if query.overdue else f"NOT {overdue}")
+            params.append(query.today.isoformat())
+        if query.due_after is not None:
+            where.append(f"due_date >= ? AND {VALID_DATE}")
+            params.append(query.due_after.isoformat())
+        if query.due_before is not None:
+            where.append(f"due_date <= ? AND {VALID_DATE}")
+            params.append(query.due_before.isoformat())
+        if query.graded is not None:
+            where.append("TRIM(grade) <> ''" if query.graded else "TRIM(grade) = ''")
+        if query.text is not None:
+            # lower() only folds ASCII letters in SQLite
+            where.append("instr(lower(title), ?) > 0")
+            params.append(query.text)
+        if query.search is not None:
+            # checked row by row in Python, so it matches the in-memory index
+            where.append("search_matches(?, title, course, description)")
+            params.append(" ".join(query.search))
+
+        direction = " DESC" if query.reverse else ""
+        order = ", ".join(column + direction for column in ORDER_BY[query.sort or 'id'])
+        order += f" LIMIT {-1 if query.limit is None else int(query.limit)}"
+        order += f" OFFSET {int(query.offset)}"
+        return " AND ".join(where), params, order
+
+    @timed
+    def query(self, query: Query) -> Iterator[Assignment]:
+        """Find the assignments matching a query with a single SELECT."""
+        where, params, order = self._query_sql(query)
+        return iter(self._select(where, params, order))
+
+    def explain(self, query: Query) -> Dict:
+        """Describe how query() would run, from SQLite's query plan."""
+        where, params, order = self._query_sql(query)
+        sql = f"SELECT id FROM assignments {'WHERE ' + where if where else ''} ORDER BY {order}"
+        rows = self.conn.execute("EXPLAIN QUERY PLAN " + sql, params)
+        return {'index': "; ".join(row[-1] for row in rows)}
+
+    @timed
+    def get_statistics(self, course: Optional[str] = None) -> Dict[str, int]:
+        """Get assignment counts, for one course or all."""
+        where = "WHERE course = ?" if course is not None else ""
+        params = [date.today().isoformat()] + ([course] if course is not None else [])
+        total, completed, overdue, graded = self.conn.execute(
+            "SELECT COUNT(*), TOTAL(completed), "
+            f"TOTAL(completed = 0 AND due_date < ? AND {VALID_DATE}), "
+            f"TOTAL(TRIM(grade) <> '') FROM assignments {where}", params).fetchone()
+        return {
+            'total': total,
+            'pending': total - int(completed),
+            'completed': int(completed),
+            'overdue': int(overdue),
+            'graded': int(graded)
+        }
+
+    def get_all_courses(self) -> List[str]:
+        """Get list of all unique course names."""
+        rows = self.conn.execute(
+            "SELECT DISTINCT course FROM assignments ORDER BY course")
+        return [row[0] for row in rows]
+
+    @timed
+    def get_assignments_by_course(self, course: str) -> List[Assignment]:
+        """Get all assignments for a specific course."""
+        return self._select("course = ?", (course,), order="due_date, id")
+
+    def export_data(self) -> Dict:
+        """Export all data as a dictionary for backup/transfer."""
+        data = {'assignments': [a.to_dict() for a in self.get_all_assignments()]}
+        data.update(self.export_meta())
+        return data
+
+    def iter_records(self, chunk_size: int = 1000,
+                     query: Optional[Query] = None) -> Iterator[Dict]:
+        """
+        Yield every assignment as a dictionary, in id order.
+
+        Rows are fetched a page at a time by id, so memory use stays flat;
+        with a query, its matches are yielded in its order instead. Like
+        every method here it must run on the connection's thread.
+        """
+        if query is not None:
+            for assignment in self.query(query):
+                yield assignment.to_dict()
+            return
+        last_id = 0
+        while True:
+            page = self._select("id > ?", (last_id,), order=f"id LIMIT {int(chunk_size)}")
+            if not page:
+                return
+            for assignment in page:
+                yield assignment.to_dict()
+            last_id = page[-1].id
+
+    @timed
+    def _commit_import(self, session: ImportSession, next_id: Optional[int]):
+        """Write a finished ImportSession in one transaction."""
+        imported_assignments = session.assignments
+
+        with self._transaction():
+            if session.merge:
+                next_id = self.next_id
+                # Reassign IDs to avoid conflicts
+                for assignment in imported_assignments:
+                    assignment.id = next_id
+                    next_id += 1
+            else:
+                self.conn.execute("DELETE FROM assignments")
+                highest = max((a.id or 0 for a in imported_assignments), default=0)
+                next_id = max(next_id or len(imported_assignments) + 1, highest + 1)
+
+            for assignment in imported_assignments:
+                self._insert(assignment)
+            self.next_id = next_id
+        self._emit(ChangeEvent.IMPORTED, [a.id for a in imported_assignments])
@@ -0,0 +1,1166 @@
+"""
+Storage Backends
+
+Persistence layer used by AssignmentManager. A backend loads the saved
+records and writes changes back to disk. JsonStorage keeps the original
+single-file format; JournalStorage appends each change to a JSON-lines
+journal and periodically compacts it into a snapshot. ShardedStorage
+keeps one file per course and rewrites only the courses that changed.
+WriteBehindStorage wraps any of them and does the writing on a
+background thread.
+RecordReader and RecordWriter stream records in and out of import/export
+files, optionally compressed.
+
+Whole-file writes go to a temporary file that is fsynced and then renamed
+over the original, so a crash never leaves a half-written data file.
+
+Several processes can share one data file. Reads and writes take an
+advisory lock on "<path>.lock" for just as long as they touch the file,
+and that file also holds the next free id, so processes never hand out
+the same one, and a count of writes, so each can tell whether anyone
+else has written since it last looked. The JSON file carries the count
+as its revision. A write to a file that another process changed since it was
+loaded does not overwrite it: the new change entries are replayed on top
+of what is there instead, and outdated() reports that the caller should
+reload.
+
+Author: Betapandas
+Contact: Betapandas@gmail.com
+"""
+
+import bz2
+import codecs
+import gzip
+import hashlib
+import json
+import lzma
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from instrumentation import timed
+
+
+try:
+    from compression import zstd  # Python 3.14+
+except ImportError:
+    zstd = None
+
+try:
+    import fcntl
+except ImportError:
+    # no advisory locks on Windows; one process per data file there
+    fcntl = None
+
+
+# Callable returning the full current state as (records, next_id)
+Snapshot = Callable[[], Tuple[List[Dict], int]]
+
+# the file in a ShardedStorage directory listing its shards
+MANIFEST = "manifest.json"
+
+# file extension -> module whose open() handles that compression
+COMPRESSORS = {'.gz': gzip, '.bz2': bz2, '.xz': lzma}
+if zstd is not None:
+    COMPRESSORS['.zst'] = zstd
+
+
+def split_compression(path: str) -> Tuple[str, Optional[str]]:
+    """Split a path into (path without compression suffix, suffix or None)."""
+    base, ext = os.path.splitext(path)
+    if ext.lower() in ('.gz', '.bz2', '.xz', '.zst'):
+        return base, ext.lower()
+    return path, None
+
+
+def wrap_compressed(raw, path: str, mode: str):
+    """Wrap an open binary file in the decompressor/compressor its name calls for."""
+    ext = split_compression(path)[1]
+    if ext is None:
+        return raw
+    if ext not in COMPRESSORS:
+        raise ValueError(f"{ext} files need Python 3.14 or newer")
+    return COMPRESSORS[ext].open(raw, mode)
+
+
+@contextmanager
+def file_lock(path: str) -> Iterator[IO]:
+    """
+    Hold the exclusive advisory lock of a data file while the block runs.
+
+    Yields the open lock file ("<path>.lock"), which also stores the next
+    free id and a count of writes; see read_lock_state(). The lock is not
+    reentrant, so never nest two of these for the same path.
+    """
+    fd = os.open(path + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+    with os.fdopen(fd, 'r+', encoding='utf-8') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield f
+        finally:
+            # anything written must reach the file before the lock is let go
+            f.flush()
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def read_lock_state(lock: IO) -> Tuple[int, int]:
+    """The next free id and the write counter kept in an open lock file."""
+    lock.seek(0)
+    values = lock.read().split()
+    try:
+        return int(values[0]), int(values[1])
+    except (IndexError, ValueError):
+        return 1, 0
+
+
+def write_lock_state(lock: IO, next_id: int, revision: int):
+    """Store the next free id and the write counter in an open lock file."""
+    lock.seek(0)
+    lock.truncate()
+    lock.write(f"{next_id} {revision}\n")
+
+
+def file_stamp(path: str) -> Optional[Tuple[int, int, int]]:
+    """Cheap check for changes: (inode, size, mtime) of a file, or None if missing."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+
+def replay_entry(entry: Dict, by_id: Dict, next_id: int) -> int:
+    """
+    Apply one change entry to records keyed by id, returning next_id.
+
+    An update that names its fields only overwrites those, so changes to
+    other fields of the same record made elsewhere survive; an update to
+    a record that has been deleted elsewhere brings it back.
+    """
+    op = entry.get('op')
+    if op in ('add', 'update'):
+        record = entry['record']
+        current = by_id.get(record.get('id'))
+        fields = entry.get('fields')
+        if current is not None and fields is not None:
+            by_id[record.get('id')] = dict(current, **{f: record[f] for f in fields})
+        else:
+            by_id[record.get('id')] = record
+    elif op == 'delete':
+        by_id.pop(entry.get('id'), None)
+    return max(next_id, entry.get('next_id', next_id))
+
+
+def read_json_state(path: str) -> Tuple[List[Dict], int, int]:
+    """Read records, next_id and revision from a JSON data file."""
+    if not os.path.exists(path):
+        return [], 1, 0
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data['assignments'], data.get('next_id', 1), data.get('revision', 0)
+    except (json.JSONDecodeError, KeyError):
+        return [], 1, 0
+
+
+def read_json_file(path: str) -> Tuple[List[Dict], int]:
+    """Read records and next_id from a JSON data file."""
+    return read_json_state(path)[:2]
+
+
+def write_json_file(path: str, records: List[Dict], next_id: int,
+                    revision: Optional[int] = None):
+    """Atomically write records, next_id and (optionally) the revision to a JSON data file."""
+    data = {
+        'assignments': records,
+        'next_id': next_id
+    }
+    if revision is not None:
+        data['revision'] = revision
+    write_text_file(path, json.dumps(data, indent=2))
+
+
+def write_text_file(path: str, text: str):
+    """Atomically replace a file's contents: write a temporary file, fsync, rename."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def shard_name(course: str, taken: Iterable[str]) -> str:
+    """A file name for a course's shard that is not among taken."""
+    taken = set(taken)
+    stem = re.sub(r"[^0-9a-z]+", "-", course.lower()).strip("-") or "course"
+    name, n = f"{stem}.json", 2
+    while name in taken or name == MANIFEST:
+        name, n = f"{stem}-{n}.json", n + 1
+    return name
+
+
+def shard_hash(text: str) -> str:
+    """Fingerprint of a shard's contents."""
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class JsonStorage:
+    """
+    Stores everything in one JSON file, rewritten on every change.
+
+    Safe to share between processes: see the module docstring.
+    """
+
+    def __init__(self, path: str = "assignments.json"):
+        """Initialize the storage with the path of the data file."""
+        self.path = path
+        # write counter as of our last read or write of the file
+        self.revision = 0
+        # file_stamp() after our last read or write, to spot edits made
+        # without the lock (e.g. in a text editor)
+        self._stamp = None
+        # the file holds changes from elsewhere that were merged but not loaded
+        self._behind = False
+        # what is read now reaches memory later (see begin_catch_up())
+        self._catching_up = False
+
+    def _stale(self, lock: IO) -> bool:
+        """Whether the file may differ from what we last saw; call with the lock held."""
+        return (self._behind or read_lock_state(lock)[1] != self.revision
+                or file_stamp(self.path) != self._stamp)
+
+    def _loaded(self, lock: IO, revision: int):
+        """Note the revision of what was just read; call with the lock held."""
+        next_id, stored = read_lock_state(lock)
+        self.revision = max(revision, stored)
+        if stored < self.revision:
+            # the lock file was lost; start counting from the data file's revision
+            write_lock_state(lock, next_id, self.revision)
+        self._behind = self._catching_up
+
+    def _bump(self, lock: IO, next_id: int = 1) -> int:
+        """Count one more write in the lock file and return it; call with the lock held."""
+        stored_next_id, stored = read_lock_state(lock)
+        self.revision = max(self.revision, stored) + 1
+        write_lock_state(lock, max(stored_next_id, next_id), self.revision)
+        return self.revision
+
+    def outdated(self) -> bool:
+        """Whether another process changed the file since it was loaded here."""
+        with file_lock(self.path) as lock:
+            return self._stale(lock)
+
+    def watch_paths(self) -> List[str]:
+        """Files whose changes make outdated() worth asking (see file_watcher)."""
+        return [self.path]
+
+    def begin_catch_up(self):
+        """
+        Note that what load() or read_new_entries() return next reaches
+        memory only later, e.g. read on a worker thread and applied on
+        another. Until end_catch_up() the file counts as changed, so writes
+        replay onto it instead of replacing it with a snapshot that lacks
+        what was read.
+        """
+        self._catching_up = True
+
+    def end_catch_up(self, applied: bool):
+        """
+        End begin_catch_up().
+
+        Args:
+            applied: Whether what was read is now in memory; if not, the
+                file stays outdated until the next load()
+        """
+        self._catching_up = False
+        if applied:
+            self._behind = False
+
+    def read_new_entries(self) -> Optional[List[Dict]]:
+        """
+        Change entries other processes wrote since we last read the file.
+
+        A plain JSON file has no such entries, so this always returns None:
+        the whole file has to be loaded again.
+        """
+        return None
+
+    def load_index(self) -> Optional[Tuple[List[str], int]]:
+        """
+        Course names and next_id without the records, for loading a course
+        at a time with load_course(). None here: one file holds everything,
+        so load() it.
+        """
+        return None
+
+    def reserve_ids(self, next_id: int, count: int = 1) -> int:
+        """
+        Claim count new ids that no other process sharing the file will use.
+
+        Args:
+            next_id: This process's idea of the next free id
+
+        Returns:
+            The first claimed id (at least next_id)
+        """
+        with file_lock(self.path) as lock:
+            stored_next_id, revision = read_lock_state(lock)
+            first = max(next_id, stored_next_id)
+            write_lock_state(lock, first + count, revision)
+        return first
+
+    @timed
+    def load(self) -> Tuple[List[Dict], int]:
+        """Load all records and the next free id."""
+        with file_lock(self.path) as lock:
+            records, next_id, revision = read_json_state(self.path)
+            self._stamp = file_stamp(self.path)
+            self._loaded(lock, revision)
+        return records, next_id
+
+    @timed
+    def save(self, records: List[Dict], next_id: int):
+        """Write the full state to disk, replacing whatever is there."""
+        with file_lock(self.path) as lock:
+            self._write(lock, records, next_id)
+        self._behind = False
+
+    def _write(self, lock: IO, records: List[Dict], next_id: int):
+        """Write the file; call with the lock held."""
+        write_json_file(self.path, records, next_id, self._bump(lock, next_id))
+        self._stamp = file_stamp(self.path)
+
+    def append(self, entry: Dict, snapshot: Snapshot):
+        """Persist a single change entry."""
+        self.append_many([entry], snapshot)
+
+    @timed
+    def append_many(self, entries: Iterable[Dict], snapshot: Snapshot):
+        """
+        Persist several change entries at once.
+
+        Normally the full snapshot is written. If another process changed
+        the file in the meantime, the entries are replayed on top of its
+        contents instead, and outdated() stays true until the next load().
+
+        The snapshot is taken before the lock: it takes the manager's lock,
+        and a thread holding that may be waiting for ours (reserve_ids()).
+        """
+        records, next_id = snapshot()
+        with file_lock(self.path) as lock:
+            if self._stale(lock):
+                records, next_id, _ = read_json_state(self.path)
+                by_id = {r.get('id'): r for r in records}
+                for entry in entries:
+                    next_id = replay_entry(entry, by_id, next_id)
+                self._write(lock, list(by_id.values()), next_id)
+                self._behind = True
+            else:
+                self._write(lock, records, next_id)
+
+    def flush(self):
+        """Make sure every change handed to the backend is on disk."""
+        pass
+
+    def close(self):
+        """Release any resources held by the backend."""
+        pass
+
+
+class JournalStorage(JsonStorage):
+    """
+    Snapshot file plus an append-only JSON-lines journal.
+
+    Each change is written as one line to ``<path>.journal``, so a single
+    edit costs one small append instead of a full rewrite. Loading reads
+    the snapshot and replays the journal on top of it. Once the journal
+    holds ``compact_every`` entries it is folded into a fresh snapshot.
+    Processes sharing the files append to the same journal, and a
+    compaction folds in their entries too.
+
+    Journal entries look like:
+        {"op": "add", "record": {...}, "next_id": 5}
+        {"op": "update", "record": {...}, "fields": ["grade"]}
+        {"op": "delete", "id": 3}
+    """
+
+    def __init__(self, path: str = "assignments.json", compact_every: int = 1000):
+        """
+        Initialize the journal storage.
+
+        Args:
+            path: Snapshot file, in the same format JsonStorage uses
+            compact_every: Journal length that triggers a compaction
+        """
+        super().__init__(path)
+        self.journal_path = path + ".journal"
+        self.compact_every = compact_every
+        self.journal_length = 0
+        self._journal_stamp = None
+        # bytes of the journal that our in-memory state includes, or None
+        # if that is unknown and only a full load() will catch up
+        self._journal_offset: Optional[int] = 0
+
+    def _stale(self, lock: IO) -> bool:
+        return (super()._stale(lock)
+                or file_stamp(self.journal_path) != self._journal_stamp)
+
+    def _seen(self):
+        """Remember both files as they are now; call with the lock held."""
+        self._stamp = file_stamp(self.path)
+        self._journal_stamp = file_stamp(self.journal_path)
+
+    def watch_paths(self) -> List[str]:
+        """Files whose changes make outdated() worth asking (see file_watcher)."""
+        return [self.path, self.journal_path]
+
+    def end_catch_up(self, applied: bool):
+        super().end_catch_up(applied)
+        if not applied:
+            # the entries read meanwhile never reached memory
+            self._journal_offset = None
+
+    def read_new_entries(self) -> Optional[List[Dict]]:
+        """
+        Change entries other processes appended since we last read the files.
+
+        Only the journal's new tail is read, so catching up with a few
+        changes costs a few lines however large the snapshot is. Returns
+        None if the snapshot was rewritten meanwhile (e.g. by a compaction
+        elsewhere); then the whole state has to be loaded again.
+        """
+        with file_lock(self.path) as lock:
+            offset = self._journal_offset
+            if offset is None or file_stamp(self.path) != self._stamp:
+                return None
+            stamp = file_stamp(self.journal_path)
+            if stamp is None or self._journal_stamp is None or stamp[0] != self._journal_stamp[0]:
+                # the journal is new, gone or a different file
+                if offset:
+                    return None
+                if stamp is None:
+                    self._loaded(lock, self.revision)
+                    return []
+            elif stamp[1] < offset:
+                return None
+
+            entries = []
+            with open(self.journal_path, 'rb') as f:
+                f.seek(offset)
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        break
+                    offset += len(line)
+            self.journal_length += len(entries)
+            self._journal_offset = offset
+            self._seen()
+            self._loaded(lock, self.revision)
+        return entries
+
+    @timed
+    def load(self) -> Tuple[List[Dict], int]:
+        """Load the snapshot and replay the journal tail."""
+        with file_lock(self.path) as lock:
+            return self._read(lock)
+
+    def _read(self, lock: IO) -> Tuple[List[Dict], int]:
+        """Read the snapshot and replay the journal; call with the lock held."""
+        records, next_id, revision = read_json_state(self.path)
+        by_id = {r.get('id'): r for r in records}
+        self.journal_length = 0
+
+        offset = 0
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, 'rb') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # a crash mid-append can leave a partial last line
+                        break
+                    next_id = self._replay(entry, by_id, next_id)
+                    self.journal_length += 1
+                    offset += len(line)
+
+        self._journal_offset = offset
+        self._seen()
+        self._loaded(lock, revision)
+        return list(by_id.values()), next_id
+
+    def _replay(self, entry: Dict, by_id: Dict, next_id: int) -> int:
+        """Apply one journal entry to the records, returning next_id."""
+        return replay_entry(entry, by_id, next_id)
+
+    @timed
+    def save(self, records: List[Dict], next_id: int):
+        """Write a fresh snapshot and empty the journal."""
+        with file_lock(self.path) as lock:
+            self._save(lock, records, next_id)
+        self._behind = False
+
+    def _save(self, lock: IO, records: List[Dict], next_id: int):
+        """Write a snapshot and drop the journal; call with the lock held."""
+        self._write(lock, records, next_id)
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self.journal_length = 0
+        self._journal_offset = 0
+        self._seen()
+
+    @timed
+    def append_many(self, entries: Iterable[Dict], snapshot: Snapshot):
+        """Append change entries to the journal, compacting when it gets long."""
+        lines = [json.dumps(entry) + "\n" for entry in entries]
+        # taken before the lock, as in JsonStorage.append_many()
+        state = snapshot() if self.journal_length + len(lines) >= self.compact_every else None
+        with file_lock(self.path) as lock:
+            stale = self._stale(lock)
+            with open(self.journal_path, 'a', encoding='utf-8') as f:
+                f.writelines(lines)
+                f.flush()
+                os.fsync(f.fileno())
+            self.journal_length += len(lines)
+            self._journal_stamp = file_stamp(self.journal_path)
+            if stale:
+                # read_new_entries() picks up the lines before ours, and ours again
+                self._behind = True
+            elif self._journal_offset is not None:
+                self._journal_offset = self._journal_stamp[1]
+            self._bump(lock)
+
+            if state is not None and self.journal_length >= self.compact_every:
+                self._compact(lock, state)
+
+    @timed
+    def compact(self, snapshot: Snapshot):
+        """Fold the journal into the snapshot file."""
+        state = snapshot()
+        with file_lock(self.path) as lock:
+            self._compact(lock, state)
+
+    def _compact(self, lock: IO, state: Tuple[List[Dict], int]):
+        """Fold the journal in, given our (records, next_id); call with the lock held."""
+        if self._stale(lock):
+            # other processes have written too, so fold in the files, not our state
+            self._save(lock, *self._read(lock))
+            self._journal_offset = None
+            self._behind = True
+        else:
+            self._save(lock, *state)
+
+
+class ShardedStorage(JsonStorage):
+    """
+    One JSON file per course in a directory, plus a small manifest.
+
+    The manifest ("manifest.json") holds next_id and the file of each
+    course. A change rewrites only the shards of the courses it touches,
+    and the manifest only when next_id or the list of courses changes, so
+    editing one course's homework leaves every other course's file alone.
+    load_index() and load_course() let a manager read the manifest first
+    and each course's shard when it is needed. Sharing the directory
+    between processes works as for JsonStorage.
+
+    Shard files look like:
+        {"course": "CS 101", "assignments": [{...}, ...]}
+    """
+
+    def __init__(self, directory: str = "assignments.shards"):
+        """Initialize the storage with the directory holding the shards."""
+        os.makedirs(directory, exist_ok=True)
+        super().__init__(os.path.join(directory, MANIFEST))
+        self.directory = directory
+        # course -> shard file name, as listed in the manifest
+        self.shards: Dict[str, str] = {}
+        self.next_id = 1
+        # assignment id -> course, to find the shard an update or delete touches
+        self._course_of: Dict[int, str] = {}
+        # shard file name -> hash of its contents, so save() skips unchanged shards
+        self._hashes: Dict[str, str] = {}
+
+    def _read_manifest(self) -> int:
+        """Read the manifest, returning its revision; call with the lock held."""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.shards = dict(data['courses'])
+            self.next_id = data.get('next_id', 1)
+            revision = data.get('revision', 0)
+        except FileNotFoundError:
+            self.shards, self.next_id, revision = {}, 1, 0
+        self._stamp = file_stamp(self.path)
+        return revision
+
+    def _read_shard(self, course: str) -> List[Dict]:
+        """Read one course's records; call with the lock held."""
+        name = self.shards.get(course)
+        if name is None:
+            return []
+        try:
+            with open(os.path.join(self.directory, name), 'r', encoding='utf-8') as f:
+                text = f.read()
+        except FileNotFoundError:
+            return []
+        self._hashes[name] = shard_hash(text)
+        records = json.loads(text)['assignments']
+        for record in records:
+            self._course_of[record.get('id')] = course
+        return records
+
+    def _write_shard(self, course: str, records: List[Dict]):
+        """Write one course's records, dropping its file once empty; call with the lock held."""
+        name = self.shards.get(course)
+        if not records:
+            if name is not None:
+                del self.shards[course]
+                self._hashes.pop(name, None)
+                path = os.path.join(self.directory, name)
+                if os.path.exists(path):
+                    os.remove(path)
+            return
+        if name is None:
+            name = self.shards[course] = shard_name(course, set(self.shards.values()))
+        text = json.dumps({'course': course, 'assignments': records}, indent=2)
+        digest = shard_hash(text)
+        if self._hashes.get(name) != digest:
+            write_text_file(os.path.join(self.directory, name), text)
+            self._hashes[name] = digest
+
+    def _write_manifest(self, lock: IO, next_id: int, shards: Dict[str, str]):
+        """Count the write, rewriting the manifest if it changed; call with the lock held."""
+        revision = self._bump(lock, next_id)
+        if next_id != self.next_id or shards != self.shards or self._stamp is None:
+            self.next_id = next_id
+            write_text_file(self.path, json.dumps(
+                {'courses': self.shards, 'next_id': next_id, 'revision': revision}, indent=2))
+            self._stamp = file_stamp(self.path)
+
+    def _map_courses(self):
+        """Re-read which course every id belongs to; call with the lock held."""
+        self._read_manifest()
+        self._course_of = {}
+        for course in self.shards:
+            self._read_shard(course)
+
+    def watch_paths(self) -> List[str]:
+        """Files whose changes make outdated() worth asking (see file_watcher)."""
+        # every write counts itself in the lock file, whichever shard it touched
+        return [self.path, self.path + ".lock"]
+
+    def courses(self) -> List[str]:
+        """Courses that have a shard, as of the last read or write."""
+        return list(self.shards)
+
+    @timed
+    def load_index(self) -> Optional[Tuple[List[str], int]]:
+        """Read just the manifest, returning the course names and next_id."""
+        with file_lock(self.path) as lock:
+            self._loaded(lock, self._read_manifest())
+            self._course_of = {}
+        return list(self.shards), self.next_id
+
+    @timed
+    def load_course(self, course: str) -> List[Dict]:
+        """Read one course's records (after load_index())."""
+        with file_lock(self.path):
+            return self._read_shard(course)
+
+    @timed
+    def load(self) -> Tuple[List[Dict], int]:
+        """Load every shard."""
+        with file_lock(self.path) as lock:
+            self._loaded(lock, self._read_manifest())
+            self._course_of = {}
+            records = []
+            for course in self.shards:
+                records += self._read_shard(course)
+        return records, self.next_id
+
+    @timed
+    def save(self, records: List[Dict], next_id: int):
+        """Write the full state, rewriting only the shards that differ from it."""
+        by_course: Dict[str, List[Dict]] = {}
+        for record in records:
+            by_course.setdefault(record.get('course'), []).append(record)
+        with file_lock(self.path) as lock:
+            if self._stale(lock):
+                # the files may not be what we last wrote, so write them all
+                self._read_manifest()
+                self._hashes = {}
+            shards = dict(self.shards)
+            for course in list(self.shards):
+                if course not in by_course:
+                    self._write_shard(course, [])
+            for course, course_records in by_course.items():
+                self._write_shard(course, course_records)
+            self._course_of = {r.get('id'): r.get('course') for r in records}
+            self._write_manifest(lock, next_id, shards)
+        self._behind = False
+
+    @timed
+    def append_many(self, entries: Iterable[Dict], snapshot: Snapshot):
+        """
+        Persist several change entries, rewriting only the shards they touch.
+
+        Each touched shard is read back and the entries are replayed onto
+        it, so changes other processes made to the same course survive.
+        """
+        with file_lock(self.path) as lock:
+            if self._stale(lock):
+                if read_lock_state(lock)[1] != self.revision:
+                    self._map_courses()
+                self._behind = True
+            # course -> its shard's records by id, read as entries touch it
+            touched: Dict[str, Dict] = {}
+
+            def shard(course):
+                if course not in touched:
+                    touched[course] = {r.get('id'): r for r in self._read_shard(course)}
+                return touched[course]
+
+            shards = dict(self.shards)
+            next_id = self.next_id
+            for entry in entries:
+                next_id = max(next_id, entry.get('next_id', next_id))
+                if entry.get('op') == 'delete':
+                    course = self._course_of.pop(entry.get('id'), None)
+                    if course is not None:
+                        shard(course).pop(entry.get('id'), None)
+                    continue
+                record = entry['record']
+                assignment_id = record.get('id')
+                current = self._course_of.get(assignment_id)
+                fields = entry.get('fields')
+                # an update that leaves the course alone goes wherever the
+                # record is now, even if another process has moved it
+                if current is None or fields is None or 'course' in fields:
+                    course = record.get('course')
+                else:
+                    course = current
+                by_id = shard(course)
+                if current is not None and current != course:
+                    moved = shard(current).pop(assignment_id, None)
+                    if moved is not None:
+                        by_id[assignment_id] = moved
+                replay_entry(entry, by_id, next_id)
+                self._course_of[assignment_id] = course
+
+            for course, by_id in touched.items():
+                self._write_shard(course, list(by_id.values()))
+            self._write_manifest(lock, next_id, shards)
+
+
+class WriteBehindStorage:
+    """
+    Wraps another backend and writes to it from a background thread.
+
+    Changes are queued and the caller returns at once. The worker waits
+    ``delay`` seconds after the first queued change so a burst of edits is
+    written together, then hands them all to the wrapped backend in one
+    call. Call flush() (or close()) before exiting to write anything left.
+
+    The snapshot callable is invoked on the worker thread, so it must be
+    safe to call from there (AssignmentManager takes its lock). Do not call
+    flush() while holding that lock.
+    """
+
+    def __init__(self, inner: JsonStorage, delay: float = 0.5):
+        """
+        Start the background writer.
+
+        Args:
+            inner: Backend that does the actual writing
+            delay: Seconds to wait for more changes before writing
+        """
+        self.inner = inner
+        self.delay = delay
+        self.error: Optional[Exception] = None
+
+        self._pending: List[Dict] = []
+        self._full: Optional[Tuple[List[Dict], int]] = None
+        self._snapshot: Optional[Snapshot] = None
+        self._closed = False
+        self._changed = threading.Condition()
+        # held while writing so flush() and the worker never write at once
+        self._write_lock = threading.Lock()
+
+        self._thread = threading.Thread(target=self._run, name="WriteBehindStorage",
+                                        daemon=True)
+        self._thread.start()
+
+    @property
+    def path(self) -> str:
+        """Data file of the wrapped backend."""
+        return self.inner.path
+
+    def load(self) -> Tuple[List[Dict], int]:
+        """Load through the wrapped backend."""
+        self.flush()
+        return self.inner.load()
+
+    def reserve_ids(self, next_id: int, count: int = 1) -> int:
+        """Claim new ids through the wrapped backend, right away."""
+        return self.inner.reserve_ids(next_id, count)
+
+    def load_index(self) -> Optional[Tuple[List[str], int]]:
+        """Course names and next_id, if the wrapped backend loads a course at a time."""
+        load_index = getattr(self.inner, 'load_index', None)
+        if load_index is None:
+            return None
+        self.flush()
+        return load_index()
+
+    def load_course(self, course: str) -> List[Dict]:
+        """Read one course's records from the wrapped backend."""
+        with self._write_lock:
+            return self.inner.load_course(course)
+
+    def watch_paths(self) -> List[str]:
+        """Files of the wrapped backend worth watching."""
+        return self.inner.watch_paths()
+
+    def begin_catch_up(self):
+        """See JsonStorage.begin_catch_up()."""
+        self.inner.begin_catch_up()
+
+    def end_catch_up(self, applied: bool):
+        """See JsonStorage.end_catch_up()."""
+        self.inner.end_catch_up(applied)
+
+    def read_new_entries(self) -> Optional[List[Dict]]:
+        """Entries written elsewhere, from the wrapped backend; call after outdated()."""
+        with self._write_lock:
+            return self.inner.read_new_entries()
+
+    def outdated(self) -> bool:
+        """
+        Whether the wrapped backend's file changed elsewhere and can be
+        reloaded now, i.e. no change of ours is waiting to be written.
+        """
+        with self._changed:
+            if self._dirty():
+                return False
+        if not self._write_lock.acquire(blocking=False):
+            return False
+        try:
+            return self.inner.outdated()
+        finally:
+            self._write_lock.release()
+
+    @timed
+    def save(self, records: List[Dict], next_id: int):
+        """Queue a full rewrite, replacing any queued changes."""
+        with self._changed:
+            self._full = (records, next_id)
+            self._pending = []
+            self._changed.notify()
+
+    def append(self, entry: Dict, snapshot: Snapshot):
+        """Queue a single change entry."""
+        self.append_many([entry], snapshot)
+
+    def append_many(self, entries: Iterable[Dict], snapshot: Snapshot):
+        """Queue several change entries."""
+        with self._changed:
+            self._pending.extend(entries)
+            self._snapshot = snapshot
+            self._changed.notify()
+
+    def flush(self):
+        """Write everything queued so far, raising if the write fails."""
+        self._write_pending()
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        """Write what is left and stop the background thread."""
+        with self._changed:
+            self._closed = True
+            self._changed.notify()
+        self._thread.join()
+        self.flush()
+        self.inner.close()
+
+    def _dirty(self) -> bool:
+        return bool(self._pending) or self._full is not None
+
+    def _run(self):
+        """Worker loop: wait for changes, let them pile up, write them."""
+        while True:
+            with self._changed:
+                while not self._dirty() and not self._closed:
+                    self._changed.wait()
+                if self._closed:
+                    return
+            time.sleep(self.delay)
+            self._write_pending()
+
+    @timed
+    def _write_pending(self):
+        """Hand queued changes to the wrapped backend."""
+        with self._write_lock:
+            with self._changed:
+                full, self._full = self._full, None
+                entries, self._pending = self._pending, []
+                snapshot = self._snapshot
+            try:
+                if full is not None:
+                    self.inner.save(*full)
+                    full = None
+                if entries:
+                    self.inner.append_many(entries, snapshot)
+                self.error = None
+            except Exception as e:
+                # put the unwritten changes back so the next round retries them
+                with self._changed:
+                    if full is None:
+                        self._pending[:0] = entries
+                    elif self._full is None:
+                        # a newer full rewrite queued meanwhile would supersede these
+                        self._full = full
+                        self._pending[:0] = entries
+                self.error = e
+
+
+def open_storage(path: str) -> JsonStorage:
+    """
+    Pick the storage backend for a data file from its extension.
+
+    A JSON file that has a journal next to it (e.g. while the async server
+    runs on it) is opened with JournalStorage, so its entries are seen. A
+    directory, or a name ending in .shards, is a ShardedStorage.
+    """
+    if os.path.isdir(path) or path.endswith('.shards'):
+        return ShardedStorage(path)
+    if path.endswith('.swb'):
+        # imported here because binary_snapshot builds on this module
+        from binary_snapshot import BinaryStorage
+        return BinaryStorage(path)
+    if os.path.exists(path + ".journal"):
+        return JournalStorage(path)
+    return JsonStorage(path)
+
+
+class RecordReader:
+    """
+    Reads assignment records from a file one at a time.
+
+    Understands both the normal JSON layout ({"assignments": [...], ...})
+    and JSON lines (one record per line), either one optionally compressed
+    (.gz, .bz2, .xz, or .zst where available). The file is read in chunks,
+    so memory use stays flat no matter how big the file is. Top-level
+    values other than the assignments (next_id, version, ...) end up in
+    ``meta`` once iteration reaches them.
+    """
+
+    def __init__(self, path: str, chunk_size: int = 1 << 16):
+        """
+        Prepare to read a file.
+
+        Args:
+            path: File to read
+            chunk_size: Bytes read from disk at a time
+        """
+        self.path = path
+        self.chunk_size = chunk_size
+        self.total_bytes = os.path.getsize(path)
+        self.bytes_read = 0
+        self.meta: Dict[str, Any] = {}
+
+        self._decoder = json.JSONDecoder()
+        self._raw = None
+        self._file = None
+        self._text = codecs.getincrementaldecoder('utf-8-sig')()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+
+    @property
+    def next_id(self) -> Optional[int]:
+        """The file's next_id, once it has been read."""
+        return self.meta.get('next_id')
+
+    def __iter__(self) -> Iterator[Dict]:
+        with open(self.path, 'rb') as self._raw, \
+                wrap_compressed(self._raw, self.path, 'rb') as self._file:
+            if self._peek() == '{':
+                yield from self._iter_first_object()
+            yield from self._iter_lines()
+
+    def _read_more(self) -> bool:
+        """Append the next chunk to the buffer; False at end of file."""
+        if self._eof:
+            return False
+        data = self._file.read(self.chunk_size)
+        # progress is measured on disk, before any decompression
+        self.bytes_read = self._raw.tell()
+        if not data:
+            self._eof = True
+            self._buf += self._text.decode(b'', final=True)
+            return False
+        # drop what has been consumed so the buffer stays small
+        self._buf = self._buf[self._pos:] + self._text.decode(data)
+        self._pos = 0
+        return True
+
+    def _peek(self) -> str:
+        """Skip whitespace and return the next character ('' at the end)."""
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos].isspace():
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._read_more():
+                return ''
+
+    def _expect(self, char: str):
+        """Consume one expected character."""
+        if self._peek() != char:
+            raise ValueError(f"Expected {char!r} at byte {self.bytes_read} of {self.path}")
+        self._pos += 1
+
+    def _value(self) -> Any:
+        """Decode the next complete JSON value."""
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if self._read_more():
+                    continue
+                raise
+            # a number at the very end of the buffer may continue in the next chunk
+            if end == len(self._buf) and self._read_more():
+                continue
+            self._pos = end
+            return value
+
+    def _iter_first_object(self) -> Iterator[Dict]:
+        """
+        Read the first top-level object key by key.
+
+        In the JSON layout this is the whole file and its assignments array
+        is streamed record by record. Otherwise it is the first JSON line.
+        """
+        fields = {}
+        streamed = False
+        self._expect('{')
+        while self._peek() not in ('}', ''):
+            if self._peek() == ',':
+                self._pos += 1
+            key = self._value()
+            self._expect(':')
+            if key != 'assignments' or self._peek() != '[':
+                fields[key] = self._value()
+                continue
+
+            streamed = True
+            self._expect('[')
+            while self._peek() != ']':
+                if self._peek() == ',':
+                    self._pos += 1
+                yield self._value()
+            self._expect(']')
+        self._expect('}')
+
+        if streamed:
+            self.meta.update(fields)
+        else:
+            yield from self._take(fields)
+
+    def _iter_lines(self) -> Iterator[Dict]:
+        """Read the remaining JSON lines."""
+        while self._peek():
+            yield from self._take(self._value())
+
+    def _take(self, value: Dict) -> Iterator[Dict]:
+        """Yield a record line; metadata lines go into meta."""
+        if 'title' in value:
+            yield value
+        else:
+            self.meta.update(value)
+
+
+class RecordWriter:
+    """
+    Writes assignment records to a file one at a time.
+
+    The format follows the file name: ``.jsonl`` gives JSON lines, anything
+    else the normal JSON layout, and a trailing .gz, .bz2, .xz (or .zst
+    where available) compresses it. Records go straight to disk, so memory
+    use does not grow with the number of records. The file only replaces
+    the target once close() succeeds; use it as a context manager to
+    discard it on errors.
+    """
+
+    def __init__(self, path: str):
+        """Open a temporary file next to path for writing."""
+        self.path = path
+        self.tmp_path = path + ".tmp"
+        self.lines = split_compression(path)[0].lower().endswith('.jsonl')
+        self.count = 0
+
+        self._raw = open(self.tmp_path, 'wb')
+        try:
+            self._file = wrap_compressed(self._raw, path, 'wb')
+        except ValueError:
+            self._raw.close()
+            os.remove(self.tmp_path)
+            raise
+        self._text = codecs.getwriter('utf-8')(self._file)
+        if not self.lines:
+            self._text.write('{\n  "assignments": [')
+
+    def __enter__(self) -> 'RecordWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abort()
+
+    def write(self, record: Dict):
+        """Write one record."""
+        if self.lines:
+            self._text.write(json.dumps(record) + '\n')
+        else:
+            self._text.write((',\n    ' if self.count else '\n    ') + json.dumps(record))
+        self.count += 1
+
+    def close(self, meta: Dict[str, Any]):
+        """
+        Write the trailing metadata and move the file into place.
+
+        Args:
+            meta: Top-level values such as next_id and version
+        """
+        if self.lines:
+            self._text.write(json.dumps(meta) + '\n')
+        else:
+            self._text.write('\n  ]')
+            for key, value in meta.items():
+                self._text.write(f',\n  {json.dumps(key)}: {json.dumps(value)}')
+            self._text.write('\n}\n')
+
+        self._text.flush()
+        if self._file is not self._raw:
+            self._file.close()
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+        self._raw.close()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        """Stop writing and delete the partial file."""
+        if self._file is not self._raw:
+            self._file.close()
+        self._raw.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
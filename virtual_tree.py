@@ -0,0 +1,351 @@
+"""
+Virtual Treeview
+
+Shows a long list of items in a ttk.Treeview while only creating the rows
+that fit in the window. Scrolling reuses the same Treeview items and just
+rewrites their text, so refresh time depends on the window height instead
+of the number of items.
+
+Shorter lists get one Treeview row per item. Refreshing them only touches
+rows that were added, removed, moved or changed, and single items can be
+inserted, updated or removed without redrawing the rest.
+
+Author: Betapandas
+Email: Betapandas@gmail.com
+"""
+
+import tkinter as tk
+from tkinter import ttk
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from instrumentation import timed
+
+
+# (text, values, tags) for one Treeview row
+Row = Tuple[str, Sequence, Sequence]
+
+
+class VirtualTreeview:
+    """Drives a Treeview and its scrollbar, virtualizing long lists."""
+
+    def __init__(self, tree: ttk.Treeview, scrollbar: ttk.Scrollbar,
+                 render_row: Callable[[object], Row],
+                 key: Callable[[object], Hashable] = id,
+                 sort_key: Optional[Callable] = None,
+                 threshold: int = 1000, buffer: int = 5):
+        """
+        Set up the view.
+
+        Args:
+            tree: Treeview to fill
+            scrollbar: Vertical scrollbar next to the tree
+            render_row: Turns one item into (text, values, tags)
+            key: Returns a stable identity for an item
+            sort_key: Returns an item's sort value, if the list is kept sorted;
+                insert_item() needs it, and remove_item() uses it to find
+                an item by binary search
+            threshold: Lists longer than this are shown virtually
+            buffer: Extra rows rendered below the visible area
+        """
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.render_row = render_row
+        self.key = key
+        self.sort_key = sort_key
+        self.threshold = threshold
+        self.buffer = buffer
+
+        self.items: List = []
+        self.virtual = False
+        self.offset = 0          # index of the first rendered item
+        self.pool: List[str] = []  # reusable Treeview item ids
+        self.selected_item = None
+        # one-row-per-item mode: item key -> Treeview id, and the row last drawn
+        self.iids: Dict[Hashable, str] = {}
+        self.rendered: Dict[Hashable, Row] = {}
+        # virtual mode: key of every item in the list -> its sort value when
+        # it was added (the item itself may have changed since)
+        self.keys: Dict[Hashable, object] = {}
+
+        self.scrollbar.config(command=self.yview)
+        self.tree.configure(yscrollcommand=self._on_tree_scroll)
+
+        self.tree.bind('<Configure>', lambda e: self._on_resize())
+        self.tree.bind('<<TreeviewSelect>>', self._on_select, add='+')
+        self.tree.bind('<MouseWheel>', self._on_mousewheel)
+        self.tree.bind('<Button-4>', lambda e: self._scroll_by(-3))
+        self.tree.bind('<Button-5>', lambda e: self._scroll_by(3))
+        self.tree.bind('<Up>', lambda e: self._on_arrow(-1))
+        self.tree.bind('<Down>', lambda e: self._on_arrow(1))
+        self.tree.bind('<Prior>', lambda e: self._scroll_by(-self.visible_rows()))
+        self.tree.bind('<Next>', lambda e: self._scroll_by(self.visible_rows()))
+
+    def set_items(self, items: List):
+        """Show a new list of items, touching only the rows that changed."""
+        was_virtual = self.virtual
+        self.items = list(items)
+        self.virtual = len(self.items) > self.threshold
+        if self.virtual != was_virtual:
+            self._clear()
+
+        if self.virtual:
+            if self.sort_key is None:
+                self.keys = dict.fromkeys(map(self.key, self.items))
+            else:
+                self.keys = {self.key(item): self.sort_key(item) for item in self.items}
+            self.offset = min(self.offset, self._max_offset())
+            self._render()
+        else:
+            self._apply_diff()
+
+    def contains(self, key: Hashable) -> bool:
+        """Check whether an item with this key is in the list."""
+        return key in (self.keys if self.virtual else self.iids)
+
+    def update_item(self, item):
+        """Redraw a single item that is already in the list."""
+        if not self.virtual:
+            key = self.key(item)
+            iid = self.iids.get(key)
+            if iid is not None:
+                self._draw(iid, key, item)
+            return
+
+        for row, iid in enumerate(self.pool):
+            if self.items[self.offset + row] is item:
+                text, values, tags = self.render_row(item)
+                self.tree.item(iid, text=text, values=values, tags=tags)
+                return
+
+    def _sort_value(self, item):
+        """The value an item in the list is sorted by."""
+        if self.virtual:
+            return self.keys[self.key(item)]
+        return self.sort_key(item)
+
+    def insert_item(self, item):
+        """Insert an item at its sorted position (needs sort_key)."""
+        # bisect_right by sort value, matching a stable sort of the list
+        value = self.sort_key(item)
+        lo, hi = 0, len(self.items)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if value < self._sort_value(self.items[mid]):
+                hi = mid
+            else:
+                lo = mid + 1
+        self.items.insert(lo, item)
+
+        if self.virtual:
+            self.keys[self.key(item)] = value
+            self._render()
+        elif len(self.items) > self.threshold:
+            # crossing the threshold switches to virtual mode
+            self.set_items(self.items)
+        else:
+            key = self.key(item)
+            text, values, tags = row = self.render_row(item)
+            self.iids[key] = self.tree.insert('', lo, text=text, values=values, tags=tags)
+            self.rendered[key] = row
+
+    def remove_item(self, key: Hashable):
+        """Remove the item with this key from the list."""
+        if not self.contains(key):
+            return
+
+        if not self.virtual:
+            iid = self.iids.pop(key)
+            del self.rendered[key]
+            self.items.pop(self.tree.index(iid))
+            self.tree.delete(iid)
+            return
+
+        self.items.pop(self._find(key))
+        del self.keys[key]
+        if len(self.items) > self.threshold:
+            self.offset = min(self.offset, self._max_offset())
+            self._render()
+        else:
+            # dropping below the threshold switches back to one row per item
+            self.set_items(self.items)
+
+    def _find(self, key: Hashable) -> int:
+        """Index of the item with this key in virtual mode."""
+        if self.sort_key is not None:
+            # bisect_left by the stored sort values
+            value = self.keys[key]
+            lo, hi = 0, len(self.items)
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if self._sort_value(self.items[mid]) < value:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            # equal sort values are told apart by key
+            while lo < len(self.items) and self._sort_value(self.items[lo]) == value:
+                if self.key(self.items[lo]) == key:
+                    return lo
+                lo += 1
+        return next(i for i, item in enumerate(self.items) if self.key(item) == key)
+
+    def _apply_diff(self):
+        """Bring one-row-per-item mode in line with self.items."""
+        wanted = {self.key(item) for item in self.items}
+        for key in [k for k in self.iids if k not in wanted]:
+            self.tree.delete(self.iids.pop(key))
+            del self.rendered[key]
+
+        order = list(self.tree.get_children())
+        for index, item in enumerate(self.items):
+            key = self.key(item)
+            iid = self.iids.get(key)
+            if iid is None:
+                text, values, tags = row = self.render_row(item)
+                iid = self.tree.insert('', index, text=text, values=values, tags=tags)
+                self.iids[key] = iid
+                self.rendered[key] = row
+                order.insert(index, iid)
+                continue
+
+            self._draw(iid, key, item)
+            if order[index] != iid:
+                self.tree.move(iid, '', index)
+                order.remove(iid)
+                order.insert(index, iid)
+
+    def _draw(self, iid: str, key: Hashable, item):
+        """Rewrite a row if its rendered content changed."""
+        row = self.render_row(item)
+        if self.rendered.get(key) != row:
+            text, values, tags = row
+            self.tree.item(iid, text=text, values=values, tags=tags)
+            self.rendered[key] = row
+
+    def visible_rows(self) -> int:
+        """Number of rows that fit in the tree's current height."""
+        style = ttk.Style(self.tree)
+        row_height = int(style.lookup('Treeview', 'rowheight') or 20)
+        # the heading takes roughly one row
+        return max(1, self.tree.winfo_height() // row_height - 1)
+
+    def yview(self, *args):
+        """Scrollbar command: handles 'moveto' and 'scroll' requests."""
+        if not self.virtual:
+            return self.tree.yview(*args)
+
+        if args[0] == 'moveto':
+            offset = int(float(args[1]) * len(self.items))
+        elif args[0] == 'scroll':
+            amount = int(args[1])
+            if args[2] == 'pages':
+                amount *= self.visible_rows()
+            offset = self.offset + amount
+        else:
+            return None
+        self._move_to(offset)
+
+    def _max_offset(self) -> int:
+        """Largest first index that still fills the window."""
+        return max(0, len(self.items) - self.visible_rows())
+
+    def _move_to(self, offset: int):
+        """Scroll so item number offset is the first row."""
+        offset = max(0, min(offset, self._max_offset()))
+        if offset != self.offset:
+            self.offset = offset
+            self._render()
+
+    def _scroll_by(self, amount: int):
+        """Scroll by a number of rows; returns 'break' in virtual mode."""
+        if not self.virtual:
+            return None
+        self._move_to(self.offset + amount)
+        return 'break'
+
+    @timed
+    def _render(self):
+        """Write the items in the viewport into the pooled Treeview rows."""
+        count = min(len(self.items) - self.offset, self.visible_rows() + self.buffer)
+        count = max(count, 0)
+
+        while len(self.pool) < count:
+            self.pool.append(self.tree.insert('', tk.END))
+        while len(self.pool) > count:
+            self.tree.delete(self.pool.pop())
+
+        selection = ()
+        for row, iid in enumerate(self.pool):
+            index = self.offset + row
+            text, values, tags = self.render_row(self.items[index])
+            self.tree.item(iid, text=text, values=values, tags=tags)
+            if self.items[index] is self.selected_item:
+                selection = (iid,)
+
+        # keep the Treeview pinned to its first row; we do the scrolling
+        self.tree.yview_moveto(0)
+        if tuple(self.tree.selection()) != selection:
+            self.tree.selection_set(selection)
+        self._update_scrollbar()
+
+    def _update_scrollbar(self):
+        """Size the scrollbar thumb to the visible part of the list."""
+        total = len(self.items)
+        if not total:
+            self.scrollbar.set(0, 1)
+            return
+        first = self.offset / total
+        last = min(1.0, (self.offset + self.visible_rows()) / total)
+        self.scrollbar.set(first, last)
+
+    def _clear(self):
+        """Remove every row from the tree."""
+        self.pool = []
+        self.offset = 0
+        self.iids = {}
+        self.rendered = {}
+        self.keys = {}
+        self.tree.delete(*self.tree.get_children())
+
+    def _on_tree_scroll(self, first, last):
+        """The tree's own scroll updates only drive the scrollbar when not virtual."""
+        if not self.virtual:
+            self.scrollbar.set(first, last)
+
+    def _on_resize(self):
+        """Render more or fewer rows when the window changes size."""
+        if self.virtual:
+            self.offset = min(self.offset, self._max_offset())
+            self._render()
+
+    def _on_select(self, event=None):
+        """Remember which item is selected so it survives scrolling."""
+        if not self.virtual:
+            return
+        # an empty selection just means the item scrolled out of view
+        selection = self.tree.selection()
+        if selection and selection[0] in self.pool:
+            self.selected_item = self.items[self.offset + self.pool.index(selection[0])]
+
+    def _on_mousewheel(self, event):
+        """Scroll with the mouse wheel (Windows and macOS deltas)."""
+        if not self.virtual:
+            return None
+        step = -1 if event.delta > 0 else 1
+        return self._scroll_by(step * 3)
+
+    def _on_arrow(self, step: int):
+        """Move the selection with the arrow keys, scrolling at the edges."""
+        if not self.virtual or self.selected_item is None:
+            return None
+        try:
+            index = self.items.index(self.selected_item) + step
+        except ValueError:
+            return None
+        index = max(0, min(index, len(self.items) - 1))
+        self.selected_item = self.items[index]
+        if index < self.offset:
+            self.offset = index
+        elif index >= self.offset + self.visible_rows():
+            self.offset = index - self.visible_rows() + 1
+        self._render()
+        return 'break'